@@ -0,0 +1,60 @@
+"""Create cost allocation tables
+
+Revision ID: 175f81e5d21f
+Revises: 5d527f5a807d
+Create Date: 2026-10-19 14:03:52.661870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '175f81e5d21f'
+down_revision: Union[str, None] = '5d527f5a807d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('allocation_rules',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('owner_id', sa.Integer(), nullable=True),
+    sa.Column('source_services', sa.JSON(), nullable=True),
+    sa.Column('source_untagged_only', sa.Boolean(), nullable=True),
+    sa.Column('target_tag_key', sa.String(), nullable=True),
+    sa.Column('driver', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_allocation_rules_id'), 'allocation_rules', ['id'], unique=False)
+    op.create_table('cost_allocations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rule_id', sa.Integer(), nullable=True),
+    sa.Column('cloud_account_id', sa.Integer(), nullable=True),
+    sa.Column('period_start', sa.DateTime(), nullable=True),
+    sa.Column('period_end', sa.DateTime(), nullable=True),
+    sa.Column('source_service', sa.String(), nullable=True),
+    sa.Column('target_value', sa.String(), nullable=True),
+    sa.Column('allocated_cost', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['cloud_account_id'], ['cloud_accounts.id'], ),
+    sa.ForeignKeyConstraint(['rule_id'], ['allocation_rules.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_cost_allocations_id'), 'cost_allocations', ['id'], unique=False)
+    op.create_index('ix_cost_allocations_rule_period', 'cost_allocations', ['rule_id', 'period_start', 'period_end'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_cost_allocations_rule_period', table_name='cost_allocations')
+    op.drop_index(op.f('ix_cost_allocations_id'), table_name='cost_allocations')
+    op.drop_table('cost_allocations')
+    op.drop_index(op.f('ix_allocation_rules_id'), table_name='allocation_rules')
+    op.drop_table('allocation_rules')
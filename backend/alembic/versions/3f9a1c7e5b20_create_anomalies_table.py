@@ -0,0 +1,52 @@
+"""Create anomalies table
+
+Revision ID: 3f9a1c7e5b20
+Revises: b8d2f6a41c97
+Create Date: 2026-10-19 19:11:27.604118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c7e5b20'
+down_revision: Union[str, None] = 'b8d2f6a41c97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('anomalies',
+    sa.Column('id', sa.String(length=40), nullable=False),
+    sa.Column('cloud_account_id', sa.Integer(), nullable=True),
+    sa.Column('service', sa.String(), nullable=True),
+    sa.Column('resource_id', sa.String(), nullable=True),
+    sa.Column('date', sa.DateTime(), nullable=True),
+    sa.Column('detection_method', sa.String(), nullable=True),
+    sa.Column('cost', sa.Float(), nullable=True),
+    sa.Column('avg_cost', sa.Float(), nullable=True),
+    sa.Column('percent_difference', sa.Float(), nullable=True),
+    sa.Column('confidence', sa.Float(), nullable=True),
+    sa.Column('explanation', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('status_updated_at', sa.DateTime(), nullable=True),
+    sa.Column('status_updated_by', sa.Integer(), nullable=True),
+    sa.Column('first_detected_at', sa.DateTime(), nullable=True),
+    sa.Column('last_detected_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['cloud_account_id'], ['cloud_accounts.id'], ),
+    sa.ForeignKeyConstraint(['status_updated_by'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_anomalies_status_confidence_id', 'anomalies', ['status', 'confidence', 'id'], unique=False)
+    op.create_index('ix_anomalies_account_date', 'anomalies', ['cloud_account_id', 'date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_anomalies_account_date', table_name='anomalies')
+    op.drop_index('ix_anomalies_status_confidence_id', table_name='anomalies')
+    op.drop_table('anomalies')
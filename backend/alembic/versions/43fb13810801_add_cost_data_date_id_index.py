@@ -0,0 +1,28 @@
+"""Add (date, id) index to cost_data
+
+Revision ID: 43fb13810801
+Revises: c067aed388af
+Create Date: 2026-10-19 09:12:04.218734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '43fb13810801'
+down_revision: Union[str, None] = 'c067aed388af'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_cost_data_date_id', 'cost_data', ['date', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_cost_data_date_id', table_name='cost_data')
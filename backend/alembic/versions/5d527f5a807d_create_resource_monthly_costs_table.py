@@ -0,0 +1,44 @@
+"""Create resource_monthly_costs table
+
+Revision ID: 5d527f5a807d
+Revises: 66fec24900c3
+Create Date: 2026-10-19 12:41:09.117254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d527f5a807d'
+down_revision: Union[str, None] = '66fec24900c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('resource_monthly_costs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cloud_account_id', sa.Integer(), nullable=True),
+    sa.Column('service', sa.String(), nullable=True),
+    sa.Column('resource_id', sa.String(), nullable=True),
+    sa.Column('month', sa.DateTime(), nullable=True),
+    sa.Column('total_cost', sa.Float(), nullable=True),
+    sa.Column('record_count', sa.Integer(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['cloud_account_id'], ['cloud_accounts.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('cloud_account_id', 'service', 'resource_id', 'month', name='uq_resource_monthly_costs_resource_month')
+    )
+    op.create_index(op.f('ix_resource_monthly_costs_id'), 'resource_monthly_costs', ['id'], unique=False)
+    op.create_index('ix_resource_monthly_costs_month_cost', 'resource_monthly_costs', ['month', 'total_cost'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_resource_monthly_costs_month_cost', table_name='resource_monthly_costs')
+    op.drop_index(op.f('ix_resource_monthly_costs_id'), table_name='resource_monthly_costs')
+    op.drop_table('resource_monthly_costs')
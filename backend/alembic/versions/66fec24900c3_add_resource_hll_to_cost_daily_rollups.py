@@ -0,0 +1,28 @@
+"""Add resource_hll to cost_daily_rollups
+
+Revision ID: 66fec24900c3
+Revises: 8b305f90cc89
+Create Date: 2026-10-19 11:20:31.904417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '66fec24900c3'
+down_revision: Union[str, None] = '8b305f90cc89'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('cost_daily_rollups', sa.Column('resource_hll', sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('cost_daily_rollups', 'resource_hll')
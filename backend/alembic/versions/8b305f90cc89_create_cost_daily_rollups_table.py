@@ -0,0 +1,43 @@
+"""Create cost_daily_rollups table
+
+Revision ID: 8b305f90cc89
+Revises: 43fb13810801
+Create Date: 2026-10-19 10:02:47.553190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b305f90cc89'
+down_revision: Union[str, None] = '43fb13810801'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('cost_daily_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cloud_account_id', sa.Integer(), nullable=True),
+    sa.Column('service', sa.String(), nullable=True),
+    sa.Column('day', sa.DateTime(), nullable=True),
+    sa.Column('total_cost', sa.Float(), nullable=True),
+    sa.Column('record_count', sa.Integer(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['cloud_account_id'], ['cloud_accounts.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('cloud_account_id', 'service', 'day', name='uq_cost_daily_rollups_account_service_day')
+    )
+    op.create_index(op.f('ix_cost_daily_rollups_id'), 'cost_daily_rollups', ['id'], unique=False)
+    op.create_index('ix_cost_daily_rollups_day', 'cost_daily_rollups', ['day'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_cost_daily_rollups_day', table_name='cost_daily_rollups')
+    op.drop_index(op.f('ix_cost_daily_rollups_id'), table_name='cost_daily_rollups')
+    op.drop_table('cost_daily_rollups')
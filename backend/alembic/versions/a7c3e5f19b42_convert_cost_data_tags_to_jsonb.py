@@ -0,0 +1,39 @@
+"""Convert cost_data tags to JSONB with a GIN index
+
+Revision ID: a7c3e5f19b42
+Revises: e41b7c9d2a06
+Create Date: 2026-10-19 16:02:44.905113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e5f19b42'
+down_revision: Union[str, None] = 'e41b7c9d2a06'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.alter_column('cost_data', 'tags',
+               existing_type=sa.JSON(),
+               type_=postgresql.JSONB(astext_type=sa.Text()),
+               existing_nullable=True,
+               postgresql_using='tags::jsonb')
+    op.create_index('ix_cost_data_tags', 'cost_data', ['tags'], unique=False, postgresql_using='gin', postgresql_ops={'tags': 'jsonb_path_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_cost_data_tags', table_name='cost_data', postgresql_using='gin', postgresql_ops={'tags': 'jsonb_path_ops'})
+    op.alter_column('cost_data', 'tags',
+               existing_type=postgresql.JSONB(astext_type=sa.Text()),
+               type_=sa.JSON(),
+               existing_nullable=True,
+               postgresql_using='tags::json')
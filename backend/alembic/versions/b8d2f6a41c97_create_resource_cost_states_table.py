@@ -0,0 +1,52 @@
+"""Create resource cost states table
+
+Revision ID: b8d2f6a41c97
+Revises: a7c3e5f19b42
+Create Date: 2026-10-19 18:02:44.190513
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d2f6a41c97'
+down_revision: Union[str, None] = 'a7c3e5f19b42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('resource_cost_states',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('cloud_account_id', sa.Integer(), nullable=True),
+    sa.Column('service', sa.String(), nullable=True),
+    sa.Column('resource_id', sa.String(), nullable=True),
+    sa.Column('day_count', sa.Integer(), nullable=True),
+    sa.Column('mean', sa.Float(), nullable=True),
+    sa.Column('m2', sa.Float(), nullable=True),
+    sa.Column('level', sa.Float(), nullable=True),
+    sa.Column('trend', sa.Float(), nullable=True),
+    sa.Column('weekday_costs', sa.JSON(), nullable=True),
+    sa.Column('current_day', sa.DateTime(), nullable=True),
+    sa.Column('current_cost', sa.Float(), nullable=True),
+    sa.Column('expected_cost', sa.Float(), nullable=True),
+    sa.Column('anomaly_score', sa.Float(), nullable=True),
+    sa.Column('is_anomalous', sa.Boolean(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['cloud_account_id'], ['cloud_accounts.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('cloud_account_id', 'service', 'resource_id', name='uq_resource_cost_states_resource')
+    )
+    op.create_index(op.f('ix_resource_cost_states_id'), 'resource_cost_states', ['id'], unique=False)
+    op.create_index('ix_resource_cost_states_anomalous', 'resource_cost_states', ['is_anomalous', 'cloud_account_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_resource_cost_states_anomalous', table_name='resource_cost_states')
+    op.drop_index(op.f('ix_resource_cost_states_id'), table_name='resource_cost_states')
+    op.drop_table('resource_cost_states')
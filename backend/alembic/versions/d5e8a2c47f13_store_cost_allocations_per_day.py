@@ -0,0 +1,31 @@
+"""Store cost allocations per day
+
+Revision ID: d5e8a2c47f13
+Revises: 3f9a1c7e5b20
+Create Date: 2026-10-19 21:02:44.318512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e8a2c47f13'
+down_revision: Union[str, None] = '3f9a1c7e5b20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rows from whole-window runs overlap each other; rerun the rules to store them per day
+    op.execute(sa.text(
+        "DELETE FROM cost_allocations WHERE period_end - period_start > interval '1 day'"
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    pass
@@ -0,0 +1,65 @@
+"""Create budget tables
+
+Revision ID: e41b7c9d2a06
+Revises: 175f81e5d21f
+Create Date: 2026-10-19 15:21:08.417302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e41b7c9d2a06'
+down_revision: Union[str, None] = '175f81e5d21f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('budgets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('owner_id', sa.Integer(), nullable=True),
+    sa.Column('cloud_account_id', sa.Integer(), nullable=True),
+    sa.Column('service', sa.String(), nullable=True),
+    sa.Column('tag_key', sa.String(), nullable=True),
+    sa.Column('tag_value', sa.String(), nullable=True),
+    sa.Column('amount', sa.Float(), nullable=True),
+    sa.Column('thresholds', sa.JSON(), nullable=True),
+    sa.Column('current_month', sa.DateTime(), nullable=True),
+    sa.Column('month_to_date', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['cloud_account_id'], ['cloud_accounts.id'], ),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_budgets_id'), 'budgets', ['id'], unique=False)
+    op.create_table('budget_alerts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('budget_id', sa.Integer(), nullable=True),
+    sa.Column('month', sa.DateTime(), nullable=True),
+    sa.Column('threshold', sa.Float(), nullable=True),
+    sa.Column('spend', sa.Float(), nullable=True),
+    sa.Column('amount', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('notified_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['budget_id'], ['budgets.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('budget_id', 'month', 'threshold', name='uq_budget_alerts_budget_month_threshold')
+    )
+    op.create_index(op.f('ix_budget_alerts_id'), 'budget_alerts', ['id'], unique=False)
+    op.create_index('ix_budget_alerts_created_at', 'budget_alerts', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_budget_alerts_created_at', table_name='budget_alerts')
+    op.drop_index(op.f('ix_budget_alerts_id'), table_name='budget_alerts')
+    op.drop_table('budget_alerts')
+    op.drop_index(op.f('ix_budgets_id'), table_name='budgets')
+    op.drop_table('budgets')
@@ -0,0 +1,36 @@
+"""Add unique index for resource cost states without a resource_id
+
+Revision ID: f2c6b9e184d5
+Revises: d5e8a2c47f13
+Create Date: 2026-10-19 21:47:12.904371
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c6b9e184d5'
+down_revision: Union[str, None] = 'd5e8a2c47f13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep the newest of any duplicates the NULL-distinct constraint let through
+    op.execute(sa.text(
+        "DELETE FROM resource_cost_states AS older USING resource_cost_states AS newer "
+        "WHERE older.resource_id IS NULL AND newer.resource_id IS NULL "
+        "AND older.cloud_account_id = newer.cloud_account_id AND older.service = newer.service "
+        "AND older.id < newer.id"
+    ))
+    op.create_index('uq_resource_cost_states_no_resource', 'resource_cost_states', ['cloud_account_id', 'service'],
+                    unique=True, postgresql_where=sa.text('resource_id IS NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_resource_cost_states_no_resource', table_name='resource_cost_states')
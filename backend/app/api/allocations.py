@@ -0,0 +1,119 @@
+# app/api/allocations.py
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List, Optional
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_current_user, get_account_scope
+from app.db.database import get_db
+from app.db.models import User, AllocationRule, CostAllocation
+from app.schemas.allocation import (
+    AllocationRuleCreate, AllocationRule as AllocationRuleSchema,
+    AllocationRunResult, CostAllocation as CostAllocationSchema
+)
+from app.services.allocation import CostAllocationEngine
+from app.services.query_filters import filter_accounts
+
+router = APIRouter()
+
+@router.get("/rules", response_model=List[AllocationRuleSchema])
+def get_allocation_rules(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    List the allocation rules visible to the current user.
+    """
+    query = db.query(AllocationRule)
+    if not current_user.is_admin:
+        query = query.filter(AllocationRule.owner_id == current_user.id)
+    
+    return query.order_by(AllocationRule.id).all()
+
+@router.post("/rules", response_model=AllocationRuleSchema)
+def create_allocation_rule(
+    rule_in: AllocationRuleCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Create an allocation rule.
+    """
+    rule = AllocationRule(**rule_in.dict(), owner_id=current_user.id)
+    
+    db.add(rule)
+    db.commit()
+    db.refresh(rule)
+    return rule
+
+@router.delete("/rules/{rule_id}", response_model=AllocationRuleSchema)
+def delete_allocation_rule(
+    rule_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Delete an allocation rule and its stored allocations.
+    """
+    rule = _get_rule(db, current_user, rule_id)
+    
+    db.delete(rule)
+    db.commit()
+    return rule
+
+@router.post("/rules/{rule_id}/run", response_model=AllocationRunResult)
+def run_allocation_rule(
+    rule_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
+    days: int = Query(30, ge=1, le=365)
+):
+    """
+    Allocate shared cost for the past number of days and store the result.
+    """
+    rule = _get_rule(db, current_user, rule_id)
+    
+    # Get start and end dates
+    end_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start_date = end_date - timedelta(days=days)
+    
+    result = CostAllocationEngine(db).run(rule, start_date, end_date, account_ids)
+    db.commit()
+    
+    return result
+
+@router.get("/", response_model=List[CostAllocationSchema])
+def get_allocations(
+    rule_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    List stored allocations for a rule, largest first.
+    """
+    _get_rule(db, current_user, rule_id)
+    
+    query = db.query(CostAllocation).filter(CostAllocation.rule_id == rule_id)
+    query = filter_accounts(query, CostAllocation.cloud_account_id, account_ids)
+    
+    return query.order_by(
+        CostAllocation.period_start.desc(),
+        CostAllocation.allocated_cost.desc()
+    ).offset(skip).limit(limit).all()
+
+# Helper function to load a rule the user may use
+def _get_rule(db: Session, current_user: User, rule_id: int) -> AllocationRule:
+    """Get an allocation rule owned by the user (or any rule for admins)."""
+    rule = db.query(AllocationRule).filter(AllocationRule.id == rule_id).first()
+    
+    if not rule:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Allocation rule not found")
+    
+    if rule.owner_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied to this allocation rule")
+    
+    return rule
@@ -0,0 +1,103 @@
+# app/api/anomalies.py
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List, Optional
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_current_user, get_account_scope
+from app.db.database import get_db
+from app.db.models import User, Anomaly
+from app.schemas.anomaly import AnomalyPage, AnomalyRunResult, AnomalyStatusUpdate, StoredAnomaly
+from app.services.anomaly_store import AnomalyStore
+
+router = APIRouter()
+
+@router.post("/runs", response_model=AnomalyRunResult)
+def run_detection(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
+    days: int = Query(30, ge=1, le=90),
+    sensitivity: float = Query(2.0, ge=1.0, le=5.0),
+    methods: Optional[str] = Query(None, description="Comma-separated list of detection methods to use"),
+    time_budget: Optional[float] = Query(None, gt=0, le=120, description="Seconds each method may run")
+):
+    """
+    Run the enhanced detectors and store their anomalies.
+    Anomalies found again keep their acknowledged or suppressed status.
+    """
+    detection_methods = None
+    if methods:
+        detection_methods = [m.strip() for m in methods.split(",")]
+    
+    result = AnomalyStore(db).run(account_ids, days, sensitivity, detection_methods, time_budget)
+    db.commit()
+    return result
+
+@router.get("/", response_model=AnomalyPage)
+def get_anomalies(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
+    status_filter: str = Query("open", alias="status", regex="^(open|acknowledged|suppressed|all)$"),
+    service: Optional[str] = None,
+    method: Optional[str] = Query(None, description="Detection method"),
+    min_confidence: Optional[float] = Query(None, ge=0, le=1),
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Page through stored anomalies, most confident first.
+    Pass next_cursor back to fetch the next page.
+    """
+    try:
+        return AnomalyStore(db).get_page(
+            account_ids,
+            status=None if status_filter == "all" else status_filter,
+            service=service,
+            detection_method=method,
+            min_confidence=min_confidence,
+            cursor=cursor,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{anomaly_id}", response_model=StoredAnomaly)
+def get_anomaly(
+    anomaly_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    account_ids: Optional[List[int]] = Depends(get_account_scope)
+):
+    """
+    Get a stored anomaly.
+    """
+    return _get_anomaly(db, account_ids, anomaly_id)
+
+@router.patch("/{anomaly_id}", response_model=StoredAnomaly)
+def update_anomaly_status(
+    anomaly_id: str,
+    update: AnomalyStatusUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    account_ids: Optional[List[int]] = Depends(get_account_scope)
+):
+    """
+    Acknowledge, suppress or reopen an anomaly.
+    """
+    anomaly = _get_anomaly(db, account_ids, anomaly_id)
+    
+    AnomalyStore(db).set_status(anomaly, update.status, current_user)
+    db.commit()
+    db.refresh(anomaly)
+    return anomaly
+
+# Helper function for access checks
+def _get_anomaly(db: Session, account_ids: Optional[List[int]], anomaly_id: str) -> Anomaly:
+    """Get an anomaly on one of the accounts in scope."""
+    anomaly = db.query(Anomaly).filter(Anomaly.id == anomaly_id).first()
+    
+    if not anomaly or (account_ids is not None and anomaly.cloud_account_id not in account_ids):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Anomaly not found")
+    
+    return anomaly
@@ -0,0 +1,145 @@
+# app/api/budgets.py
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List
+from sqlalchemy.orm import Session
+
+from app.api.deps import get_current_user
+from app.db.database import get_db
+from app.db.models import User, CloudAccount, Budget, BudgetAlert
+from app.schemas.budget import (
+    BudgetCreate, BudgetUpdate, Budget as BudgetSchema, BudgetAlert as BudgetAlertSchema
+)
+from app.services.budgets import BudgetEvaluator
+
+router = APIRouter()
+
+@router.get("/", response_model=List[BudgetSchema])
+def get_budgets(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    List the budgets visible to the current user.
+    """
+    query = db.query(Budget)
+    if not current_user.is_admin:
+        query = query.filter(Budget.owner_id == current_user.id)
+    
+    return query.order_by(Budget.id).all()
+
+@router.post("/", response_model=BudgetSchema)
+def create_budget(
+    budget_in: BudgetCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Create a budget. Month-to-date spend is computed straight away.
+    """
+    _check_account(db, current_user, budget_in.cloud_account_id)
+    
+    budget = Budget(**budget_in.dict(), owner_id=current_user.id)
+    db.add(budget)
+    db.flush()
+    
+    BudgetEvaluator(db).rebuild(budget)
+    db.commit()
+    db.refresh(budget)
+    return budget
+
+@router.put("/{budget_id}", response_model=BudgetSchema)
+def update_budget(
+    budget_id: int,
+    budget_in: BudgetUpdate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Update a budget and recompute its month-to-date spend.
+    """
+    budget = _get_budget(db, current_user, budget_id)
+    _check_account(db, current_user, budget_in.cloud_account_id)
+    
+    for field, value in budget_in.dict().items():
+        setattr(budget, field, value)
+    
+    BudgetEvaluator(db).rebuild(budget)
+    db.commit()
+    db.refresh(budget)
+    return budget
+
+@router.delete("/{budget_id}", response_model=BudgetSchema)
+def delete_budget(
+    budget_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Delete a budget and its alerts.
+    """
+    budget = _get_budget(db, current_user, budget_id)
+    
+    db.delete(budget)
+    db.commit()
+    return budget
+
+@router.get("/alerts", response_model=List[BudgetAlertSchema])
+def get_budget_alerts(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    unnotified_only: bool = False,
+    skip: int = 0,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    List recent threshold crossings across the user's budgets, newest first.
+    """
+    query = db.query(BudgetAlert)
+    if not current_user.is_admin:
+        query = query.join(Budget).filter(Budget.owner_id == current_user.id)
+    
+    if unnotified_only:
+        query = query.filter(BudgetAlert.notified_at.is_(None))
+    
+    return query.order_by(BudgetAlert.created_at.desc(), BudgetAlert.id.desc()).offset(skip).limit(limit).all()
+
+@router.get("/{budget_id}/alerts", response_model=List[BudgetAlertSchema])
+def get_alerts_for_budget(
+    budget_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    List the threshold crossings recorded for one budget.
+    """
+    _get_budget(db, current_user, budget_id)
+    
+    return db.query(BudgetAlert).filter(
+        BudgetAlert.budget_id == budget_id
+    ).order_by(BudgetAlert.month.desc(), BudgetAlert.threshold).all()
+
+# Helper functions for access checks
+def _get_budget(db: Session, current_user: User, budget_id: int) -> Budget:
+    """Get a budget owned by the user (or any budget for admins)."""
+    budget = db.query(Budget).filter(Budget.id == budget_id).first()
+    
+    if not budget:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Budget not found")
+    
+    if budget.owner_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied to this budget")
+    
+    return budget
+
+def _check_account(db: Session, current_user: User, account_id) -> None:
+    """Ensure the user may budget against the given account."""
+    if account_id is None:
+        return
+    
+    account = db.query(CloudAccount).filter(CloudAccount.id == account_id).first()
+    
+    if not account:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cloud account not found")
+    
+    if account.owner_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Access denied to this cloud account")
@@ -1,17 +1,21 @@
 # app/api/cost_analysis.py
 from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import List, Optional
+from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, get_account_scope
 from app.db.database import get_db
-from app.db.models import User, CloudAccount
+from app.db.models import User
 from app.schemas.cost import (
     CostSummary, CostDetail, CostAnomaly, 
     IdleResource, RightsizingRecommendation,
-    ReservedInstanceRecommendation, RecommendationSummary
+    ReservedInstanceRecommendation, RecommendationSummary,
+    SpendForecast
 )
 from app.services.cost_analysis import CostAnalysisService
+from app.services.forecasting import SpendForecaster
+from app.services.rollups import CostRollupService
 
 router = APIRouter()
 
@@ -19,26 +23,20 @@ router = APIRouter()
 async def get_cost_summary(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None,
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
     days: int = Query(30, ge=1, le=365)
 ):
     """
     Get a summary of costs for the dashboard.
+    Total spend is summed from the raw data. The projection and resource
+    counts come from the daily rollups; while those lag the raw data the
+    projection is fitted on the raw data instead and resource counts are
+    left out (None), since the sketches would undercount.
     """
-    # Check if the user has access to the requested account
-    if account_id:
-        account = db.query(CloudAccount).filter(
-            CloudAccount.id == account_id,
-            CloudAccount.owner_id == current_user.id
-        ).first()
-        
-        if not account and not current_user.is_admin:
-            raise HTTPException(status_code=403, detail="Access denied to this cloud account")
-    
     service = CostAnalysisService(db)
     
     # Get daily costs for trend analysis
-    daily_costs = service.get_daily_costs(account_id, days)
+    daily_costs = service.get_daily_costs(account_ids, days)
     
     # Calculate total spend
     total_spend = sum(day.total_cost for day in daily_costs) if daily_costs else 0
@@ -47,14 +45,30 @@ async def get_cost_summary(
     # In a real implementation, you'd compare with the previous month
     month_over_month_change = -5.2  # Placeholder
     
-    # Calculate projected spend
-    # In a real implementation, you'd use time series forecasting
-    projected_spend = total_spend * 1.2  # Placeholder
+    # Projected month-end spend from the batch forecaster
+    forecast = SpendForecaster(db).forecast(account_ids)
+    projected_spend = forecast["total"]["projected_month_end"]
+    
+    # Approximate distinct resource counts from the rollup sketches
+    end_date = datetime.utcnow()
+    start_date = end_date - timedelta(days=days)
+    rollups = CostRollupService(db)
+    if rollups.is_current(start_date, end_date, account_ids):
+        resource_counts = rollups.get_distinct_resource_counts(start_date, end_date, account_ids)
+        total_resources = rollups.get_distinct_resource_counts(
+            start_date, end_date, account_ids, group_by_service=False
+        )
+    else:
+        resource_counts, total_resources = {}, {}
     
     # Get top services by cost
-    top_services = service.get_costs_by_service(account_id, days)
+    top_services = service.get_costs_by_service(account_ids, days)
     top_services_data = [
-        {"service": service.service, "cost": service.total_cost}
+        {
+            "service": service.service,
+            "cost": service.total_cost,
+            "resource_count": resource_counts.get(service.service)
+        }
         for service in top_services[:5]
     ]
     
@@ -62,67 +76,78 @@ async def get_cost_summary(
         total_spend=total_spend,
         month_over_month_change=month_over_month_change,
         projected_spend=projected_spend,
-        top_services=top_services_data
+        top_services=top_services_data,
+        resource_count=total_resources.get(None)
     )
 
 @router.get("/by-service", response_model=List[CostDetail])
 async def get_costs_by_service(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None,
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
     days: int = Query(30, ge=1, le=365)
 ):
     """
     Get costs grouped by service.
+    Resource counts are left out while the daily rollups lag the raw data.
     """
-    # Check if the user has access to the requested account
-    if account_id:
-        account = db.query(CloudAccount).filter(
-            CloudAccount.id == account_id,
-            CloudAccount.owner_id == current_user.id
-        ).first()
-        
-        if not account and not current_user.is_admin:
-            raise HTTPException(status_code=403, detail="Access denied to this cloud account")
-    
     service = CostAnalysisService(db)
-    services_costs = service.get_costs_by_service(account_id, days)
+    services_costs = service.get_costs_by_service(account_ids, days)
+    
+    # Approximate distinct resource counts from the rollup sketches
+    end_date = datetime.utcnow()
+    start_date = end_date - timedelta(days=days)
+    rollups = CostRollupService(db)
+    resource_counts = {}
+    if rollups.is_current(start_date, end_date, account_ids):
+        resource_counts = rollups.get_distinct_resource_counts(start_date, end_date, account_ids)
     
     result = []
     for service_cost in services_costs:
         result.append(CostDetail(
             service=service_cost.service,
             cost=service_cost.total_cost,
-            # In a real implementation, you'd calculate these values
+            # In a real implementation, you'd calculate this value
             change_percentage=5.0,  # Placeholder
-            resource_count=10  # Placeholder
+            resource_count=resource_counts.get(service_cost.service)
         ))
     
     return result
 
+@router.get("/forecast", response_model=SpendForecast)
+async def get_spend_forecast(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
+    group_by: str = Query("service", regex="^(service|account|resource)$"),
+    history_days: int = Query(90, ge=28, le=365),
+    confidence: float = Query(0.95, gt=0.5, lt=1.0)
+):
+    """
+    Project month-end spend per service, account or resource with prediction intervals.
+    """
+    forecaster = SpendForecaster(db)
+    
+    return forecaster.forecast(
+        account_ids,
+        group_by=group_by,
+        history_days=history_days,
+        confidence=confidence
+    )
+
 @router.get("/anomalies", response_model=List[CostAnomaly])
 async def get_cost_anomalies(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None,
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
     days: int = Query(30, ge=1, le=90),
     sensitivity: float = Query(2.0, ge=1.0, le=5.0)
 ):
     """
     Detect cost anomalies in the specified time period.
     """
-    # Check account access
-    if account_id:
-        account = db.query(CloudAccount).filter(
-            CloudAccount.id == account_id,
-            CloudAccount.owner_id == current_user.id
-        ).first()
-        
-        if not account and not current_user.is_admin:
-            raise HTTPException(status_code=403, detail="Access denied to this cloud account")
-    
     service = CostAnalysisService(db)
-    anomalies = service.detect_anomalies(account_id, days, sensitivity)
+    anomalies = service.detect_anomalies(account_ids, days, sensitivity)
     
     return anomalies
 
@@ -130,24 +155,14 @@ async def get_cost_anomalies(
 async def get_idle_resources(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None,
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
     days: int = Query(30, ge=1, le=90)
 ):
     """
     Identify potentially idle resources that could be terminated.
     """
-    # Check account access
-    if account_id:
-        account = db.query(CloudAccount).filter(
-            CloudAccount.id == account_id,
-            CloudAccount.owner_id == current_user.id
-        ).first()
-        
-        if not account and not current_user.is_admin:
-            raise HTTPException(status_code=403, detail="Access denied to this cloud account")
-    
     service = CostAnalysisService(db)
-    idle_resources = service.get_idle_resources(account_id, days)
+    idle_resources = service.get_idle_resources(account_ids, days)
     
     return idle_resources
 
@@ -155,24 +170,14 @@ async def get_idle_resources(
 async def get_rightsizing_recommendations(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None,
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
     days: int = Query(30, ge=1, le=90)
 ):
     """
     Get recommendations for rightsizing resources.
     """
-    # Check account access
-    if account_id:
-        account = db.query(CloudAccount).filter(
-            CloudAccount.id == account_id,
-            CloudAccount.owner_id == current_user.id
-        ).first()
-        
-        if not account and not current_user.is_admin:
-            raise HTTPException(status_code=403, detail="Access denied to this cloud account")
-    
     service = CostAnalysisService(db)
-    recommendations = service.get_right_sizing_recommendations(account_id, days)
+    recommendations = service.get_right_sizing_recommendations(account_ids, days)
     
     return recommendations
 
@@ -180,24 +185,14 @@ async def get_rightsizing_recommendations(
 async def get_reserved_instance_recommendations(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None,
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
     days: int = Query(90, ge=30, le=365)
 ):
     """
     Get recommendations for Reserved Instance purchases.
     """
-    # Check account access
-    if account_id:
-        account = db.query(CloudAccount).filter(
-            CloudAccount.id == account_id,
-            CloudAccount.owner_id == current_user.id
-        ).first()
-        
-        if not account and not current_user.is_admin:
-            raise HTTPException(status_code=403, detail="Access denied to this cloud account")
-    
     service = CostAnalysisService(db)
-    recommendations = service.get_reserved_instance_recommendations(account_id, days)
+    recommendations = service.get_reserved_instance_recommendations(account_ids, days)
     
     return recommendations
 
@@ -205,22 +200,12 @@ async def get_reserved_instance_recommendations(
 async def get_all_recommendations(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None
+    account_ids: Optional[List[int]] = Depends(get_account_scope)
 ):
     """
     Get all recommendation types in a single call.
     """
-    # Check account access
-    if account_id:
-        account = db.query(CloudAccount).filter(
-            CloudAccount.id == account_id,
-            CloudAccount.owner_id == current_user.id
-        ).first()
-        
-        if not account and not current_user.is_admin:
-            raise HTTPException(status_code=403, detail="Access denied to this cloud account")
-    
     service = CostAnalysisService(db)
-    all_recommendations = service.get_all_recommendations(account_id)
+    all_recommendations = service.get_all_recommendations(account_ids)
     
     return all_recommendations
\ No newline at end of file
@@ -8,10 +8,13 @@ import pandas as pd
 import io
 from starlette.responses import StreamingResponse
 
-from app.api.deps import get_current_user
+from app.api.allocations import _get_rule
+from app.api.deps import get_current_user, get_account_scope, get_cost_filter
 from app.db.database import get_db
-from app.db.models import User, CloudAccount, CostData
-from app.services.cost_analysis import CostAnalysisService
+from app.db.models import User, CostData
+from app.schemas.cost import TopResource
+from app.services.cost_analysis_extended import CostAnalysisService
+from app.services.query_filters import CostFilter
 
 router = APIRouter()
 
@@ -19,65 +22,39 @@ router = APIRouter()
 async def get_cost_trend(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None,
-    service: Optional[str] = None,
-    tag: Optional[str] = None,
-    days: int = Query(30, ge=1, le=365)
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
+    filters: CostFilter = Depends(get_cost_filter),
+    days: int = Query(30, ge=1, le=365),
+    max_points: int = Query(120, ge=3, le=1000),
+    resolution: str = Query("auto", regex="^(auto|day|week|month|lttb)$")
 ):
     """
     Get cost trend data for charting.
-    Returns data formatted for time-series visualization.
+    Returns data formatted for time-series visualization, bucketed by day,
+    week or month so that long ranges stay within max_points. Read from the
+    daily rollups, or from the raw data while the rollups lag it.
     """
-    # Verify account access
-    if account_id:
-        _verify_account_access(db, current_user, account_id)
-    
     service_obj = CostAnalysisService(db)
     
     # Get start and end dates
     end_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     start_date = end_date - timedelta(days=days)
     
-    # Get daily costs for trend analysis
-    daily_costs = service_obj.get_daily_costs_by_date(
-        start_date, 
-        end_date, 
-        account_id, 
-        service, 
-        tag
-    )
-    
-    # Get daily costs for the previous period for comparison
-    previous_start_date = start_date - timedelta(days=days)
-    previous_end_date = end_date - timedelta(days=days)
-    
-    previous_daily_costs = service_obj.get_daily_costs_by_date(
-        previous_start_date,
-        previous_end_date,
-        account_id,
-        service,
-        tag
+    trend = service_obj.get_cost_trend(
+        start_date,
+        end_date,
+        account_ids,
+        filters,
+        max_points=max_points,
+        resolution=resolution
     )
     
-    # Format the response for Chart.js
-    dates = [(start_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
-    
-    # Create lookup dicts for faster access
-    daily_cost_dict = {item.date.strftime("%Y-%m-%d"): item.total_cost for item in daily_costs}
-    previous_cost_dict = {item.date.strftime("%Y-%m-%d"): item.total_cost for item in previous_daily_costs}
-    
-    # Align current and previous period costs for comparison
-    current_costs = [daily_cost_dict.get(date, 0) for date in dates]
-    
-    # Shift previous period dates to align with current period
-    previous_dates = [(previous_start_date + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
-    previous_costs = [previous_cost_dict.get(date, 0) for date in previous_dates]
-    
     return {
-        "labels": dates,
+        "labels": trend["labels"],
+        "resolution": trend["resolution"],
         "datasets": {
-            "totalCost": current_costs,
-            "previousPeriod": previous_costs
+            "totalCost": trend["current"],
+            "previousPeriod": trend["previous"]
         }
     }
 
@@ -85,19 +62,14 @@ async def get_cost_trend(
 async def get_cost_comparison(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None,
-    service: Optional[str] = None,
-    tag: Optional[str] = None,
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
+    filters: CostFilter = Depends(get_cost_filter),
     days: int = Query(30, ge=1, le=365)
 ):
     """
     Get cost comparison data (month-over-month, year-over-year).
     Returns data formatted for bar chart visualization.
     """
-    # Verify account access
-    if account_id:
-        _verify_account_access(db, current_user, account_id)
-    
     service_obj = CostAnalysisService(db)
     
     # Determine the comparison type based on the time range
@@ -114,9 +86,8 @@ async def get_cost_comparison(
     current_data = service_obj.get_grouped_costs(
         start_date,
         end_date,
-        account_id,
-        service,
-        tag,
+        account_ids,
+        filters,
         comparison_type
     )
     
@@ -127,9 +98,8 @@ async def get_cost_comparison(
     previous_data = service_obj.get_grouped_costs(
         previous_start_date,
         previous_end_date,
-        account_id,
-        service,
-        tag,
+        account_ids,
+        filters,
         comparison_type
     )
     
@@ -162,19 +132,20 @@ async def get_cost_comparison(
 async def get_cost_breakdown(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None,
-    service: Optional[str] = None,
-    tag: Optional[str] = None,
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
+    filters: CostFilter = Depends(get_cost_filter),
     days: int = Query(30, ge=1, le=365),
-    group_by: str = Query("service", regex="^(service|account|region|tag)$")
+    group_by: str = Query("service", regex="^(service|account|region|tag|allocation)$"),
+    allocation_rule_id: Optional[int] = Query(None, description="Allocation rule to break down by when group_by=allocation")
 ):
     """
     Get cost breakdown data by the specified grouping.
     Returns data formatted for pie/doughnut chart visualization.
     """
-    # Verify account access
-    if account_id:
-        _verify_account_access(db, current_user, account_id)
+    if group_by == "allocation":
+        if allocation_rule_id is None:
+            raise HTTPException(status_code=400, detail="allocation_rule_id is required when grouping by allocation")
+        _get_rule(db, current_user, allocation_rule_id)
     
     service_obj = CostAnalysisService(db)
     
@@ -186,25 +157,29 @@ async def get_cost_breakdown(
     previous_start_date = start_date - timedelta(days=days)
     previous_end_date = end_date - timedelta(days=days)
     
-    # Get breakdown data for current period
-    breakdown_data = service_obj.get_cost_breakdown(
-        start_date,
-        end_date,
-        account_id,
-        service,
-        tag,
-        group_by
-    )
-    
-    # Get breakdown data for previous period
-    previous_breakdown_data = service_obj.get_cost_breakdown(
-        previous_start_date,
-        previous_end_date,
-        account_id,
-        service,
-        tag,
-        group_by
-    )
+    try:
+        # Get breakdown data for current period
+        breakdown_data = service_obj.get_cost_breakdown(
+            start_date,
+            end_date,
+            account_ids,
+            filters,
+            group_by,
+            allocation_rule_id
+        )
+        
+        # Get breakdown data for previous period
+        previous_breakdown_data = service_obj.get_cost_breakdown(
+            previous_start_date,
+            previous_end_date,
+            account_ids,
+            filters,
+            group_by,
+            allocation_rule_id
+        )
+    except ValueError as e:
+        # Allocations only carry the source service, not tags or line item costs
+        raise HTTPException(status_code=400, detail=str(e))
     
     # Prepare data for visualization
     labels = [item.group for item in breakdown_data]
@@ -224,19 +199,14 @@ async def get_cost_breakdown(
 async def get_daily_costs(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None,
-    service: Optional[str] = None,
-    tag: Optional[str] = None,
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
+    filters: CostFilter = Depends(get_cost_filter),
     days: int = Query(30, ge=1, le=90)
 ):
     """
     Get detailed daily cost data.
     Returns data formatted for bar chart visualization.
     """
-    # Verify account access
-    if account_id:
-        _verify_account_access(db, current_user, account_id)
-    
     service_obj = CostAnalysisService(db)
     
     # Get start and end dates
@@ -247,9 +217,8 @@ async def get_daily_costs(
     daily_costs = service_obj.get_daily_costs_by_date(
         start_date,
         end_date,
-        account_id,
-        service,
-        tag
+        account_ids,
+        filters
     )
     
     # Format for visualization
@@ -265,21 +234,120 @@ async def get_daily_costs(
         "costs": costs
     }
 
+@router.get("/items")
+async def get_cost_items(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
+    filters: CostFilter = Depends(get_cost_filter),
+    days: int = Query(30, ge=1, le=365),
+    columns: Optional[str] = Query(None, description="Comma-separated list of columns to return"),
+    cursor: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Page through individual cost line items.
+    Pages are ordered by date and id; pass next_cursor back to fetch the next page.
+    """
+    service_obj = CostAnalysisService(db)
+    
+    # Get start and end dates
+    end_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start_date = end_date - timedelta(days=days)
+    
+    selected_columns = None
+    if columns:
+        selected_columns = [c.strip() for c in columns.split(",") if c.strip()]
+    
+    try:
+        return service_obj.get_cost_items(
+            start_date,
+            end_date,
+            account_ids,
+            filters,
+            columns=selected_columns,
+            cursor=cursor,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/pivot")
+async def get_cost_pivot(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
+    filters: CostFilter = Depends(get_cost_filter),
+    days: int = Query(30, ge=1, le=365),
+    dimensions: str = Query("service,month", description="Comma-separated dimensions: service, account, region, day, week, month or tag:<key>"),
+    totals: str = Query("rollup", regex="^(rollup|cube|marginal|none)$")
+):
+    """
+    Get cost aggregated over several dimensions with subtotals.
+    Returns a columnar payload: one array per dimension plus total_cost and a
+    grouping bitmask marking which dimensions each row is a subtotal over.
+    """
+    service_obj = CostAnalysisService(db)
+    
+    # Get start and end dates
+    end_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start_date = end_date - timedelta(days=days)
+    
+    selected_dimensions = [d.strip() for d in dimensions.split(",") if d.strip()]
+    if len(selected_dimensions) > 4:
+        raise HTTPException(status_code=400, detail="At most 4 dimensions can be pivoted at once")
+    
+    try:
+        return service_obj.get_pivot(
+            start_date,
+            end_date,
+            selected_dimensions,
+            account_ids,
+            filters,
+            totals=totals
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/top-resources", response_model=List[TopResource])
+async def get_top_resources(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
+    filters: CostFilter = Depends(get_cost_filter),
+    days: int = Query(30, ge=1, le=365),
+    limit: int = Query(50, ge=1, le=500),
+    exact: bool = Query(False, description="Sum raw cost data instead of reading monthly rollups")
+):
+    """
+    Get the most expensive resources over the specified period.
+    """
+    service_obj = CostAnalysisService(db)
+    
+    # Get start and end dates
+    end_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start_date = end_date - timedelta(days=days)
+    
+    return service_obj.get_top_resources(
+        start_date,
+        end_date,
+        account_ids,
+        filters,
+        limit=limit,
+        exact=exact
+    )
+
 @router.get("/services")
 async def get_available_services(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None
+    account_ids: Optional[List[int]] = Depends(get_account_scope)
 ):
     """
     Get a list of all available services for filtering.
     """
-    # Verify account access
-    if account_id:
-        _verify_account_access(db, current_user, account_id)
-    
     service_obj = CostAnalysisService(db)
-    services = service_obj.get_available_services(account_id)
+    services = service_obj.get_available_services(account_ids)
     
     return services
 
@@ -287,17 +355,13 @@ async def get_available_services(
 async def get_available_tags(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None
+    account_ids: Optional[List[int]] = Depends(get_account_scope)
 ):
     """
     Get a list of all available tags and their values for filtering.
     """
-    # Verify account access
-    if account_id:
-        _verify_account_access(db, current_user, account_id)
-    
     service_obj = CostAnalysisService(db)
-    tags = service_obj.get_available_tags(account_id)
+    tags = service_obj.get_available_tags(account_ids)
     
     return tags
 
@@ -305,18 +369,13 @@ async def get_available_tags(
 async def export_cost_data(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None,
-    service: Optional[str] = None,
-    tag: Optional[str] = None,
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
+    filters: CostFilter = Depends(get_cost_filter),
     days: int = Query(30, ge=1, le=365)
 ):
     """
     Export cost data as CSV.
     """
-    # Verify account access
-    if account_id:
-        _verify_account_access(db, current_user, account_id)
-    
     service_obj = CostAnalysisService(db)
     
     # Get start and end dates
@@ -327,9 +386,8 @@ async def export_cost_data(
     cost_data = service_obj.get_detailed_costs(
         start_date,
         end_date,
-        account_id,
-        service,
-        tag
+        account_ids,
+        filters
     )
     
     # Convert to DataFrame for CSV export
@@ -369,18 +427,3 @@ async def export_cost_data(
     response.headers["Content-Disposition"] = f"attachment; filename=cost_data_{start_date.strftime('%Y%m%d')}_to_{end_date.strftime('%Y%m%d')}.csv"
     
     return response
-
-# Helper function to verify account access
-def _verify_account_access(db: Session, current_user: User, account_id: int):
-    """Verify the user has access to the specified cloud account."""
-    account = db.query(CloudAccount).filter(
-        CloudAccount.id == account_id
-    ).first()
-    
-    if not account:
-        raise HTTPException(status_code=404, detail="Cloud account not found")
-    
-    if account.owner_id != current_user.id and not current_user.is_admin:
-        raise HTTPException(status_code=403, detail="Access denied to this cloud account")
-    
-    return account
\ No newline at end of file
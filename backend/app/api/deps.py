@@ -1,12 +1,15 @@
-from fastapi import Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
 
 from app.core.security import SECRET_KEY, ALGORITHM
 from app.db.database import get_db
-from app.db.models import User
+from app.db.models import User, CloudAccount
 from app.schemas.user import TokenData
+from app.services.account_scope import get_owned_account_ids
+from app.services.query_filters import CostFilter, parse_cost_filter
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
 
@@ -53,4 +56,55 @@ def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
             status_code=status.HTTP_403_FORBIDDEN,
             detail="The user doesn't have enough privileges",
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+def get_account_scope(
+    account_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+) -> Optional[List[int]]:
+    """
+    Resolve the cloud accounts a cost request may read.
+    Returns [account_id] when a single accessible account is requested, the
+    user's own accounts when none is, or None (no restriction) for admins.
+    """
+    if account_id is None:
+        if current_user.is_admin:
+            return None
+        return sorted(get_owned_account_ids(db, current_user.id))
+
+    if account_id in get_owned_account_ids(db, current_user.id):
+        return [account_id]
+
+    # Only unowned accounts pay for the extra lookup
+    account = db.query(CloudAccount.id).filter(CloudAccount.id == account_id).first()
+    if not account:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cloud account not found",
+        )
+
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied to this cloud account",
+        )
+
+    return [account_id]
+
+def get_cost_filter(
+    service: Optional[str] = Query(None, description="Comma-separated services; prefix with ! to exclude"),
+    tag: Optional[List[str]] = Query(None, description="key:value, key:v1|v2 or !key:value; repeat to combine"),
+    resource: Optional[str] = Query(None, description="Comma-separated resource ids; prefix with ! to exclude"),
+    min_cost: Optional[float] = Query(None, ge=0, description="Minimum line item cost"),
+    max_cost: Optional[float] = Query(None, ge=0, description="Maximum line item cost"),
+) -> CostFilter:
+    """
+    Parse the request's cost filter parameters once.
+    Malformed expressions are rejected with 400 rather than ignored.
+    Only the cost exploration endpoints depend on this (see CostFilter).
+    """
+    try:
+        return parse_cost_filter(service, tag, resource, min_cost, max_cost)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
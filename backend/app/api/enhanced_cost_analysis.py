@@ -1,42 +1,52 @@
 # app/api/enhanced_cost_analysis.py
 from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, get_account_scope
 from app.db.database import get_db
-from app.db.models import User, CloudAccount
+from app.db.models import User
 from app.services.enhanced_anomaly_detection import EnhancedAnomalyDetection
 from app.services.enhanced_recommendations import EnhancedRecommendations
+from app.services.streaming_anomalies import StreamingAnomalyScorer
 from app.schemas.cost import (
-    CostAnomaly, RecommendationSummary, IdleResource, 
+    RecommendationSummary, IdleResource, 
     RightsizingRecommendation, ReservedInstanceRecommendation
 )
 from app.schemas.enhanced_cost import (
     StorageOptimizationRecommendation, NetworkOptimizationRecommendation,
-    EnhancedCostAnomaly, ContextualAnomaly, EnhancedRecommendationSummary
+    EnhancedCostAnomaly, ContextualAnomaly, EnhancedRecommendationSummary, StreamingAnomaly,
+    EnhancedAnomalyResult
 )
 
 router = APIRouter()
 
-@router.get("/anomalies/enhanced", response_model=List[CostAnomaly])
-async def get_enhanced_anomalies(
+@router.get("/anomalies/enhanced", response_model=Union[List[EnhancedCostAnomaly], EnhancedAnomalyResult])
+def get_enhanced_anomalies(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None,
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
     days: int = Query(30, ge=1, le=90),
     sensitivity: float = Query(2.0, ge=1.0, le=5.0),
-    methods: Optional[str] = Query(None, description="Comma-separated list of detection methods to use")
+    methods: Optional[str] = Query(None, description="Comma-separated list of detection methods to use"),
+    cohort_by: str = Query("service", regex="^(service|provider_service)$", description="Model grouping for isolation_forest_cohort"),
+    time_budget: Optional[float] = Query(None, gt=0, le=120, description="Seconds each method may run"),
+    include_meta: bool = Query(False, description="Wrap the anomalies with partial, timings and completed_methods"),
+    hierarchical: bool = Query(False, description="Only scan resources of services whose totals are anomalous"),
+    full_scan: bool = Query(False, description="With hierarchical, scan every resource but keep the parent chains")
 ):
     """
     Detect cost anomalies using enhanced algorithms.
-    Available methods: z_score, isolation_forest, time_series
+    Available methods: z_score, isolation_forest, time_series, isolation_forest_cohort,
+    rolling_mad, trailing_z_score
+    Methods run concurrently; any that overrun their time budget are left out of
+    the result, which include_meta reports as partial. A plain def, so FastAPI
+    runs the blocking detection in its threadpool instead of the event loop.
+    In hierarchical mode account and service totals are scored first and
+    resources are scanned only under anomalous services; every anomaly
+    carries its parent_chain.
     """
-    # Check account access
-    if account_id:
-        _verify_account_access(db, current_user, account_id)
-    
     # Parse methods if provided
     detection_methods = None
     if methods:
@@ -47,33 +57,46 @@ async def get_enhanced_anomalies(
     
     # Detect anomalies with specified methods
     anomalies = service.detect_anomalies(
-        account_id=account_id,
+        account_ids=account_ids,
         days=days,
         sensitivity=sensitivity,
-        detection_methods=detection_methods
+        detection_methods=detection_methods,
+        cohort_by=cohort_by,
+        time_budget=time_budget,
+        include_meta=include_meta,
+        hierarchical=hierarchical,
+        full_scan=full_scan
     )
     
     return anomalies
 
+@router.get("/anomalies/streaming", response_model=List[StreamingAnomaly])
+async def get_streaming_anomalies(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    account_ids: Optional[List[int]] = Depends(get_account_scope)
+):
+    """
+    Resources whose newest day was flagged at ingest time.
+    Scored against per-resource running statistics, without re-reading history.
+    """
+    return StreamingAnomalyScorer(db).get_flagged(account_ids)
+
 @router.get("/anomalies/contextual", response_model=List[Dict[str, Any]])
 async def get_contextual_anomalies(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None,
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
     days: int = Query(30, ge=1, le=90)
 ):
     """
     Detect contextual anomalies like unusual weekend patterns or end-of-month spikes.
     """
-    # Check account access
-    if account_id:
-        _verify_account_access(db, current_user, account_id)
-    
     # Initialize enhanced anomaly detection service
     service = EnhancedAnomalyDetection(db)
     
     # Get contextual anomalies
-    anomalies = service.get_contextual_anomalies(account_id, days)
+    anomalies = service.get_contextual_anomalies(account_ids, days)
     
     return anomalies
 
@@ -81,20 +104,16 @@ async def get_contextual_anomalies(
 async def get_enhanced_recommendations(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None
+    account_ids: Optional[List[int]] = Depends(get_account_scope)
 ):
     """
     Get all recommendation types from the enhanced recommendation engine.
     """
-    # Check account access
-    if account_id:
-        _verify_account_access(db, current_user, account_id)
-    
     # Initialize enhanced recommendations service
     service = EnhancedRecommendations(db)
     
     # Get all recommendations
-    recommendations = service.get_all_recommendations(account_id)
+    recommendations = service.get_all_recommendations(account_ids)
     
     return recommendations
 
@@ -102,21 +121,17 @@ async def get_enhanced_recommendations(
 async def get_storage_optimization_recommendations(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None,
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
     days: int = Query(30, ge=1, le=90)
 ):
     """
     Get storage optimization recommendations like storage tier changes and disk size adjustments.
     """
-    # Check account access
-    if account_id:
-        _verify_account_access(db, current_user, account_id)
-    
     # Initialize enhanced recommendations service
     service = EnhancedRecommendations(db)
     
     # Get storage optimization recommendations
-    recommendations = service.get_storage_optimization_recommendations(account_id, days)
+    recommendations = service.get_storage_optimization_recommendations(account_ids, days)
     
     return recommendations
 
@@ -124,21 +139,17 @@ async def get_storage_optimization_recommendations(
 async def get_network_optimization_recommendations(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None,
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
     days: int = Query(30, ge=1, le=90)
 ):
     """
     Get network optimization recommendations for reducing data transfer costs.
     """
-    # Check account access
-    if account_id:
-        _verify_account_access(db, current_user, account_id)
-    
     # Initialize enhanced recommendations service
     service = EnhancedRecommendations(db)
     
     # Get network optimization recommendations
-    recommendations = service.get_network_optimization_recommendations(account_id, days)
+    recommendations = service.get_network_optimization_recommendations(account_ids, days)
     
     return recommendations
 
@@ -146,34 +157,17 @@ async def get_network_optimization_recommendations(
 async def get_top_recommendations(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
-    account_id: Optional[int] = None,
+    account_ids: Optional[List[int]] = Depends(get_account_scope),
     limit: int = Query(10, ge=1, le=50)
 ):
     """
     Get prioritized top recommendations across all categories.
     """
-    # Check account access
-    if account_id:
-        _verify_account_access(db, current_user, account_id)
-    
     # Initialize enhanced recommendations service
     service = EnhancedRecommendations(db)
     
     # Get all recommendations
-    all_recommendations = service.get_all_recommendations(account_id)
+    all_recommendations = service.get_all_recommendations(account_ids)
     
     # Return the top recommendations
     return all_recommendations.get('top_recommendations', [])[:limit]
-
-# Helper function to verify account access
-def _verify_account_access(db: Session, current_user: User, account_id: int):
-    """Verify the user has access to the specified cloud account."""
-    account = db.query(CloudAccount).filter(
-        CloudAccount.id == account_id
-    ).first()
-    
-    if not account:
-        raise HTTPException(status_code=404, detail="Cloud account not found")
-    
-    if account.owner_id != current_user.id and not current_user.is_admin:
-        raise HTTPException(status_code=403, detail="Access denied to this cloud account")
\ No newline at end of file
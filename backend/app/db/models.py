@@ -1,6 +1,7 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, JSON
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, JSON, Index, UniqueConstraint, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import JSONB
 import datetime
 
 Base = declarative_base()
@@ -40,7 +41,180 @@ class CostData(Base):
     date = Column(DateTime)
     service = Column(String)
     resource_id = Column(String)
-    tags = Column(JSON)
+    tags = Column(JSONB)
     cost = Column(Float)
     
-    cloud_account = relationship("CloudAccount", back_populates="cost_data")
\ No newline at end of file
+    cloud_account = relationship("CloudAccount", back_populates="cost_data")
+
+    __table_args__ = (
+        # Supports keyset pagination over line items ordered by (date, id)
+        Index("ix_cost_data_date_id", "date", "id"),
+        # Answers tag containment filters (tags @> '{"key": "value"}')
+        Index("ix_cost_data_tags", "tags", postgresql_using="gin", postgresql_ops={"tags": "jsonb_path_ops"}),
+    )
+
+class CostDailyRollup(Base):
+    __tablename__ = "cost_daily_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cloud_account_id = Column(Integer, ForeignKey("cloud_accounts.id"))
+    service = Column(String)
+    day = Column(DateTime)
+    total_cost = Column(Float)
+    record_count = Column(Integer)
+    resource_hll = Column(LargeBinary)  # HyperLogLog sketch of distinct resource_ids
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    cloud_account = relationship("CloudAccount")
+
+    __table_args__ = (
+        UniqueConstraint("cloud_account_id", "service", "day", name="uq_cost_daily_rollups_account_service_day"),
+        Index("ix_cost_daily_rollups_day", "day"),
+    )
+
+class ResourceMonthlyCost(Base):
+    __tablename__ = "resource_monthly_costs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cloud_account_id = Column(Integer, ForeignKey("cloud_accounts.id"))
+    service = Column(String)
+    resource_id = Column(String)
+    month = Column(DateTime)
+    total_cost = Column(Float)
+    record_count = Column(Integer)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    cloud_account = relationship("CloudAccount")
+
+    __table_args__ = (
+        UniqueConstraint("cloud_account_id", "service", "resource_id", "month", name="uq_resource_monthly_costs_resource_month"),
+        Index("ix_resource_monthly_costs_month_cost", "month", "total_cost"),
+    )
+
+class AllocationRule(Base):
+    __tablename__ = "allocation_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    owner_id = Column(Integer, ForeignKey("users.id"))
+    source_services = Column(JSON)  # Services whose cost is shared out; null means all services
+    source_untagged_only = Column(Boolean, default=True)  # Only share rows missing the target tag
+    target_tag_key = Column(String)  # e.g. department, project
+    driver = Column(String, default="cost")  # cost, resource_count or even
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    owner = relationship("User")
+    allocations = relationship("CostAllocation", back_populates="rule", cascade="all, delete-orphan")
+
+class CostAllocation(Base):
+    __tablename__ = "cost_allocations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    rule_id = Column(Integer, ForeignKey("allocation_rules.id"))
+    cloud_account_id = Column(Integer, ForeignKey("cloud_accounts.id"))
+    period_start = Column(DateTime)
+    period_end = Column(DateTime)
+    source_service = Column(String)
+    target_value = Column(String)
+    allocated_cost = Column(Float)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    rule = relationship("AllocationRule", back_populates="allocations")
+
+    __table_args__ = (
+        Index("ix_cost_allocations_rule_period", "rule_id", "period_start", "period_end"),
+    )
+
+class Budget(Base):
+    __tablename__ = "budgets"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    owner_id = Column(Integer, ForeignKey("users.id"))
+    cloud_account_id = Column(Integer, ForeignKey("cloud_accounts.id"), nullable=True)  # null means all of the owner's accounts
+    service = Column(String, nullable=True)
+    tag_key = Column(String, nullable=True)
+    tag_value = Column(String, nullable=True)
+    amount = Column(Float)  # Monthly budget
+    thresholds = Column(JSON)  # Alert thresholds as percentages of amount, e.g. [50, 80, 100]
+    current_month = Column(DateTime, nullable=True)  # Month that month_to_date refers to
+    month_to_date = Column(Float, default=0.0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    owner = relationship("User")
+    cloud_account = relationship("CloudAccount")
+    alerts = relationship("BudgetAlert", back_populates="budget", cascade="all, delete-orphan")
+
+class BudgetAlert(Base):
+    __tablename__ = "budget_alerts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    budget_id = Column(Integer, ForeignKey("budgets.id"))
+    month = Column(DateTime)
+    threshold = Column(Float)  # Percentage of the budget that was crossed
+    spend = Column(Float)  # Month-to-date spend when the threshold was crossed
+    amount = Column(Float)  # Budget amount at the time
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    notified_at = Column(DateTime, nullable=True)  # Set once a notification has been sent
+
+    budget = relationship("Budget", back_populates="alerts")
+
+    __table_args__ = (
+        UniqueConstraint("budget_id", "month", "threshold", name="uq_budget_alerts_budget_month_threshold"),
+        Index("ix_budget_alerts_created_at", "created_at"),
+    )
+
+class ResourceCostState(Base):
+    __tablename__ = "resource_cost_states"
+
+    id = Column(Integer, primary_key=True, index=True)
+    cloud_account_id = Column(Integer, ForeignKey("cloud_accounts.id"))
+    service = Column(String)
+    resource_id = Column(String)
+    day_count = Column(Integer, default=0)  # Completed days folded into the statistics below
+    mean = Column(Float, default=0.0)  # Welford running mean of daily cost
+    m2 = Column(Float, default=0.0)  # Welford sum of squared deviations from the mean
+    level = Column(Float, nullable=True)  # Damped Holt level
+    trend = Column(Float, default=0.0)  # Damped Holt trend
+    weekday_costs = Column(JSON)  # Latest completed daily cost per weekday, Monday first
+    current_day = Column(DateTime, nullable=True)  # Day still receiving rows, scored but not folded in
+    current_cost = Column(Float, default=0.0)
+    expected_cost = Column(Float, nullable=True)  # Holt forecast for current_day
+    anomaly_score = Column(Float, nullable=True)  # Signed deviation in standard deviations
+    is_anomalous = Column(Boolean, default=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("cloud_account_id", "service", "resource_id", name="uq_resource_cost_states_resource"),
+        # NULLs are distinct in the constraint above, so rows without a resource_id need their own
+        Index("uq_resource_cost_states_no_resource", "cloud_account_id", "service", unique=True,
+              postgresql_where=resource_id.is_(None)),
+        Index("ix_resource_cost_states_anomalous", "is_anomalous", "cloud_account_id"),
+    )
+
+class Anomaly(Base):
+    __tablename__ = "anomalies"
+
+    id = Column(String(40), primary_key=True)  # sha1 of account, service, resource, day and method
+    cloud_account_id = Column(Integer, ForeignKey("cloud_accounts.id"))
+    service = Column(String)
+    resource_id = Column(String)
+    date = Column(DateTime)  # Day the anomalous cost was incurred
+    detection_method = Column(String)
+    cost = Column(Float)
+    avg_cost = Column(Float)
+    percent_difference = Column(Float)
+    confidence = Column(Float)
+    explanation = Column(String, nullable=True)
+    status = Column(String, default="open")  # open, acknowledged or suppressed
+    status_updated_at = Column(DateTime, nullable=True)
+    status_updated_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    first_detected_at = Column(DateTime, default=datetime.datetime.utcnow)
+    last_detected_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    __table_args__ = (
+        # Supports keyset pagination by confidence within a status
+        Index("ix_anomalies_status_confidence_id", "status", "confidence", "id"),
+        Index("ix_anomalies_account_date", "cloud_account_id", "date"),
+    )
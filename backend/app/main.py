@@ -2,7 +2,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api import auth, users, cost_analysis, cost_analysis_extended, enhanced_cost_analysis
+from app.api import auth, users, cost_analysis, cost_analysis_extended, enhanced_cost_analysis, allocations, budgets, anomalies
 
 app = FastAPI(title="CloudCostIQ API")
 
@@ -22,6 +22,9 @@ app.include_router(cost_analysis.router, prefix="/api/costs", tags=["costs"])
 app.include_router(cost_analysis_extended.router, prefix="/api/costs", tags=["cost analysis"])
 # Add the enhanced cost analysis router
 app.include_router(enhanced_cost_analysis.router, prefix="/api/costs/enhanced", tags=["enhanced analysis"])
+app.include_router(allocations.router, prefix="/api/allocations", tags=["allocations"])
+app.include_router(budgets.router, prefix="/api/budgets", tags=["budgets"])
+app.include_router(anomalies.router, prefix="/api/anomalies", tags=["anomalies"])
 
 @app.get("/")
 async def root():
@@ -0,0 +1,42 @@
+# app/schemas/allocation.py
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from datetime import datetime
+
+class AllocationRuleCreate(BaseModel):
+    """Rule for spreading shared cost across a tag's values."""
+    name: str
+    source_services: Optional[List[str]] = Field(None, description="Services whose cost is shared; all services if omitted")
+    source_untagged_only: bool = Field(True, description="Only share cost rows that are missing the target tag")
+    target_tag_key: str = Field(description="Tag key to allocate across, e.g. department or project")
+    driver: str = Field("cost", regex="^(cost|resource_count|even)$", description="Allocation driver: cost, resource_count, even")
+
+class AllocationRule(AllocationRuleCreate):
+    id: int
+    owner_id: int
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+class AllocationRunResult(BaseModel):
+    """Outcome of running an allocation rule for a period."""
+    rule_id: int
+    period_start: datetime
+    period_end: datetime
+    shared_cost: float
+    allocated_cost: float
+    allocation_count: int
+
+class CostAllocation(BaseModel):
+    """Shared cost of one service allocated to one tag value on one day."""
+    rule_id: int
+    cloud_account_id: Optional[int]
+    period_start: datetime
+    period_end: datetime
+    source_service: str
+    target_value: str
+    allocated_cost: float
+
+    class Config:
+        orm_mode = True
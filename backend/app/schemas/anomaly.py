@@ -0,0 +1,43 @@
+# app/schemas/anomaly.py
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+from datetime import datetime
+
+class StoredAnomaly(BaseModel):
+    """Anomaly recorded by a detection run, with its review state."""
+    id: str
+    cloud_account_id: int
+    service: str
+    resource_id: Optional[str] = None
+    date: datetime
+    detection_method: str
+    cost: float
+    avg_cost: float
+    percent_difference: float
+    confidence: float
+    explanation: Optional[str] = None
+    status: str
+    status_updated_at: Optional[datetime] = None
+    status_updated_by: Optional[int] = None
+    first_detected_at: datetime
+    last_detected_at: datetime
+
+    class Config:
+        orm_mode = True
+
+class AnomalyPage(BaseModel):
+    """One page of stored anomalies, most confident first."""
+    items: List[StoredAnomaly]
+    next_cursor: Optional[str] = None
+
+class AnomalyStatusUpdate(BaseModel):
+    status: str = Field(regex="^(open|acknowledged|suppressed)$")
+
+class AnomalyRunResult(BaseModel):
+    """Outcome of a detection run."""
+    detected: int
+    stored: int
+    partial: bool
+    timings: Dict[str, float]
+    completed_methods: List[str]
+    incomplete_methods: List[str]
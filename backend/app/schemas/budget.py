@@ -0,0 +1,57 @@
+# app/schemas/budget.py
+from typing import List, Optional
+from pydantic import BaseModel, Field, validator, root_validator
+from datetime import datetime
+
+class BudgetBase(BaseModel):
+    """Monthly budget scoped to an account, service and/or tag."""
+    name: str
+    amount: float = Field(gt=0, description="Monthly budget amount")
+    cloud_account_id: Optional[int] = Field(None, description="Account the budget covers; all of your accounts if omitted")
+    service: Optional[str] = None
+    tag_key: Optional[str] = None
+    tag_value: Optional[str] = None
+    thresholds: List[float] = Field([50.0, 80.0, 100.0], description="Alert thresholds as percentages of the amount")
+
+    @validator("thresholds")
+    def thresholds_positive(cls, v):
+        if not v or any(t <= 0 for t in v):
+            raise ValueError("thresholds must be positive percentages")
+        return sorted(set(v))
+
+    @root_validator(skip_on_failure=True)
+    def tag_pair(cls, values):
+        if (values.get("tag_key") is None) != (values.get("tag_value") is None):
+            raise ValueError("tag_key and tag_value must be given together")
+        return values
+
+class BudgetCreate(BudgetBase):
+    pass
+
+class BudgetUpdate(BudgetBase):
+    pass
+
+class Budget(BudgetBase):
+    id: int
+    owner_id: int
+    current_month: Optional[datetime] = None
+    month_to_date: float = 0.0
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        orm_mode = True
+
+class BudgetAlert(BaseModel):
+    """Threshold crossing recorded for a budget."""
+    id: int
+    budget_id: int
+    month: datetime
+    threshold: float
+    spend: float
+    amount: float
+    created_at: datetime
+    notified_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
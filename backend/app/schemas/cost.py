@@ -9,13 +9,38 @@ class CostSummary(BaseModel):
     month_over_month_change: float
     projected_spend: float
     top_services: List[Dict[str, Any]]
+    resource_count: Optional[int] = None  # Approximate, from HyperLogLog sketches
     
 class CostDetail(BaseModel):
     """Detailed cost information."""
     service: str
     cost: float
     change_percentage: Optional[float] = None
-    resource_count: Optional[int] = None
+    resource_count: Optional[int] = None  # Approximate, from HyperLogLog sketches
+
+class TopResource(BaseModel):
+    """Resource ranked by total spend over a period."""
+    resource_id: Optional[str] = None
+    service: Optional[str] = None
+    account_id: Optional[int] = None
+    total_cost: float
+
+class SeriesForecast(BaseModel):
+    """Month-end spend projection for one series."""
+    key: str
+    month_to_date: float
+    projected_month_end: float
+    lower_bound: float
+    upper_bound: float
+
+class SpendForecast(BaseModel):
+    """Month-end spend projections with prediction intervals."""
+    as_of: datetime
+    month_end: datetime
+    confidence: float
+    group_by: str
+    total: SeriesForecast
+    series: List[SeriesForecast]
 
 class CostAnomaly(BaseModel):
     """Cost anomaly model."""
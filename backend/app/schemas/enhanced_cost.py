@@ -3,25 +3,60 @@ from typing import List, Optional, Dict, Any, Union
 from pydantic import BaseModel, Field
 from datetime import datetime
 
+class AnomalyParent(BaseModel):
+    """Account or service total that an anomalous resource rolls up to."""
+    level: str = Field(description="account or service")
+    cloud_account_id: int
+    service: Optional[str] = None
+    cost: Optional[float] = Field(None, description="Total on the anomaly's day")
+    avg_cost: float = Field(description="Mean total over the baseline days before the recent ones")
+    score: Optional[float] = Field(None, description="Robust score of the weekday-adjusted total on the anomaly's day")
+    anomalous: bool
+
 class EnhancedCostAnomaly(BaseModel):
     """Enhanced cost anomaly model with detection method and confidence."""
     service: str
     date: datetime
-    resource_id: str
+    resource_id: Optional[str] = None
+    cloud_account_id: Optional[int] = Field(None, description="Account whose costs the series was built from")
     cost: float
     avg_cost: float
     percent_difference: float
-    detection_method: str = Field(description="Algorithm used for detection: z_score, isolation_forest, time_series")
+    detection_method: str = Field(description="Algorithm used for detection: z_score, isolation_forest, isolation_forest_cohort, time_series_decomposition, exponential_smoothing, rolling_mad, trailing_z_score")
     confidence: float = Field(description="Confidence score from 0-1")
     explanation: Optional[str] = None
     metrics: Optional[Dict[str, Any]] = None
+    parent_chain: Optional[List[AnomalyParent]] = Field(None, description="Account then service totals, in hierarchical mode")
+
+class EnhancedAnomalyResult(BaseModel):
+    """Anomalies with the run details of each detection method."""
+    anomalies: List[EnhancedCostAnomaly]
+    partial: bool = Field(description="True when a method overran its time budget or failed")
+    timings: Dict[str, float] = Field(description="Seconds per method; budget used for incomplete methods")
+    completed_methods: List[str]
+    incomplete_methods: List[str]
+    metrics: Dict[str, int] = Field(description="Series counts per detection path, including fallbacks")
+
+class StreamingAnomaly(BaseModel):
+    """Resource whose latest day was flagged when it was ingested."""
+    cloud_account_id: int
+    service: str
+    resource_id: Optional[str] = None
+    date: datetime
+    cost: float
+    expected_cost: Optional[float] = None
+    avg_cost: float
+    anomaly_score: float = Field(description="Signed distance from the nearest baseline in standard deviations")
+    days_observed: int
+    updated_at: datetime
 
 class ContextualAnomaly(BaseModel):
     """Contextual anomaly like unusual weekend patterns."""
     type: str = "contextual"
-    subtype: str = Field(description="Type of contextual anomaly: weekend_pattern, end_of_month, etc.")
+    subtype: str = Field(description="Type of contextual anomaly: weekend_pattern, end_of_month, correlation_break, etc.")
     service: str
     account_id: Optional[int] = None
+    resource_id: Optional[str] = None
     description: str
     confidence: float
     ratio: Optional[float] = None
@@ -0,0 +1,88 @@
+# app/services/account_scope.py
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+import threading
+import time
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.db.models import CloudAccount
+
+# How long a user's resolved account set is reused before it is re-read
+ACCOUNT_SCOPE_TTL_SECONDS = 60
+
+_scope_cache: Dict[int, Tuple[float, FrozenSet[int]]] = {}
+_scope_lock = threading.Lock()
+
+def get_owned_account_ids(db: Session, user_id: int) -> FrozenSet[int]:
+    """
+    Get the IDs of the cloud accounts owned by a user.
+    Results are cached per user for ACCOUNT_SCOPE_TTL_SECONDS and dropped
+    when a transaction in this process that inserted, updated or deleted one
+    of the user's CloudAccounts commits.
+    """
+    now = time.monotonic()
+
+    with _scope_lock:
+        cached = _scope_cache.get(user_id)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    account_ids = frozenset(
+        account_id for (account_id,) in
+        db.query(CloudAccount.id).filter(CloudAccount.owner_id == user_id).all()
+    )
+
+    with _scope_lock:
+        _scope_cache[user_id] = (now + ACCOUNT_SCOPE_TTL_SECONDS, account_ids)
+
+    return account_ids
+
+def invalidate_account_scope(user_ids: Optional[Iterable[int]] = None) -> None:
+    """Drop the cached account sets of user_ids, or of every user for None."""
+    with _scope_lock:
+        if user_ids is None:
+            _scope_cache.clear()
+        else:
+            for user_id in user_ids:
+                _scope_cache.pop(user_id, None)
+
+# Ownership changes must be visible immediately, not after the TTL expires. The
+# owners touched by a flush are collected on the session and dropped from the
+# cache once the transaction commits; dropping them at flush time would let
+# another request re-read and cache the old ownership before the commit.
+_PENDING_OWNERS = 'account_scope_pending_owners'
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_owners(session: Session, flush_context) -> None:
+    """Record the previous and new owners of every CloudAccount in the flush."""
+    owners = session.info.setdefault(_PENDING_OWNERS, set())
+    for account in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(account, CloudAccount):
+            history = inspect(account).attrs.owner_id.history
+            owners.update(history.added or ())
+            owners.update(history.deleted or ())
+            owners.update(history.unchanged or ())
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_changes(orm_execute_state) -> None:
+    """
+    query.update() and query.delete() skip the flush, and which owners they
+    touch is not known, so they drop every cached set on commit. Plain SQL
+    through session.execute(text(...)) is not seen at all.
+    """
+    if (orm_execute_state.is_update or orm_execute_state.is_delete) and any(
+        mapper.class_ is CloudAccount for mapper in orm_execute_state.all_mappers
+    ):
+        orm_execute_state.session.info.setdefault(_PENDING_OWNERS, set()).add(None)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_owners(session: Session) -> None:
+    """Drop the cached account sets of the owners changed by the committed transaction."""
+    owners = session.info.pop(_PENDING_OWNERS, None)
+    if owners:
+        invalidate_account_scope(None if None in owners else owners)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back_owners(session: Session) -> None:
+    """Forget the owners of changes that were rolled back."""
+    session.info.pop(_PENDING_OWNERS, None)
@@ -0,0 +1,154 @@
+# app/services/allocation.py
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import pandas as pd
+from sqlalchemy import func, distinct, literal
+from sqlalchemy.orm import Session
+
+from app.db.models import AllocationRule, CostAllocation, CostData
+from app.services.query_filters import filter_accounts
+
+# Label for shared cost in accounts that have no tagged spend to allocate against
+UNALLOCATED = "Unallocated"
+
+class CostAllocationEngine:
+    """Service for spreading shared costs across tag values (showback/chargeback)."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def run(
+        self,
+        rule: AllocationRule,
+        start_date: datetime,
+        end_date: datetime,
+        account_ids: Optional[List[int]] = None
+    ) -> Dict[str, Any]:
+        """
+        Allocate the shared cost selected by a rule for a period and persist it.
+
+        Shared cost is split within each account and day in proportion to the
+        rule's driver per value of the target tag: tagged spend ("cost"),
+        distinct tagged resources ("resource_count") or an equal split ("even").
+        Both sides are aggregated in SQL and joined as frames, so the work in
+        Python is proportional to accounts x days x tag values, not cost rows.
+
+        One row is stored per account, service, tag value and day, and the
+        rule's earlier rows for any day in the period are replaced, so runs
+        over overlapping windows never count a day twice. Cost rows without
+        an account are shared among the driver rows without an account.
+        """
+        source = self._source_costs(rule, start_date, end_date, account_ids)
+        drivers = self._driver_weights(rule, start_date, end_date, account_ids)
+
+        allocations = allocate(source, drivers)
+
+        # Replace earlier runs for the days this one covers
+        stale = self.db.query(CostAllocation).filter(
+            CostAllocation.rule_id == rule.id,
+            CostAllocation.period_start >= start_date,
+            CostAllocation.period_start < end_date
+        )
+        stale = filter_accounts(stale, CostAllocation.cloud_account_id, account_ids)
+        stale.delete(synchronize_session=False)
+
+        created_at = datetime.utcnow()
+        self.db.bulk_insert_mappings(CostAllocation, [
+            {
+                'rule_id': rule.id,
+                'cloud_account_id': None if pd.isna(row.cloud_account_id) else int(row.cloud_account_id),
+                'period_start': row.day,
+                'period_end': row.day + timedelta(days=1),
+                'source_service': row.service,
+                'target_value': row.target_value,
+                'allocated_cost': float(row.allocated_cost),
+                'created_at': created_at
+            }
+            for row in allocations.itertuples(index=False)
+        ])
+
+        return {
+            'rule_id': rule.id,
+            'period_start': start_date,
+            'period_end': end_date,
+            'shared_cost': float(source['cost'].sum()) if len(source) else 0.0,
+            'allocated_cost': float(allocations.loc[allocations['target_value'] != UNALLOCATED, 'allocated_cost'].sum()),
+            'allocation_count': len(allocations)
+        }
+
+    def _source_costs(self, rule: AllocationRule, start_date: datetime, end_date: datetime,
+                      account_ids: Optional[List[int]]) -> pd.DataFrame:
+        """Shared cost per (account, day, service) selected by the rule's source filter."""
+        day = func.date_trunc('day', CostData.date)
+        query = self.db.query(
+            CostData.cloud_account_id,
+            day.label('day'),
+            CostData.service,
+            func.sum(CostData.cost).label('cost')
+        ).filter(
+            CostData.date >= start_date,
+            CostData.date < end_date
+        )
+        query = filter_accounts(query, CostData.cloud_account_id, account_ids)
+
+        if rule.source_services:
+            query = query.filter(CostData.service.in_(rule.source_services))
+
+        if rule.source_untagged_only:
+            query = query.filter(CostData.tags[rule.target_tag_key].as_string().is_(None))
+
+        rows = query.group_by(CostData.cloud_account_id, day, CostData.service).all()
+        return pd.DataFrame.from_records(rows, columns=['cloud_account_id', 'day', 'service', 'cost'])
+
+    def _driver_weights(self, rule: AllocationRule, start_date: datetime, end_date: datetime,
+                        account_ids: Optional[List[int]]) -> pd.DataFrame:
+        """Driver metric per (account, day, target tag value)."""
+        day = func.date_trunc('day', CostData.date)
+        target = CostData.tags[rule.target_tag_key].as_string()
+
+        if rule.driver == "resource_count":
+            weight = func.count(distinct(CostData.resource_id))
+        elif rule.driver == "even":
+            weight = literal(1)
+        else:
+            weight = func.sum(CostData.cost)
+
+        query = self.db.query(
+            CostData.cloud_account_id,
+            day.label('day'),
+            target.label('target_value'),
+            weight.label('weight')
+        ).filter(
+            CostData.date >= start_date,
+            CostData.date < end_date,
+            target.isnot(None)
+        )
+        query = filter_accounts(query, CostData.cloud_account_id, account_ids)
+
+        rows = query.group_by(CostData.cloud_account_id, day, target).all()
+        return pd.DataFrame.from_records(rows, columns=['cloud_account_id', 'day', 'target_value', 'weight'])
+
+def allocate(source: pd.DataFrame, drivers: pd.DataFrame) -> pd.DataFrame:
+    """
+    Split source cost per (account, day, service) across target values by
+    the driver's share within the same account and day.
+
+    source has cloud_account_id, day, service and cost columns; drivers has
+    cloud_account_id, day, target_value and weight columns. Source cost in
+    accounts and days with no positive driver weight is kept under UNALLOCATED.
+    A missing account is matched like any other key.
+    """
+    keys = ['cloud_account_id', 'day']
+    columns = keys + ['service', 'target_value', 'allocated_cost']
+    if source.empty:
+        return pd.DataFrame(columns=columns)
+
+    drivers = drivers[drivers['weight'] > 0].copy()
+    drivers['weight'] = drivers['weight'].astype(float)
+    drivers['share'] = drivers['weight'] / drivers.groupby(keys, dropna=False)['weight'].transform('sum')
+
+    merged = source.merge(drivers[keys + ['target_value', 'share']], on=keys, how='left')
+    merged['target_value'] = merged['target_value'].fillna(UNALLOCATED)
+    merged['allocated_cost'] = merged['cost'] * merged['share'].fillna(1.0)
+
+    return merged[columns]
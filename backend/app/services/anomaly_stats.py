@@ -0,0 +1,199 @@
+# app/services/anomaly_stats.py
+from datetime import datetime
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.db.models import CostData
+from app.services.query_filters import filter_accounts
+
+# Rows of a resources x days matrix whose trailing windows are materialized at once
+ROLLING_CHUNK_ROWS = 20_000
+
+def grouped_mean_std(codes: np.ndarray, values: np.ndarray, n_groups: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Population mean and standard deviation of values per group code.
+
+    Uses the same two-pass formula as np.mean/np.std, so a constant group has
+    a standard deviation of exactly 0. Returns (counts, means, stds), one
+    entry per group.
+    """
+    counts = np.bincount(codes, minlength=n_groups)
+    safe_counts = np.maximum(counts, 1)
+
+    means = np.bincount(codes, weights=values, minlength=n_groups) / safe_counts
+    deviations = values - means[codes]
+    stds = np.sqrt(np.bincount(codes, weights=deviations * deviations, minlength=n_groups) / safe_counts)
+
+    return counts, means, stds
+
+def zscore_outliers(frame: pd.DataFrame, group_columns: List[str], sensitivity: float, min_points: int = 5) -> pd.DataFrame:
+    """
+    Score every cost row against its group's mean and standard deviation.
+
+    Groups with fewer than min_points rows or no variation are skipped.
+    Returns the rows whose absolute z-score exceeds sensitivity, with z_score
+    and avg_cost columns added, ordered by group (in order of first
+    appearance) and then by their position in frame.
+    """
+    if frame.empty:
+        return frame.assign(z_score=pd.Series(dtype=float), avg_cost=pd.Series(dtype=float))
+
+    codes = frame.groupby(group_columns, sort=False, dropna=False).ngroup().to_numpy()
+    n_groups = int(codes.max()) + 1
+
+    values = frame['cost'].to_numpy(dtype=np.float64)
+    counts, means, stds = grouped_mean_std(codes, values, n_groups)
+
+    scored = (counts >= min_points) & (stds != 0)
+    row_scored = scored[codes]
+
+    z = np.zeros(len(values))
+    z[row_scored] = (values[row_scored] - means[codes][row_scored]) / stds[codes][row_scored]
+
+    mask = row_scored & (np.abs(z) > sensitivity)
+
+    # Group-major order, matching a loop over groups in first-appearance order
+    positions = np.flatnonzero(mask)
+    positions = positions[np.argsort(codes[positions], kind='stable')]
+
+    outliers = frame.iloc[positions].copy()
+    outliers['z_score'] = z[positions]
+    outliers['avg_cost'] = means[codes[positions]]
+    return outliers
+
+def zscore_outlier_query(db: Session, partition_columns: List, cutoff_date: datetime,
+                         account_ids: Optional[List[int]], sensitivity: float, min_points: int = 5):
+    """
+    Build a query that scores cost rows against their partition in the database.
+
+    Per-partition avg, stddev_pop and count are computed with window functions
+    and only rows with abs(z) > sensitivity are returned, with their account,
+    baseline (avg_cost, std_cost) and z_score, most anomalous first. Partitions with
+    fewer than min_points rows or no variation are skipped, as in
+    zscore_outliers.
+    """
+    window = {'partition_by': partition_columns}
+    scored = db.query(
+        CostData.id,
+        CostData.cloud_account_id,
+        CostData.date,
+        CostData.service,
+        CostData.resource_id,
+        CostData.cost,
+        func.avg(CostData.cost).over(**window).label('avg_cost'),
+        func.stddev_pop(CostData.cost).over(**window).label('std_cost'),
+        func.count(CostData.id).over(**window).label('point_count')
+    ).filter(CostData.date >= cutoff_date)
+
+    scored = filter_accounts(scored, CostData.cloud_account_id, account_ids).subquery()
+
+    z_score = ((scored.c.cost - scored.c.avg_cost) / scored.c.std_cost).label('z_score')
+
+    return db.query(
+        scored.c.cloud_account_id,
+        scored.c.date,
+        scored.c.service,
+        scored.c.resource_id,
+        scored.c.cost,
+        scored.c.avg_cost,
+        scored.c.std_cost,
+        z_score
+    ).filter(
+        scored.c.point_count >= min_points,
+        scored.c.std_cost > 0,
+        func.abs(scored.c.cost - scored.c.avg_cost) > sensitivity * scored.c.std_cost
+    ).order_by(
+        func.abs(z_score).desc(), scored.c.service, scored.c.date, scored.c.id
+    )
+
+def trailing_windows(matrix: np.ndarray, window: int) -> np.ndarray:
+    """
+    The window days before each day of every row, as a (rows, days, window)
+    view. Days before the first column are NaN, and the day itself is never
+    part of its own window.
+    """
+    padded = np.concatenate([np.full((matrix.shape[0], window), np.nan), matrix], axis=1)
+    return sliding_window_view(padded[:, :-1], window, axis=1)
+
+def rolling_robust_scores(matrix: np.ndarray, window: int, min_periods: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Robust z-score of every cell against the median and MAD of its row's
+    trailing window: (x - median) / (1.4826 * MAD). Missing days (NaN) are
+    ignored. Cells with fewer than min_periods prior values or a zero MAD
+    score NaN. Returns (scores, medians).
+    """
+    scores = np.full(matrix.shape, np.nan)
+    medians = np.full(matrix.shape, np.nan)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for start in range(0, matrix.shape[0], ROLLING_CHUNK_ROWS):
+            rows = slice(start, start + ROLLING_CHUNK_ROWS)
+            windows = trailing_windows(matrix[rows], window)
+            enough = np.isfinite(windows).sum(axis=2) >= min_periods
+
+            # All-NaN windows are expected for the first days; skip them instead of warning
+            median = np.full(enough.shape, np.nan)
+            median[enough] = np.nanmedian(windows[enough], axis=1)
+            mad = np.full(enough.shape, np.nan)
+            mad[enough] = np.nanmedian(np.abs(windows[enough] - median[enough][:, None]), axis=1)
+
+            scale = np.where(mad > 0, 1.4826 * mad, np.nan)
+            scores[rows] = (matrix[rows] - median) / scale
+            medians[rows] = median
+
+    return scores, medians
+
+def trailing_zscores(matrix: np.ndarray, window: int, min_periods: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Z-score of every cell against the mean and population standard deviation
+    of its row's trailing window, so a spike never inflates its own baseline.
+    Missing days (NaN) are ignored. Cells with fewer than min_periods prior
+    values or no variation score NaN. Returns (scores, means).
+
+    The variance takes two passes over each window (deviations from the
+    window mean), not running sums of squares, which cancel catastrophically
+    on large, nearly flat costs.
+    """
+    scores = np.full(matrix.shape, np.nan)
+    means = np.full(matrix.shape, np.nan)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for start in range(0, matrix.shape[0], ROLLING_CHUNK_ROWS):
+            rows = slice(start, start + ROLLING_CHUNK_ROWS)
+            windows = trailing_windows(matrix[rows], window)
+            observed = np.isfinite(windows)
+            counts = observed.sum(axis=2)
+
+            mean = np.where(observed, windows, 0.0).sum(axis=2) / counts
+            deviations = np.where(observed, windows - mean[:, :, None], 0.0)
+            std = np.sqrt((deviations * deviations).sum(axis=2) / counts)
+
+            valid = (counts >= min_periods) & (std > 1e-9 * np.abs(mean))
+            scores[rows] = np.where(valid, (matrix[rows] - mean) / std, np.nan)
+            means[rows] = np.where(counts > 0, mean, np.nan)
+
+    return scores, means
+
+def weekday_profile(matrix: np.ndarray, weekdays: np.ndarray) -> np.ndarray:
+    """
+    Each row's typical cost per day of week relative to its overall median,
+    as a (rows, 7) array. Medians keep spikes from shifting the profile.
+    Weekdays without observations, and rows with a zero median, get 1.
+    """
+    profile = np.ones((matrix.shape[0], 7))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        observed = np.isfinite(matrix).any(axis=1)
+        overall = np.full(matrix.shape[0], np.nan)
+        overall[observed] = np.nanmedian(matrix[observed], axis=1)
+
+        for weekday in range(7):
+            days = matrix[:, weekdays == weekday]
+            rows = np.isfinite(days).any(axis=1) & (overall > 0)
+            profile[rows, weekday] = np.nanmedian(days[rows], axis=1) / overall[rows]
+
+    return np.where(np.isfinite(profile) & (profile > 0), profile, 1.0)
@@ -0,0 +1,178 @@
+# app/services/anomaly_store.py
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import hashlib
+import json
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.db.models import Anomaly, User
+from app.services.enhanced_anomaly_detection import EnhancedAnomalyDetection
+from app.services.query_filters import filter_accounts
+
+ANOMALY_STATUSES = ['open', 'acknowledged', 'suppressed']
+
+# Rows per INSERT ... ON CONFLICT statement
+UPSERT_CHUNK_SIZE = 1000
+
+# Columns refreshed when a run detects an anomaly again; status is left alone
+DETECTION_COLUMNS = ['cost', 'avg_cost', 'percent_difference', 'confidence', 'explanation', 'last_detected_at']
+
+def anomaly_id(cloud_account_id: int, service: str, resource_id: str, day: datetime, detection_method: str) -> str:
+    """Deterministic id of an anomaly, so repeated runs update the same row."""
+    key = f"{cloud_account_id}|{service}|{resource_id}|{day.date().isoformat()}|{detection_method}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+class AnomalyStore:
+    """Service for persisting detected anomalies and paging through them."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def run(self, account_ids: Optional[List[int]] = None, days: int = 30, sensitivity: float = 2.0,
+            detection_methods: Optional[List[str]] = None, time_budget: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Run the enhanced detectors and upsert what they find.
+        Returns the number of anomalies detected and stored, with the
+        detectors' partial flag and timings. The caller is responsible for committing.
+        """
+        result = EnhancedAnomalyDetection(self.db).detect_anomalies(
+            account_ids=account_ids,
+            days=days,
+            sensitivity=sensitivity,
+            detection_methods=detection_methods,
+            time_budget=time_budget,
+            include_meta=True
+        )
+
+        stored = self.record(result['anomalies'])
+
+        return {
+            'detected': len(result['anomalies']),
+            'stored': stored,
+            'partial': result['partial'],
+            'timings': result['timings'],
+            'completed_methods': result['completed_methods'],
+            'incomplete_methods': result['incomplete_methods']
+        }
+
+    def record(self, anomalies: List[Dict[str, Any]]) -> int:
+        """
+        Upsert detector output into the anomalies table.
+
+        Each anomaly is stored under the account its cost series was built
+        from; anomalies of cost rows without an account are skipped. New
+        anomalies start open; ones seen before get their figures refreshed and
+        keep their status. Returns the number of rows written.
+        """
+        if not anomalies:
+            return 0
+
+        detected_at = datetime.utcnow()
+
+        rows = {}
+        for anomaly in anomalies:
+            account_id = anomaly['cloud_account_id']
+            if account_id is None:
+                continue
+
+            day = anomaly['date'].replace(hour=0, minute=0, second=0, microsecond=0)
+            row_id = anomaly_id(account_id, anomaly['service'], anomaly['resource_id'], day, anomaly['detection_method'])
+            rows[row_id] = {
+                'id': row_id,
+                'cloud_account_id': account_id,
+                'service': anomaly['service'],
+                'resource_id': anomaly['resource_id'],
+                'date': day,
+                'detection_method': anomaly['detection_method'],
+                'cost': float(anomaly['cost']),
+                'avg_cost': float(anomaly['avg_cost']),
+                'percent_difference': float(anomaly['percent_difference']),
+                'confidence': float(anomaly['confidence']),
+                'explanation': anomaly.get('explanation'),
+                'status': 'open',
+                'first_detected_at': detected_at,
+                'last_detected_at': detected_at
+            }
+
+        values = list(rows.values())
+        for i in range(0, len(values), UPSERT_CHUNK_SIZE):
+            statement = insert(Anomaly).values(values[i:i + UPSERT_CHUNK_SIZE])
+            statement = statement.on_conflict_do_update(
+                index_elements=[Anomaly.id],
+                set_={column: statement.excluded[column] for column in DETECTION_COLUMNS}
+            )
+            self.db.execute(statement)
+
+        return len(values)
+
+    def get_page(self, account_ids: Optional[List[int]] = None, status: Optional[str] = 'open',
+                 service: Optional[str] = None, detection_method: Optional[str] = None,
+                 min_confidence: Optional[float] = None, cursor: Optional[str] = None,
+                 limit: int = 100) -> Dict[str, Any]:
+        """
+        Get one page of stored anomalies, most confident first.
+
+        Uses keyset pagination on (confidence, id), so with a status filter
+        every page is a range scan on ix_anomalies_status_confidence_id.
+        status None lists every status. Raises ValueError for an unknown
+        status or a malformed cursor.
+        """
+        query = self.db.query(Anomaly)
+        query = filter_accounts(query, Anomaly.cloud_account_id, account_ids)
+
+        if status is not None:
+            if status not in ANOMALY_STATUSES:
+                raise ValueError(f"Unknown status: {status}")
+            query = query.filter(Anomaly.status == status)
+
+        if service:
+            query = query.filter(Anomaly.service == service)
+
+        if detection_method:
+            query = query.filter(Anomaly.detection_method == detection_method)
+
+        if min_confidence is not None:
+            query = query.filter(Anomaly.confidence >= min_confidence)
+
+        if cursor:
+            last_confidence, last_id = decode_anomaly_cursor(cursor)
+            query = query.filter(tuple_(Anomaly.confidence, Anomaly.id) < tuple_(last_confidence, last_id))
+
+        # Fetch one extra row to find out whether another page exists
+        rows = query.order_by(Anomaly.confidence.desc(), Anomaly.id.desc()).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_anomaly_cursor(rows[-1].confidence, rows[-1].id)
+
+        return {'items': rows, 'next_cursor': next_cursor}
+
+    def set_status(self, anomaly: Anomaly, status: str, user: User) -> Anomaly:
+        """
+        Acknowledge, suppress or reopen an anomaly.
+        Raises ValueError for an unknown status. The caller is responsible for committing.
+        """
+        if status not in ANOMALY_STATUSES:
+            raise ValueError(f"Unknown status: {status}")
+
+        anomaly.status = status
+        anomaly.status_updated_at = datetime.utcnow()
+        anomaly.status_updated_by = user.id
+        return anomaly
+
+def encode_anomaly_cursor(last_confidence: float, last_id: str) -> str:
+    """Encode the position of the last returned anomaly as an opaque cursor."""
+    payload = json.dumps([last_confidence, last_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+def decode_anomaly_cursor(cursor: str) -> Tuple[float, str]:
+    """Decode a cursor produced by encode_anomaly_cursor."""
+    try:
+        last_confidence, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(last_confidence), str(last_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
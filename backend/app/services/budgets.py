@@ -0,0 +1,301 @@
+# app/services/budgets.py
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+
+from app.db.models import Budget, BudgetAlert, CloudAccount, CostData, User
+from app.services.query_filters import filter_accounts
+from app.services.rollups import month_start, next_month
+
+DEFAULT_THRESHOLDS = [50.0, 80.0, 100.0]
+
+# Budget dimensions besides the account; every combination is matched with one merge
+SCOPE_KEYS = {
+    'service': ['service'],
+    'tag': ['tag_key', 'tag_value']
+}
+
+class BudgetEvaluator:
+    """Service for keeping budget month-to-date spend current and recording threshold alerts."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def apply_batch(self, batch: pd.DataFrame) -> List[BudgetAlert]:
+        """
+        Add a batch of newly ingested cost rows to every matching budget.
+
+        batch has cloud_account_id, service, date, tags and cost columns. The
+        batch is aggregated once per budget shape (account only, + service,
+        + tag, + both) and joined against all budgets of that shape, so the
+        cost is proportional to the batch and the number of budgets, never to
+        the cost history. Budgets whose month has rolled over start again from
+        zero; rows for months before a budget's current month are ignored.
+        The touched budget rows stay locked until the caller commits, so
+        concurrent batches add to month-to-date spend one after the other.
+        Returns the alerts created. The caller is responsible for committing.
+        """
+        budgets = self._load_budgets()
+        if budgets.empty or batch.empty:
+            return []
+
+        deltas = budget_deltas(budgets, self._budget_accounts(budgets), batch)
+        if deltas.empty:
+            return []
+
+        state = budgets.set_index('budget_id')[['current_month', 'month_to_date', 'amount', 'thresholds']]
+
+        # Another ingest may have added to these budgets since they were loaded
+        locked = self._lock_spend(deltas['budget_id'].unique().tolist())
+        state.loc[locked.index, ['current_month', 'month_to_date']] = locked
+        alerts = []
+
+        # Batches rarely span more than a month boundary, so this loop is short
+        for month, month_deltas in deltas.groupby('month', sort=True):
+            month_deltas = month_deltas.set_index('budget_id')
+            current = state.loc[month_deltas.index]
+
+            rolled_over = current['current_month'].isna() | (current['current_month'] < month)
+            late = current['current_month'] > month
+
+            previous = current['month_to_date'].where(~rolled_over, 0.0)
+            spend = previous + month_deltas['cost']
+
+            live = ~late
+            alerts.extend(self._crossings(current[live], previous[live], spend[live], month))
+
+            state.loc[live[live].index, 'current_month'] = month
+            state.loc[live[live].index, 'month_to_date'] = spend[live]
+
+        touched = deltas['budget_id'].unique()
+        updated_at = datetime.utcnow()
+        self.db.bulk_update_mappings(Budget, [
+            {
+                'id': int(budget_id),
+                'current_month': pd.Timestamp(state.at[budget_id, 'current_month']).to_pydatetime(),
+                'month_to_date': float(state.at[budget_id, 'month_to_date']),
+                'updated_at': updated_at
+            }
+            for budget_id in touched
+            if pd.notna(state.at[budget_id, 'current_month'])
+        ])
+
+        return self._save_alerts(alerts)
+
+    def rebuild(self, budget: Budget, as_of: Optional[datetime] = None) -> List[BudgetAlert]:
+        """
+        Recompute a budget's month-to-date spend from the raw cost data.
+        Used when a budget is created or its scope changes; thresholds already
+        exceeded are alerted straight away. The caller is responsible for committing.
+        """
+        month = month_start(as_of or datetime.utcnow())
+
+        query = self.db.query(func.coalesce(func.sum(CostData.cost), 0.0)).filter(
+            CostData.date >= month,
+            CostData.date < next_month(month)
+        )
+        query = filter_accounts(query, CostData.cloud_account_id, self._accounts_for(budget))
+
+        if budget.service:
+            query = query.filter(CostData.service == budget.service)
+
+        if budget.tag_key:
+            query = query.filter(CostData.tags.contains({budget.tag_key: budget.tag_value}))
+
+        spend = float(query.scalar())
+
+        budget.current_month = month
+        budget.month_to_date = spend
+        budget.updated_at = datetime.utcnow()
+
+        current = pd.DataFrame(
+            {'amount': [budget.amount], 'thresholds': [budget.thresholds or DEFAULT_THRESHOLDS]},
+            index=pd.Index([budget.id], name='budget_id')
+        )
+        crossings = self._crossings(current, pd.Series([0.0], index=current.index),
+                                    pd.Series([spend], index=current.index), month)
+
+        return self._save_alerts(crossings)
+
+    def _lock_spend(self, budget_ids: List[int]) -> pd.DataFrame:
+        """
+        Lock budget rows with SELECT ... FOR UPDATE and re-read their current
+        month and month-to-date spend, indexed by budget_id. Rows are locked in
+        id order, so concurrent batches cannot deadlock on each other.
+        """
+        rows = self.db.query(Budget.id, Budget.current_month, Budget.month_to_date).filter(
+            Budget.id.in_(budget_ids)
+        ).order_by(Budget.id).with_for_update().all()
+
+        locked = pd.DataFrame.from_records(rows, columns=['budget_id', 'current_month', 'month_to_date']).set_index('budget_id')
+        locked['month_to_date'] = locked['month_to_date'].fillna(0.0).astype(float)
+        locked['current_month'] = pd.to_datetime(locked['current_month'])
+        return locked
+
+    def _load_budgets(self) -> pd.DataFrame:
+        """All budgets with the owner's admin flag, as one frame."""
+        rows = self.db.query(
+            Budget.id.label('budget_id'),
+            Budget.owner_id,
+            User.is_admin,
+            Budget.cloud_account_id,
+            Budget.service,
+            Budget.tag_key,
+            Budget.tag_value,
+            Budget.amount,
+            Budget.thresholds,
+            Budget.current_month,
+            Budget.month_to_date
+        ).join(User, User.id == Budget.owner_id).all()
+
+        budgets = pd.DataFrame.from_records(rows, columns=[
+            'budget_id', 'owner_id', 'is_admin', 'cloud_account_id', 'service', 'tag_key',
+            'tag_value', 'amount', 'thresholds', 'current_month', 'month_to_date'
+        ])
+        budgets['month_to_date'] = budgets['month_to_date'].fillna(0.0).astype(float)
+        budgets['current_month'] = pd.to_datetime(budgets['current_month'])
+        budgets['thresholds'] = budgets['thresholds'].map(lambda t: t or DEFAULT_THRESHOLDS)
+        return budgets
+
+    def _budget_accounts(self, budgets: pd.DataFrame) -> pd.DataFrame:
+        """
+        Expand budgets to one row per account they cover.
+        Budgets without an account cover all of their owner's accounts, or
+        every account when the owner is an admin.
+        """
+        accounts = pd.DataFrame.from_records(
+            self.db.query(CloudAccount.id, CloudAccount.owner_id).all(),
+            columns=['account_id', 'owner_id']
+        )
+
+        pinned = budgets[budgets['cloud_account_id'].notna()][['budget_id', 'cloud_account_id']]
+
+        open_budgets = budgets[budgets['cloud_account_id'].isna()]
+        owned = open_budgets[~open_budgets['is_admin'].astype(bool)][['budget_id', 'owner_id']].merge(
+            accounts, on='owner_id'
+        )
+        everything = open_budgets[open_budgets['is_admin'].astype(bool)][['budget_id']].merge(
+            accounts[['account_id']], how='cross'
+        )
+
+        expanded = pd.concat([
+            pinned.rename(columns={'cloud_account_id': 'account_id'}),
+            owned[['budget_id', 'account_id']],
+            everything[['budget_id', 'account_id']]
+        ], ignore_index=True)
+        expanded['account_id'] = expanded['account_id'].astype(np.int64)
+
+        return expanded.rename(columns={'account_id': 'cloud_account_id'})
+
+    def _accounts_for(self, budget: Budget) -> Optional[List[int]]:
+        """Accounts a single budget covers (None means all accounts)."""
+        if budget.cloud_account_id is not None:
+            return [budget.cloud_account_id]
+
+        if budget.owner.is_admin:
+            return None
+
+        return [a.id for a in self.db.query(CloudAccount.id).filter(CloudAccount.owner_id == budget.owner_id)]
+
+    def _crossings(self, current: pd.DataFrame, previous: pd.Series, spend: pd.Series,
+                   month: datetime) -> List[Dict[str, Any]]:
+        """Thresholds each budget passed when its spend moved from previous to spend."""
+        if current.empty:
+            return []
+
+        levels = current[['amount', 'thresholds']].assign(previous=previous, spend=spend).explode('thresholds')
+        levels['threshold'] = levels['thresholds'].astype(float)
+        limit = levels['amount'] * levels['threshold'] / 100.0
+
+        crossed = levels[(levels['previous'] < limit) & (levels['spend'] >= limit)]
+
+        return [
+            {
+                'budget_id': int(budget_id),
+                'month': pd.Timestamp(month).to_pydatetime(),
+                'threshold': float(row.threshold),
+                'spend': float(row.spend),
+                'amount': float(row.amount)
+            }
+            for budget_id, row in zip(crossed.index, crossed.itertuples(index=False))
+        ]
+
+    def _save_alerts(self, alerts: List[Dict[str, Any]]) -> List[BudgetAlert]:
+        """
+        Persist alert rows, skipping thresholds already alerted for that budget
+        and month. A threshold is crossed again in the same month when the
+        amount is raised or a credit takes spend back under it.
+        """
+        if not alerts:
+            return []
+
+        existing = set(self.db.query(BudgetAlert.budget_id, BudgetAlert.month, BudgetAlert.threshold).filter(
+            tuple_(BudgetAlert.budget_id, BudgetAlert.month).in_({(a['budget_id'], a['month']) for a in alerts})
+        ).all())
+
+        created_at = datetime.utcnow()
+        records = []
+        for alert in alerts:
+            key = (alert['budget_id'], alert['month'], alert['threshold'])
+            if key in existing:
+                continue
+            existing.add(key)
+            records.append(BudgetAlert(created_at=created_at, **alert))
+        self.db.add_all(records)
+        return records
+
+def budget_deltas(budgets: pd.DataFrame, budget_accounts: pd.DataFrame, batch: pd.DataFrame) -> pd.DataFrame:
+    """
+    Spend added to each budget by a batch, per month.
+
+    budget_accounts maps budget_id to every cloud_account_id the budget
+    covers. Returns budget_id, month and cost columns.
+    """
+    batch = batch.assign(month=pd.to_datetime(batch['date']).dt.to_period('M').dt.to_timestamp())
+
+    by_service = batch.groupby(['cloud_account_id', 'service', 'month'], dropna=False)['cost'].sum().reset_index()
+
+    # One row per (cost row, tag) pair; only needed when tag budgets exist
+    by_tag = None
+    if budgets['tag_key'].notna().any():
+        tagged = batch[['cloud_account_id', 'service', 'month', 'cost']].assign(
+            tag=batch['tags'].map(lambda t: list(t.items()) if isinstance(t, dict) else [])
+        ).explode('tag').dropna(subset=['tag'])
+        tagged['tag_key'] = tagged['tag'].str[0]
+        tagged['tag_value'] = tagged['tag'].str[1].astype(str)
+        by_tag = tagged.groupby(
+            ['cloud_account_id', 'service', 'tag_key', 'tag_value', 'month'], dropna=False
+        )['cost'].sum().reset_index()
+
+    scoped = budget_accounts.merge(
+        budgets[['budget_id', 'service', 'tag_key', 'tag_value']], on='budget_id'
+    )
+
+    parts = []
+    for has_service in (False, True):
+        for has_tag in (False, True):
+            shape = scoped[
+                (scoped['service'].notna() == has_service) & (scoped['tag_key'].notna() == has_tag)
+            ]
+            if shape.empty or (has_tag and by_tag is None):
+                continue
+
+            keys = ['cloud_account_id']
+            if has_service:
+                keys += SCOPE_KEYS['service']
+            if has_tag:
+                keys += SCOPE_KEYS['tag']
+
+            source = by_tag if has_tag else by_service
+            spend = source.groupby(keys + ['month'])['cost'].sum().reset_index()
+
+            matched = shape[['budget_id'] + keys].merge(spend, on=keys)
+            parts.append(matched[['budget_id', 'month', 'cost']])
+
+    if not parts:
+        return pd.DataFrame(columns=['budget_id', 'month', 'cost'])
+
+    return pd.concat(parts, ignore_index=True).groupby(['budget_id', 'month'])['cost'].sum().reset_index()
@@ -0,0 +1,120 @@
+# app/services/correlation.py
+from typing import Dict, Tuple
+import numpy as np
+
+# Rows of the correlation matrix computed per matrix product (block x resources floats)
+CORRELATION_BLOCK_SIZE = 512
+
+# Neighbors kept per resource, and how closely they must co-move to count as peers
+PEER_COUNT = 10
+MIN_PEER_CORRELATION = 0.7
+MIN_PEERS = 2
+
+# Trailing days checked for a break; the days before them are the baseline
+RECENT_DAYS = 7
+
+# Residual standard deviations a recent day must reach to count as a break. Peers
+# and the fit are chosen on the baseline, so baseline residuals understate recent
+# ones and the bar is set higher than for the z-score detectors.
+BREAK_SENSITIVITY = 5.0
+
+def standardize(matrix: np.ndarray, baseline_days: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Scale every row by the mean and standard deviation of its first
+    baseline_days columns. Rows that are constant over the baseline are
+    zeroed and marked invalid. Returns (standardized matrix, valid mask).
+    """
+    baseline = matrix[:, :baseline_days]
+    means = baseline.mean(axis=1, keepdims=True)
+    stds = baseline.std(axis=1, keepdims=True)
+
+    valid = stds[:, 0] > 0
+    standardized = np.where(valid[:, None], (matrix - means) / np.where(stds > 0, stds, 1.0), 0.0)
+    return standardized, valid
+
+def top_k_neighbors(standardized: np.ndarray, k: int = PEER_COUNT,
+                    block_size: int = CORRELATION_BLOCK_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The k most correlated other rows of every row, strongest first.
+
+    Rows must be standardized (zero mean, unit population std), so Pearson
+    correlation is a scaled dot product. The correlation matrix is built one
+    block of rows at a time and reduced to its top k straight away, so memory
+    stays at block_size x rows. Returns (indices, correlations), each rows x k.
+    """
+    n_rows, n_days = standardized.shape
+    k = min(k, n_rows - 1)
+
+    indices = np.empty((n_rows, k), dtype=np.int64)
+    correlations = np.empty((n_rows, k))
+    if k <= 0:
+        return indices, correlations
+
+    for start in range(0, n_rows, block_size):
+        stop = min(start + block_size, n_rows)
+        block = standardized[start:stop] @ standardized.T / n_days
+
+        # A row is not its own neighbor
+        block[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_correlations = np.take_along_axis(block, top, axis=1)
+
+        order = np.argsort(-top_correlations, axis=1)
+        indices[start:stop] = np.take_along_axis(top, order, axis=1)
+        correlations[start:stop] = np.take_along_axis(top_correlations, order, axis=1)
+
+    return indices, correlations
+
+def correlation_breaks(matrix: np.ndarray, recent_days: int = RECENT_DAYS,
+                       sensitivity: float = BREAK_SENSITIVITY, k: int = PEER_COUNT,
+                       min_correlation: float = MIN_PEER_CORRELATION,
+                       block_size: int = CORRELATION_BLOCK_SIZE) -> Dict[str, np.ndarray]:
+    """
+    Find rows of a resources x days cost matrix that stopped moving with their peers.
+
+    Peers are each row's top-k neighbors with a baseline correlation of at
+    least min_correlation (at least MIN_PEERS of them). Each row is regressed
+    on its peers' median standardized series over the baseline. A break is a
+    recent day whose residual exceeds sensitivity times the baseline residual
+    standard deviation. Returns per-row arrays: flagged, score (largest recent
+    residual in standard deviations), break_day (column of that residual),
+    peers (neighbor indices), peer_mask (which neighbors are peers) and
+    peer_correlation (mean correlation with the peers).
+    """
+    n_rows, n_days = matrix.shape
+    baseline_days = n_days - recent_days
+
+    standardized, valid = standardize(np.asarray(matrix, dtype=np.float64), baseline_days)
+    peers, correlations = top_k_neighbors(standardized[:, :baseline_days], k, block_size)
+
+    peer_mask = (correlations >= min_correlation) & valid[:, None]
+    peer_counts = peer_mask.sum(axis=1)
+
+    # Median standardized series of each row's peers, so one peer's own break does not spread
+    peer_values = np.where(peer_mask[:, :, None], standardized[peers], np.nan)
+    peer_series = np.zeros((n_rows, n_days))
+    has_peers = peer_counts > 0
+    peer_series[has_peers] = np.nanmedian(peer_values[has_peers], axis=1)
+
+    baseline = slice(0, baseline_days)
+    denominator = (peer_series[:, baseline] ** 2).sum(axis=1)
+    beta = (standardized[:, baseline] * peer_series[:, baseline]).sum(axis=1) / np.where(denominator > 0, denominator, 1.0)
+
+    residuals = standardized - beta[:, None] * peer_series
+    residual_std = residuals[:, baseline].std(axis=1)
+
+    recent = np.abs(residuals[:, baseline_days:]) / np.where(residual_std > 0, residual_std, 1.0)[:, None]
+    break_offset = recent.argmax(axis=1)
+    score = recent[np.arange(n_rows), break_offset]
+
+    grouped = valid & (peer_counts >= MIN_PEERS) & (residual_std > 0)
+
+    return {
+        'flagged': grouped & (score > sensitivity),
+        'score': np.where(grouped, score, 0.0),
+        'break_day': baseline_days + break_offset,
+        'peers': peers,
+        'peer_mask': peer_mask,
+        'peer_correlation': np.where(peer_counts > 0, (correlations * peer_mask).sum(axis=1) / np.maximum(peer_counts, 1), 0.0)
+    }
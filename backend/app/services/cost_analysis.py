@@ -4,9 +4,12 @@ from typing import List, Dict, Any, Optional
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 import numpy as np
+import pandas as pd
 from scipy import stats
 
 from app.db.models import CostData, CloudAccount
+from app.services import anomaly_stats
+from app.services.query_filters import filter_accounts
 
 class CostAnalysisService:
     """Service for analyzing cost data and generating recommendations."""
@@ -14,7 +17,7 @@ class CostAnalysisService:
     def __init__(self, db: Session):
         self.db = db
 
-    def get_daily_costs(self, account_id: Optional[int] = None, days: int = 30) -> List[Dict[str, Any]]:
+    def get_daily_costs(self, account_ids: Optional[List[int]] = None, days: int = 30) -> List[Dict[str, Any]]:
         """Get daily costs for the specified period."""
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
@@ -23,12 +26,11 @@ class CostAnalysisService:
             func.sum(CostData.cost).label('total_cost')
         ).filter(CostData.date >= cutoff_date)
         
-        if account_id:
-            query = query.filter(CostData.cloud_account_id == account_id)
+        query = filter_accounts(query, CostData.cloud_account_id, account_ids)
             
         return query.group_by('day').order_by('day').all()
 
-    def get_costs_by_service(self, account_id: Optional[int] = None, days: int = 30) -> List[Dict[str, Any]]:
+    def get_costs_by_service(self, account_ids: Optional[List[int]] = None, days: int = 30) -> List[Dict[str, Any]]:
         """Get costs grouped by service for the specified period."""
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
@@ -37,25 +39,44 @@ class CostAnalysisService:
             func.sum(CostData.cost).label('total_cost')
         ).filter(CostData.date >= cutoff_date)
         
-        if account_id:
-            query = query.filter(CostData.cloud_account_id == account_id)
+        query = filter_accounts(query, CostData.cloud_account_id, account_ids)
             
         return query.group_by(CostData.service).order_by(desc('total_cost')).all()
 
-    def detect_anomalies(self, account_id: Optional[int] = None, days: int = 30, 
-                         sensitivity: float = 2.0) -> List[Dict[str, Any]]:
+    def detect_anomalies(self, account_ids: Optional[List[int]] = None, days: int = 30, 
+                         sensitivity: float = 2.0, in_database: bool = True) -> List[Dict[str, Any]]:
         """
         Detect cost anomalies using Z-score method.
         
         Parameters:
-        - account_id: Optional cloud account ID to filter by
+        - account_ids: Optional list of cloud account IDs to restrict to
         - days: Number of days to analyze
         - sensitivity: Z-score threshold (default 2.0, lower = more sensitive)
+        - in_database: Score rows with window functions in SQL so only the
+                       anomalies are fetched; False loads the window and scores it here
         
         Returns list of anomalies with service, date, cost, and z-score
         """
         cutoff_date = datetime.utcnow() - timedelta(days=days)
         
+        if in_database:
+            rows = anomaly_stats.zscore_outlier_query(
+                self.db, [CostData.service], cutoff_date, account_ids, sensitivity, min_points=5
+            ).all()
+            
+            return [
+                {
+                    'service': row.service,
+                    'date': row.date,
+                    'resource_id': row.resource_id,
+                    'cost': row.cost,
+                    'z_score': row.z_score,
+                    'avg_cost': row.avg_cost,
+                    'percent_difference': ((row.cost - row.avg_cost) / row.avg_cost) * 100 if row.avg_cost else 0.0
+                }
+                for row in rows
+            ]
+        
         # Get daily costs by service
         query = self.db.query(
             CostData.date,
@@ -64,54 +85,55 @@ class CostAnalysisService:
             CostData.cost
         ).filter(CostData.date >= cutoff_date)
         
-        if account_id:
-            query = query.filter(CostData.cloud_account_id == account_id)
+        query = filter_accounts(query, CostData.cloud_account_id, account_ids)
             
-        costs = query.order_by(CostData.service, CostData.date).all()
+        costs = pd.DataFrame.from_records(
+            query.order_by(CostData.service, CostData.date).all(),
+            columns=['date', 'service', 'resource_id', 'cost']
+        )
         
-        # Group by service
-        service_costs = {}
-        for cost in costs:
-            service = cost.service
-            if service not in service_costs:
-                service_costs[service] = []
-            service_costs[service].append({
-                'date': cost.date,
-                'resource_id': cost.resource_id,
-                'cost': cost.cost
-            })
-        
-        # Detect anomalies for each service
-        anomalies = []
-        for service, service_data in service_costs.items():
-            # Need enough data points for statistical significance
-            if len(service_data) < 5:
-                continue
-                
-            costs_array = np.array([item['cost'] for item in service_data])
-            mean = np.mean(costs_array)
-            std = np.std(costs_array)
-            
-            if std == 0:  # Skip if all values are the same
-                continue
-                
-            for item in service_data:
-                z_score = (item['cost'] - mean) / std
-                if abs(z_score) > sensitivity:
-                    anomalies.append({
-                        'service': service,
-                        'date': item['date'],
-                        'resource_id': item['resource_id'],
-                        'cost': item['cost'],
-                        'z_score': z_score,
-                        'avg_cost': mean,
-                        'percent_difference': ((item['cost'] - mean) / mean) * 100
-                    })
+        return self._detect_anomalies_in_frame(costs, sensitivity)
+
+    def _detect_anomalies_in_frame(self, costs: pd.DataFrame, sensitivity: float) -> List[Dict[str, Any]]:
+        """
+        Z-score every cost row against its service's mean in one grouped pass.
+        costs has date, service, resource_id and cost columns.
+        """
+        # Services need enough data points for statistical significance
+        outliers = anomaly_stats.zscore_outliers(costs, ['service'], sensitivity, min_points=5)
+        if outliers.empty:
+            return []
+        
+        z_scores = outliers['z_score'].to_numpy()
+        avg_costs = outliers['avg_cost'].to_numpy()
+        # A mean of 0 (credits offsetting charges) has no percent difference
+        percent_differences = np.where(avg_costs != 0, (outliers['cost'].to_numpy() - avg_costs) / np.where(avg_costs != 0, avg_costs, 1.0) * 100, 0.0)
+        
+        anomalies = [
+            {
+                'service': service,
+                'date': date,
+                'resource_id': resource_id,
+                'cost': cost,
+                'z_score': z_score,
+                'avg_cost': avg_cost,
+                'percent_difference': percent_difference
+            }
+            for service, date, resource_id, cost, z_score, avg_cost, percent_difference in zip(
+                outliers['service'].tolist(),
+                outliers['date'].dt.to_pydatetime().tolist(),
+                outliers['resource_id'].tolist(),
+                outliers['cost'].tolist(),
+                z_scores.tolist(),
+                avg_costs.tolist(),
+                percent_differences.tolist()
+            )
+        ]
         
         # Sort anomalies by absolute z-score (most anomalous first)
         return sorted(anomalies, key=lambda x: abs(x['z_score']), reverse=True)
 
-    def get_idle_resources(self, account_id: Optional[int] = None, days: int = 30) -> List[Dict[str, Any]]:
+    def get_idle_resources(self, account_ids: Optional[List[int]] = None, days: int = 30) -> List[Dict[str, Any]]:
         """
         Identify potentially idle resources based on cost and usage patterns.
         This is a simple example - in real life, you would use cloud provider metrics API 
@@ -129,8 +151,7 @@ class CostAnalysisService:
             func.count(CostData.id).label('days_present')
         ).filter(CostData.date >= cutoff_date)
         
-        if account_id:
-            query = query.filter(CostData.cloud_account_id == account_id)
+        query = filter_accounts(query, CostData.cloud_account_id, account_ids)
             
         # Group by resource and filter for resources present most days but with low costs
         resources = query.group_by(CostData.resource_id, CostData.service).all()
@@ -169,7 +190,7 @@ class CostAnalysisService:
         
         return idle_resources
 
-    def get_right_sizing_recommendations(self, account_id: Optional[int] = None, days: int = 30) -> List[Dict[str, Any]]:
+    def get_right_sizing_recommendations(self, account_ids: Optional[List[int]] = None, days: int = 30) -> List[Dict[str, Any]]:
         """
         Generate recommendations for right-sizing resources.
         In real implementation, this would analyze CloudWatch metrics for CPU, memory, etc.
@@ -186,8 +207,7 @@ class CostAnalysisService:
             CostData.service.in_(['EC2', 'RDS'])  # Services that can be resized
         )
         
-        if account_id:
-            query = query.filter(CostData.cloud_account_id == account_id)
+        query = filter_accounts(query, CostData.cloud_account_id, account_ids)
             
         resources = query.group_by(CostData.resource_id, CostData.service).all()
         
@@ -218,7 +238,7 @@ class CostAnalysisService:
         
         return recommendations
 
-    def get_reserved_instance_recommendations(self, account_id: Optional[int] = None, days: int = 90) -> List[Dict[str, Any]]:
+    def get_reserved_instance_recommendations(self, account_ids: Optional[List[int]] = None, days: int = 90) -> List[Dict[str, Any]]:
         """
         Recommend Reserved Instance purchases based on consistent usage.
         """
@@ -234,8 +254,7 @@ class CostAnalysisService:
             CostData.service == 'EC2'  # Focus on EC2 for RI recommendations
         )
         
-        if account_id:
-            query = query.filter(CostData.cloud_account_id == account_id)
+        query = filter_accounts(query, CostData.cloud_account_id, account_ids)
             
         resources = query.group_by(CostData.resource_id, CostData.service).all()
         
@@ -257,14 +276,14 @@ class CostAnalysisService:
         
         return recommendations
 
-    def get_all_recommendations(self, account_id: Optional[int] = None) -> Dict[str, Any]:
+    def get_all_recommendations(self, account_ids: Optional[List[int]] = None) -> Dict[str, Any]:
         """
         Get all recommendation types in a single call.
         """
-        anomalies = self.detect_anomalies(account_id)
-        idle_resources = self.get_idle_resources(account_id)
-        rightsizing = self.get_right_sizing_recommendations(account_id)
-        reserved_instances = self.get_reserved_instance_recommendations(account_id)
+        anomalies = self.detect_anomalies(account_ids)
+        idle_resources = self.get_idle_resources(account_ids)
+        rightsizing = self.get_right_sizing_recommendations(account_ids)
+        reserved_instances = self.get_reserved_instance_recommendations(account_ids)
         
         # Calculate total potential savings
         total_savings = sum(r['estimated_savings'] for r in idle_resources)
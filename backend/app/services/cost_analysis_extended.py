@@ -1,13 +1,39 @@
 # app/services/cost_analysis_extended.py
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, extract, cast, String, case
+from sqlalchemy import func, desc, extract, cast, String, case, tuple_
 from sqlalchemy.sql.expression import literal_column
+import base64
 import json
 from collections import defaultdict
+import numpy as np
 
-from app.db.models import CostData, CloudAccount
+from app.db.models import CostData, CloudAccount, CostDailyRollup, ResourceMonthlyCost, CostAllocation
+from app.services import time_series
+from app.services.rollups import CostRollupService, month_start, next_month
+from app.services.query_filters import CostFilter, filter_accounts, filter_costs
+
+# Columns that can be requested from the line item API
+ITEM_COLUMNS = {
+    'id': CostData.id,
+    'date': CostData.date,
+    'cloud_account_id': CostData.cloud_account_id,
+    'service': CostData.service,
+    'resource_id': CostData.resource_id,
+    'cost': CostData.cost,
+    'tags': CostData.tags
+}
+
+# Tags are only fetched when explicitly requested
+DEFAULT_ITEM_COLUMNS = ['id', 'date', 'cloud_account_id', 'service', 'resource_id', 'cost']
+
+# Pivot dimensions besides tag:<key>; time dimensions truncate the cost date
+PIVOT_TIME_DIMENSIONS = ['day', 'week', 'month']
+PIVOT_DIMENSIONS = ['service', 'account', 'region'] + PIVOT_TIME_DIMENSIONS
+
+# How subtotals are formed from the requested dimensions
+PIVOT_TOTALS = ['rollup', 'cube', 'marginal', 'none']
 
 class CostAnalysisService:
     """Enhanced service for analyzing cost data and generating visualizations."""
@@ -19,9 +45,8 @@ class CostAnalysisService:
         self, 
         start_date: datetime, 
         end_date: datetime,
-        account_id: Optional[int] = None,
-        service: Optional[str] = None,
-        tag: Optional[str] = None
+        account_ids: Optional[List[int]] = None,
+        filters: Optional[CostFilter] = None
     ) -> List[Dict[str, Any]]:
         """Get daily costs for the specified period with filters."""
         query = self.db.query(
@@ -33,18 +58,123 @@ class CostAnalysisService:
         )
         
         # Apply filters
-        query = self._apply_filters(query, account_id, service, tag)
+        query = self._apply_filters(query, account_ids, filters)
         
         # Group by day and order by date
         return query.group_by('date').order_by('date').all()
 
+    def get_bucketed_costs(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        bucket: str = "day",
+        account_ids: Optional[List[int]] = None,
+        filters: Optional[CostFilter] = None,
+        use_rollups: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Get costs summed per day, week or month.
+        Reads from the daily rollups unless use_rollups is False or the filter
+        needs line items (tags, resources or cost bounds), which rollups do
+        not keep.
+        """
+        if not use_rollups or (filters is not None and not filters.supported_by()):
+            bucket_expr = func.date_trunc(bucket, CostData.date).label('date')
+            query = self.db.query(
+                bucket_expr,
+                func.sum(CostData.cost).label('total_cost')
+            ).filter(
+                CostData.date >= start_date,
+                CostData.date < end_date
+            )
+            query = self._apply_filters(query, account_ids, filters)
+        else:
+            bucket_expr = func.date_trunc(bucket, CostDailyRollup.day).label('date')
+            query = self.db.query(
+                bucket_expr,
+                func.sum(CostDailyRollup.total_cost).label('total_cost')
+            ).filter(
+                CostDailyRollup.day >= start_date,
+                CostDailyRollup.day < end_date
+            )
+            
+            query = filter_accounts(query, CostDailyRollup.cloud_account_id, account_ids)
+            query = filter_costs(query, filters, service_column=CostDailyRollup.service,
+                                 resource_column=None, tags_column=None, cost_column=None)
+        
+        return query.group_by('date').order_by('date').all()
+
+    def get_cost_trend(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        account_ids: Optional[List[int]] = None,
+        filters: Optional[CostFilter] = None,
+        max_points: int = 120,
+        resolution: str = "auto"
+    ) -> Dict[str, Any]:
+        """
+        Get the cost trend for a period next to the preceding period of equal length.
+        
+        resolution is "day", "week" or "month", "auto" to pick the finest of
+        those that fits in max_points, or "lttb" to read daily points and
+        downsample them to max_points with largest-triangle-three-buckets.
+        Both periods are read from the raw data instead of the daily rollups
+        when the rollups do not match it (see CostRollupService.is_current),
+        so cost rows not yet rolled up still show.
+        """
+        period = end_date - start_date
+        previous_start_date = start_date - period
+        previous_end_date = end_date - period
+        
+        if resolution == "auto":
+            bucket = time_series.choose_bucket(start_date, end_date, max_points)
+        elif resolution == "lttb":
+            bucket = "day"
+        else:
+            bucket = resolution
+        
+        buckets = time_series.bucket_starts(start_date, end_date, bucket)
+        previous_buckets = time_series.bucket_starts(previous_start_date, previous_end_date, bucket)
+        
+        use_rollups = (filters is None or filters.supported_by()) and CostRollupService(self.db).is_current(
+            previous_start_date, end_date, account_ids
+        )
+        
+        current = self.get_bucketed_costs(start_date, end_date, bucket, account_ids, filters, use_rollups)
+        previous = self.get_bucketed_costs(previous_start_date, previous_end_date, bucket, account_ids, filters, use_rollups)
+        
+        current_costs = time_series.align_to_buckets(
+            buckets, [r.date for r in current], [r.total_cost for r in current]
+        )
+        previous_costs = time_series.align_to_buckets(
+            previous_buckets, [r.date for r in previous], [r.total_cost for r in previous]
+        )
+        
+        # Week and month bucket counts can differ by one between the two periods
+        aligned_previous = np.zeros(len(buckets))
+        overlap = min(len(buckets), len(previous_costs))
+        aligned_previous[:overlap] = previous_costs[:overlap]
+        
+        if resolution == "lttb":
+            keep = time_series.lttb(current_costs, max_points)
+            buckets = buckets[keep]
+            current_costs = current_costs[keep]
+            aligned_previous = aligned_previous[keep]
+        
+        return {
+            'labels': time_series.format_labels(buckets),
+            'resolution': resolution if resolution == "lttb" else bucket,
+            'current': current_costs.tolist(),
+            'previous': aligned_previous.tolist()
+        }
+
     def get_grouped_costs(
         self, 
         start_date: datetime, 
         end_date: datetime,
-        account_id: Optional[int] = None,
-        service: Optional[str] = None,
-        tag: Optional[str] = None,
+        account_ids: Optional[List[int]] = None,
+        filters: Optional[CostFilter] = None,
         group_by: str = "month"
     ) -> List[Dict[str, Any]]:
         """
@@ -101,7 +231,7 @@ class CostAnalysisService:
         )
         
         # Apply filters
-        query = self._apply_filters(query, account_id, service, tag)
+        query = self._apply_filters(query, account_ids, filters)
         
         # Group by the time period and order
         return query.group_by('group').order_by('group').all()
@@ -110,22 +240,42 @@ class CostAnalysisService:
         self, 
         start_date: datetime, 
         end_date: datetime,
-        account_id: Optional[int] = None,
-        service: Optional[str] = None,
-        tag: Optional[str] = None,
-        group_by: str = "service"
+        account_ids: Optional[List[int]] = None,
+        filters: Optional[CostFilter] = None,
+        group_by: str = "service",
+        allocation_rule_id: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         Get cost breakdown by the specified grouping.
         Used for pie charts and similar visualizations.
+        group_by="allocation" returns the shared cost stored for allocation_rule_id
+        per target tag value, for the days of the period. Allocations are stored
+        per day and a rerun replaces the days it covers, so each day is counted
+        once whichever runs produced it; days no run has covered are missing.
         """
+        if group_by == "allocation":
+            query = self.db.query(
+                CostAllocation.target_value.label('group'),
+                func.sum(CostAllocation.allocated_cost).label('total_cost')
+            ).filter(
+                CostAllocation.rule_id == allocation_rule_id,
+                CostAllocation.period_start >= start_date,
+                CostAllocation.period_start < end_date
+            )
+            
+            query = filter_accounts(query, CostAllocation.cloud_account_id, account_ids)
+            query = filter_costs(query, filters, service_column=CostAllocation.source_service,
+                                 resource_column=None, tags_column=None, cost_column=None)
+            
+            return query.group_by(CostAllocation.target_value).order_by(desc('total_cost')).all()
+        
         base_query = self.db.query(CostData).filter(
             CostData.date >= start_date,
             CostData.date < end_date
         )
         
         # Apply common filters
-        base_query = self._apply_filters(base_query, account_id, service, tag)
+        base_query = self._apply_filters(base_query, account_ids, filters)
         
         if group_by == "service":
             # Group by service
@@ -213,9 +363,8 @@ class CostAnalysisService:
         self, 
         start_date: datetime, 
         end_date: datetime,
-        account_id: Optional[int] = None,
-        service: Optional[str] = None,
-        tag: Optional[str] = None
+        account_ids: Optional[List[int]] = None,
+        filters: Optional[CostFilter] = None
     ) -> List[CostData]:
         """
         Get detailed cost data for exports and detailed analysis.
@@ -226,7 +375,7 @@ class CostAnalysisService:
         )
         
         # Apply filters
-        query = self._apply_filters(query, account_id, service, tag)
+        query = self._apply_filters(query, account_ids, filters)
         
         # Join with CloudAccount to get account details
         query = query.join(
@@ -239,25 +388,280 @@ class CostAnalysisService:
         # Order by date
         return query.order_by(CostData.date, CostData.service).all()
 
-    def get_available_services(self, account_id: Optional[int] = None) -> List[str]:
+    def get_cost_items(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        account_ids: Optional[List[int]] = None,
+        filters: Optional[CostFilter] = None,
+        columns: Optional[List[str]] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100
+    ) -> Dict[str, Any]:
+        """
+        Get one page of cost line items ordered by (date, id).
+        
+        Uses keyset pagination: the cursor holds the (date, id) of the last row
+        of the previous page, so every page is a range scan on
+        ix_cost_data_date_id no matter how deep the caller has paged.
+        Raises ValueError for unknown columns or a malformed cursor.
+        """
+        if not columns:
+            columns = DEFAULT_ITEM_COLUMNS
+        
+        unknown = [c for c in columns if c not in ITEM_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+        
+        # date and id are always selected since the next cursor is built from them
+        selected = ['date', 'id'] + [c for c in columns if c not in ('date', 'id')]
+        
+        query = self.db.query(
+            *[ITEM_COLUMNS[c].label(c) for c in selected]
+        ).filter(
+            CostData.date >= start_date,
+            CostData.date < end_date
+        )
+        
+        # Apply filters
+        query = self._apply_filters(query, account_ids, filters)
+        
+        if cursor:
+            last_date, last_id = decode_item_cursor(cursor)
+            query = query.filter(
+                tuple_(CostData.date, CostData.id) > tuple_(last_date, last_id)
+            )
+        
+        # Fetch one extra row to find out whether another page exists
+        rows = query.order_by(CostData.date, CostData.id).limit(limit + 1).all()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_item_cursor(rows[-1].date, rows[-1].id)
+        
+        items = []
+        for row in rows:
+            values = row._asdict()
+            items.append({c: values[c] for c in columns})
+        
+        return {
+            'columns': list(columns),
+            'items': items,
+            'next_cursor': next_cursor
+        }
+
+    def get_top_resources(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        account_ids: Optional[List[int]] = None,
+        filters: Optional[CostFilter] = None,
+        limit: int = 50,
+        exact: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the most expensive resources for a period.
+        
+        Whole months inside the period are read from the per-resource monthly
+        rollups and only the partial months at either end touch raw cost data.
+        exact=True (or a tag or cost filter, which the rollups cannot answer)
+        sums the raw cost data for the whole period instead.
+        """
+        full_start = start_date if start_date == month_start(start_date) else next_month(start_date)
+        full_end = month_start(end_date)
+        use_rollups = (not exact and full_start < full_end and
+                       (filters is None or filters.supported_by(has_resource=True)))
+        
+        def raw_totals(period_start, period_end):
+            query = self.db.query(
+                CostData.cloud_account_id.label('cloud_account_id'),
+                CostData.service.label('service'),
+                CostData.resource_id.label('resource_id'),
+                func.sum(CostData.cost).label('total_cost')
+            ).filter(
+                CostData.date >= period_start,
+                CostData.date < period_end
+            )
+            query = self._apply_filters(query, account_ids, filters)
+            return query.group_by(CostData.cloud_account_id, CostData.service, CostData.resource_id)
+        
+        if not use_rollups:
+            parts = [raw_totals(start_date, end_date)]
+        else:
+            monthly = self.db.query(
+                ResourceMonthlyCost.cloud_account_id.label('cloud_account_id'),
+                ResourceMonthlyCost.service.label('service'),
+                ResourceMonthlyCost.resource_id.label('resource_id'),
+                func.sum(ResourceMonthlyCost.total_cost).label('total_cost')
+            ).filter(
+                ResourceMonthlyCost.month >= full_start,
+                ResourceMonthlyCost.month < full_end
+            )
+            
+            monthly = filter_accounts(monthly, ResourceMonthlyCost.cloud_account_id, account_ids)
+            monthly = filter_costs(monthly, filters, service_column=ResourceMonthlyCost.service,
+                                   resource_column=ResourceMonthlyCost.resource_id,
+                                   tags_column=None, cost_column=None)
+            
+            parts = [monthly.group_by(
+                ResourceMonthlyCost.cloud_account_id,
+                ResourceMonthlyCost.service,
+                ResourceMonthlyCost.resource_id
+            )]
+            
+            # Partial months at either end of the period
+            if start_date < full_start:
+                parts.append(raw_totals(start_date, full_start))
+            if full_end < end_date:
+                parts.append(raw_totals(full_end, end_date))
+        
+        totals = parts[0].union_all(*parts[1:]).subquery() if len(parts) > 1 else parts[0].subquery()
+        
+        query = self.db.query(
+            totals.c.cloud_account_id,
+            totals.c.service,
+            totals.c.resource_id,
+            func.sum(totals.c.total_cost).label('total_cost')
+        ).group_by(
+            totals.c.cloud_account_id,
+            totals.c.service,
+            totals.c.resource_id
+        ).order_by(desc('total_cost')).limit(limit)
+        
+        return [
+            {
+                'resource_id': row.resource_id,
+                'service': row.service,
+                'account_id': row.cloud_account_id,
+                'total_cost': row.total_cost
+            }
+            for row in query.all()
+        ]
+
+    def get_pivot(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        dimensions: List[str],
+        account_ids: Optional[List[int]] = None,
+        filters: Optional[CostFilter] = None,
+        totals: str = "rollup"
+    ) -> Dict[str, Any]:
+        """
+        Aggregate cost over several dimensions, with subtotals, in one statement.
+
+        totals selects the grouping sets: "rollup" gives hierarchical subtotals
+        in dimension order (ROLLUP), "cube" every combination (CUBE), "marginal"
+        the full grouping plus each dimension alone and the grand total
+        (GROUPING SETS), and "none" the full grouping only.
+        The result is columnar: one list per dimension plus total_cost and
+        grouping, a bitmask where bit (n - 1 - i) is set when dimension i is
+        aggregated away in that row (PostgreSQL GROUPING()).
+        Raises ValueError for unknown or repeated dimensions.
+        """
+        if not dimensions:
+            raise ValueError("At least one dimension is required")
+        
+        if len(set(dimensions)) != len(dimensions):
+            raise ValueError("Dimensions must not repeat")
+        
+        if totals not in PIVOT_TOTALS:
+            raise ValueError(f"Unknown totals mode: {totals}")
+        
+        columns = [self._pivot_column(d).label(f'd{i}') for i, d in enumerate(dimensions)]
+        expressions = [c.element for c in columns]
+        
+        if totals == "rollup":
+            grouping = [func.rollup(*expressions)]
+        elif totals == "cube":
+            grouping = [func.cube(*expressions)]
+        elif totals == "marginal":
+            sets = [tuple_(*expressions)] + [tuple_(e) for e in expressions] + [literal_column('()')]
+            grouping = [func.grouping_sets(*sets)] if len(expressions) > 1 else [func.rollup(*expressions)]
+        else:
+            grouping = expressions
+        
+        query = self.db.query(
+            *columns,
+            func.sum(CostData.cost).label('total_cost'),
+            func.grouping(*expressions).label('grouping')
+        ).filter(
+            CostData.date >= start_date,
+            CostData.date < end_date
+        )
+        
+        query = self._apply_filters(query, account_ids, filters)
+        
+        rows = query.group_by(*grouping).order_by(
+            'grouping', *[c.name for c in columns]
+        ).all()
+        
+        result = {
+            'dimensions': dimensions,
+            'totals': totals,
+            'columns': {},
+            'labels': {}
+        }
+        
+        for i, dimension in enumerate(dimensions):
+            values = [row[i] for row in rows]
+            if dimension in PIVOT_TIME_DIMENSIONS:
+                values = [v.date().isoformat() if v is not None else None for v in values]
+            result['columns'][dimension] = values
+        
+        result['columns']['total_cost'] = [float(row.total_cost or 0) for row in rows]
+        result['columns']['grouping'] = [int(row.grouping) for row in rows]
+        
+        # Account ids stay compact in the columns; names are sent once
+        if 'account' in dimensions:
+            ids = {v for v in result['columns']['account'] if v is not None}
+            names = self.db.query(CloudAccount.id, CloudAccount.name).filter(CloudAccount.id.in_(ids)) if ids else []
+            result['labels']['account'] = {str(account_id): name for account_id, name in names}
+        
+        return result
+
+    def _pivot_column(self, dimension: str):
+        """SQL expression for a pivot dimension."""
+        if dimension == 'service':
+            return CostData.service
+        
+        if dimension == 'account':
+            return CostData.cloud_account_id
+        
+        if dimension == 'region':
+            # Region is carried in the tags, as on the breakdown endpoint
+            return func.coalesce(
+                CostData.tags['region'].as_string(),
+                CostData.tags['aws:region'].as_string(),
+                'Unknown'
+            )
+        
+        if dimension in PIVOT_TIME_DIMENSIONS:
+            return func.date_trunc(dimension, CostData.date)
+        
+        if dimension.startswith('tag:') and len(dimension) > len('tag:'):
+            return CostData.tags[dimension[len('tag:'):]].as_string()
+        
+        raise ValueError(f"Unknown pivot dimension: {dimension}")
+
+    def get_available_services(self, account_ids: Optional[List[int]] = None) -> List[str]:
         """
         Get a list of all available services for filtering.
         """
         query = self.db.query(CostData.service).distinct()
         
-        if account_id:
-            query = query.filter(CostData.cloud_account_id == account_id)
+        query = filter_accounts(query, CostData.cloud_account_id, account_ids)
         
         return [service[0] for service in query.order_by(CostData.service).all()]
 
-    def get_available_tags(self, account_id: Optional[int] = None) -> List[Dict[str, str]]:
+    def get_available_tags(self, account_ids: Optional[List[int]] = None) -> List[Dict[str, str]]:
         """
         Get a list of all available tags and their values for filtering.
         """
         query = self.db.query(CostData.tags).filter(CostData.tags.isnot(None))
         
-        if account_id:
-            query = query.filter(CostData.cloud_account_id == account_id)
+        query = filter_accounts(query, CostData.cloud_account_id, account_ids)
         
         # Extract unique tag keys and values
         tag_keys = set()
@@ -283,32 +687,28 @@ class CostAnalysisService:
         
         return result
 
-    def _apply_filters(self, query, account_id: Optional[int] = None, service: Optional[str] = None, tag: Optional[str] = None):
+    def _apply_filters(self, query, account_ids: Optional[List[int]] = None, filters: Optional[CostFilter] = None):
         """
-        Apply common filters to a query.
+        Apply the account scope and the request's cost filter to a CostData query.
         """
-        # Filter by account
-        if account_id:
-            query = query.filter(CostData.cloud_account_id == account_id)
-        
-        # Filter by service
-        if service:
-            query = query.filter(CostData.service == service)
-        
-        # Filter by tag
-        if tag:
-            # Parse tag filter (format: "key:value")
-            try:
-                key, value = tag.split(':', 1)
-                # This is PostgreSQL specific - would need adjustment for other databases
-                query = query.filter(
-                    CostData.tags[key].astext == value
-                )
-            except ValueError:
-                # Invalid tag format, ignore filter
-                pass
-        
-        return query
+        query = filter_accounts(query, CostData.cloud_account_id, account_ids)
+        
+        return filter_costs(query, filters)
+
+
+def encode_item_cursor(last_date: datetime, last_id: int) -> str:
+    """Encode the position of the last returned line item as an opaque cursor."""
+    payload = json.dumps([last_date.isoformat(), last_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def decode_item_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_item_cursor."""
+    try:
+        last_date, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(last_date), int(last_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
 
 
 # Helper function for SQLAlchemy options
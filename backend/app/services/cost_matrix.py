@@ -0,0 +1,197 @@
+# app/services/cost_matrix.py
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
+import numpy as np
+import pandas as pd
+
+# Named fills for the days a resource has no cost; any float fills with that constant
+FILL_METHODS = ['previous', 'linear']
+
+class CostMatrix:
+    """
+    Daily costs of every resource as a dense (resources x days) float64 matrix.
+
+    Built once per request from the detectors' cost frame and shared by every
+    detection method, so no method regroups the rows itself. Row r is the
+    resource (account_ids[r], services[service_codes[r]], resource_ids[r]) and
+    column c is dates[c]; account_ids is None when the frame had no accounts. observed marks the cells that had a finite cost; the others are
+    NaN in values. Rows are in order of first appearance in the frame. The
+    arrays are read-only because detection methods share them across threads.
+    """
+
+    def __init__(self, values: np.ndarray, observed: np.ndarray, service_codes: np.ndarray,
+                 services: np.ndarray, resource_ids: np.ndarray, account_ids: Optional[np.ndarray],
+                 dates: pd.DatetimeIndex):
+        self.values = values
+        self.observed = observed
+        self.service_codes = service_codes
+        self.services = services
+        self.resource_ids = resource_ids
+        self.account_ids = account_ids
+        self.dates = dates
+
+        for array in (values, observed, service_codes, services, resource_ids, account_ids):
+            if array is not None:
+                array.flags.writeable = False
+
+        # Integer index maps back from names
+        self.service_index: Dict[str, int] = {service: i for i, service in enumerate(services.tolist())}
+        self.resource_index: Dict[Tuple[Optional[int], Optional[str], Optional[str]], int] = {
+            self.resource(row): row for row in range(len(resource_ids))
+        }
+
+        self._filled: Dict[Union[str, float], np.ndarray] = {}
+
+    @classmethod
+    def from_frame(cls, costs: pd.DataFrame) -> 'CostMatrix':
+        """
+        Build the matrix from a frame with date, service, resource_id and cost
+        columns, and optionally cloud_account_id. Costs of a resource on the same
+        day are summed. With accounts, the same service and resource_id in two
+        accounts are two resources, so no series mixes the costs of different
+        tenants. A missing account, service or resource_id is a key of its own
+        and comes out as None.
+        """
+        has_accounts = 'cloud_account_id' in costs.columns
+        if costs.empty:
+            return cls(np.empty((0, 0)), np.empty((0, 0), dtype=bool), np.empty(0, dtype=np.int64),
+                       np.empty(0, dtype=object), np.empty(0, dtype=object),
+                       np.empty(0, dtype=object) if has_accounts else None, pd.DatetimeIndex([]))
+
+        days = costs['date'].dt.floor('D')
+        first_day = days.min()
+        columns = ((days - first_day) // pd.Timedelta(days=1)).to_numpy()
+        n_days = int(columns.max()) + 1
+
+        # Resources numbered in order of first appearance; NULL keys form groups too
+        keys = ['cloud_account_id', 'service', 'resource_id'] if has_accounts else ['service', 'resource_id']
+        rows = costs.groupby(keys, sort=False, dropna=False).ngroup().to_numpy()
+        _, first_rows = np.unique(rows, return_index=True)
+        n_resources = len(first_rows)
+
+        cost = costs['cost'].to_numpy(dtype=np.float64)
+        finite = np.isfinite(cost)
+        cells = rows[finite] * n_days + columns[finite]
+
+        values = np.bincount(cells, weights=cost[finite], minlength=n_resources * n_days).reshape(n_resources, n_days)
+        observed = np.bincount(cells, minlength=n_resources * n_days).reshape(n_resources, n_days) > 0
+        values[~observed] = np.nan
+
+        service_codes, services = pd.factorize(_nulls_to_none(costs['service'].to_numpy(dtype=object)[first_rows]),
+                                               use_na_sentinel=False)
+        resource_ids = _nulls_to_none(costs['resource_id'].to_numpy(dtype=object)[first_rows])
+
+        account_ids = None
+        if has_accounts:
+            # A NULL account turns the column into floats; keep the ids as ints or None
+            account_ids = np.array([None if pd.isna(account_id) else int(account_id)
+                                    for account_id in costs['cloud_account_id'].to_numpy(dtype=object)[first_rows]],
+                                   dtype=object)
+
+        return cls(values, observed, service_codes.astype(np.int64), _nulls_to_none(np.asarray(services, dtype=object)),
+                   resource_ids, account_ids, pd.date_range(first_day, periods=n_days, freq='D'))
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.values.shape
+
+    def resource(self, row: int) -> Tuple[Optional[int], Optional[str], Optional[str]]:
+        """(account_id, service, resource_id) of a row."""
+        account_id = self.account_ids[row] if self.account_ids is not None else None
+        return account_id, self.services[self.service_codes[row]], self.resource_ids[row]
+
+    def observed_counts(self) -> np.ndarray:
+        """Days with a cost, per row."""
+        return self.observed.sum(axis=1)
+
+    def spans(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        First and last observed column of every row. A row without any
+        observation gets first 0 and last -1, so its span is empty.
+        """
+        any_observed = self.observed.any(axis=1)
+        first = np.where(any_observed, self.observed.argmax(axis=1), 0)
+        last = np.where(any_observed, self.shape[1] - 1 - self.observed[:, ::-1].argmax(axis=1), -1)
+        return first, last
+
+    def weekdays(self) -> np.ndarray:
+        """Day of week of every column (0=Monday, 6=Sunday)."""
+        return self.dates.weekday.to_numpy()
+
+    def to_datetimes(self, columns: np.ndarray) -> List[datetime]:
+        """Days of the given columns as datetimes."""
+        return self.dates[columns].to_pydatetime().tolist()
+
+    def filled(self, fill: Union[str, float] = np.nan) -> np.ndarray:
+        """
+        Costs with the unobserved days filled.
+
+        fill is a constant, 'previous' (the last observed cost, NaN before the
+        first) or 'linear' (interpolated between the surrounding observed
+        costs, and the nearest observed cost before the first or after the
+        last). Rows without observations stay NaN. Results are cached, as
+        detection methods of the same request ask for the same fills.
+        """
+        if fill not in self._filled:
+            if isinstance(fill, str):
+                if fill not in FILL_METHODS:
+                    raise ValueError(f"Unknown fill: {fill}")
+                result = self._previous() if fill == 'previous' else self._linear()
+            else:
+                result = np.where(self.observed, self.values, fill)
+            result.flags.writeable = False
+            self._filled[fill] = result
+        return self._filled[fill]
+
+    def aligned(self, rows: np.ndarray, fill: Union[str, float] = np.nan) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Spans of the given rows shifted to start at column 0 and NaN-padded to
+        the longest of them. Returns the aligned costs and, per aligned cell,
+        its column in the matrix (-1 for padding).
+        """
+        first, last = self.spans()
+        first, lengths = first[rows], last[rows] - first[rows] + 1
+
+        width = int(lengths.max()) if len(rows) else 0
+        offsets = np.arange(width)
+        inside = offsets < lengths[:, None]
+        columns = np.where(inside, first[:, None] + offsets, -1)
+
+        source = self.filled(fill)
+        aligned = np.where(inside, source[rows[:, None], np.where(inside, columns, 0)], np.nan)
+        return aligned, columns
+
+    def _observed_positions(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Column of the last observation at or before, and the first at or after, every cell (-1 / n_days if none)."""
+        n_days = self.shape[1]
+        columns = np.arange(n_days)
+
+        before = np.maximum.accumulate(np.where(self.observed, columns, -1), axis=1)
+        after = np.minimum.accumulate(np.where(self.observed, columns, n_days)[:, ::-1], axis=1)[:, ::-1]
+        return before, after
+
+    def _previous(self) -> np.ndarray:
+        before, _ = self._observed_positions()
+        result = np.take_along_axis(self.values, np.maximum(before, 0), axis=1)
+        result[before < 0] = np.nan
+        return result
+
+    def _linear(self) -> np.ndarray:
+        n_days = self.shape[1]
+        before, after = self._observed_positions()
+        has_before, has_after = before >= 0, after < n_days
+
+        previous = np.take_along_axis(self.values, np.maximum(before, 0), axis=1)
+        following = np.take_along_axis(self.values, np.minimum(after, n_days - 1), axis=1)
+
+        span = np.where(after > before, after - before, 1)
+        weight = (np.arange(n_days) - before) / span
+        interpolated = previous + weight * (following - previous)
+
+        result = np.where(has_before & has_after, interpolated, np.where(has_before, previous, following))
+        result[~has_before & ~has_after] = np.nan
+        return np.where(self.observed, self.values, result)
+
+def _nulls_to_none(values: np.ndarray) -> np.ndarray:
+    """Object array with NaN and other missing markers replaced by None."""
+    return np.where(pd.isna(values), None, values)
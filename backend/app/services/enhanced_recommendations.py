@@ -7,6 +7,7 @@ from sqlalchemy import func, desc, extract
 import json
 
 from app.db.models import CostData, CloudAccount
+from app.services.query_filters import filter_accounts
 
 class EnhancedRecommendations:
     """Enhanced service for generating cloud cost optimization recommendations."""
@@ -14,16 +15,16 @@ class EnhancedRecommendations:
     def __init__(self, db: Session):
         self.db = db
 
-    def get_all_recommendations(self, account_id: Optional[int] = None) -> Dict[str, Any]:
+    def get_all_recommendations(self, account_ids: Optional[List[int]] = None) -> Dict[str, Any]:
         """
         Get all recommendation types in a single call with enhanced algorithms.
         """
         # Get recommendations in parallel
-        idle_resources = self.get_idle_resources(account_id)
-        rightsizing = self.get_right_sizing_recommendations(account_id)
-        reserved_instances = self.get_reserved_instance_recommendations(account_id)
-        storage_optimizations = self.get_storage_optimization_recommendations(account_id)
-        network_optimizations = self.get_network_optimization_recommendations(account_id)
+        idle_resources = self.get_idle_resources(account_ids)
+        rightsizing = self.get_right_sizing_recommendations(account_ids)
+        reserved_instances = self.get_reserved_instance_recommendations(account_ids)
+        storage_optimizations = self.get_storage_optimization_recommendations(account_ids)
+        network_optimizations = self.get_network_optimization_recommendations(account_ids)
         
         # Calculate total potential savings
         total_savings = sum(r['estimated_savings'] for r in idle_resources)
@@ -116,7 +117,7 @@ class EnhancedRecommendations:
         else:
             return min(base_score * 1.5, 99)
 
-    def get_idle_resources(self, account_id: Optional[int] = None, days: int = 30) -> List[Dict[str, Any]]:
+    def get_idle_resources(self, account_ids: Optional[List[int]] = None, days: int = 30) -> List[Dict[str, Any]]:
         """
         Identify potentially idle resources using enhanced detection methods.
         """
@@ -140,8 +141,7 @@ class EnhancedRecommendations:
             func.json_agg(CostData.tags).label('all_tags')
         ).filter(CostData.date >= cutoff_date)
         
-        if account_id:
-            query = query.filter(CostData.cloud_account_id == account_id)
+        query = filter_accounts(query, CostData.cloud_account_id, account_ids)
             
         # Group by resource and service
         resources = query.group_by(CostData.resource_id, CostData.service).all()
@@ -271,7 +271,7 @@ class EnhancedRecommendations:
         
         return metrics
 
-    def get_right_sizing_recommendations(self, account_id: Optional[int] = None, days: int = 30) -> List[Dict[str, Any]]:
+    def get_right_sizing_recommendations(self, account_ids: Optional[List[int]] = None, days: int = 30) -> List[Dict[str, Any]]:
         """
         Generate recommendations for right-sizing resources based on usage patterns.
         Enhanced version that includes memory utilization and instance type-specific recommendations.
@@ -349,8 +349,7 @@ class EnhancedRecommendations:
             CostData.date >= cutoff_date
         )
         
-        if account_id:
-            query = query.filter(CostData.cloud_account_id == account_id)
+        query = filter_accounts(query, CostData.cloud_account_id, account_ids)
             
         # Group by resource, service, and provider
         resources = query.group_by(
@@ -511,7 +510,7 @@ class EnhancedRecommendations:
             
         return metadata
 
-    def get_reserved_instance_recommendations(self, account_id: Optional[int] = None, days: int = 90) -> List[Dict[str, Any]]:
+    def get_reserved_instance_recommendations(self, account_ids: Optional[List[int]] = None, days: int = 90) -> List[Dict[str, Any]]:
         """
         Generate enhanced recommendations for Reserved Instance/Commitment purchases.
         """
@@ -540,8 +539,7 @@ class EnhancedRecommendations:
             CostData.service.in_(['EC2', 'Compute Engine', 'Virtual Machines', 'RDS', 'SQL Database', 'Cloud SQL'])
         )
         
-        if account_id:
-            query = query.filter(CostData.cloud_account_id == account_id)
+        query = filter_accounts(query, CostData.cloud_account_id, account_ids)
             
         # Group by resource, day, service, and provider
         daily_costs = query.group_by(
@@ -638,7 +636,7 @@ class EnhancedRecommendations:
         # Sort by estimated 1-year savings
         return sorted(recommendations, key=lambda x: x['estimated_savings_1yr'], reverse=True)
 
-    def get_storage_optimization_recommendations(self, account_id: Optional[int] = None, days: int = 30) -> List[Dict[str, Any]]:
+    def get_storage_optimization_recommendations(self, account_ids: Optional[List[int]] = None, days: int = 30) -> List[Dict[str, Any]]:
         """
         Generate recommendations for optimizing storage costs.
         This includes:
@@ -664,8 +662,7 @@ class EnhancedRecommendations:
             CostData.service.in_(['S3', 'Blob Storage', 'Cloud Storage', 'EBS', 'Persistent Disk', 'Managed Disks'])
         )
         
-        if account_id:
-            query = query.filter(CostData.cloud_account_id == account_id)
+        query = filter_accounts(query, CostData.cloud_account_id, account_ids)
             
         # Group by resource, service, and provider
         storage_resources = query.group_by(
@@ -748,7 +745,7 @@ class EnhancedRecommendations:
         
         return recommendations
 
-    def get_network_optimization_recommendations(self, account_id: Optional[int] = None, days: int = 30) -> List[Dict[str, Any]]:
+    def get_network_optimization_recommendations(self, account_ids: Optional[List[int]] = None, days: int = 30) -> List[Dict[str, Any]]:
         """
         Generate recommendations for optimizing network costs.
         This includes:
@@ -774,8 +771,7 @@ class EnhancedRecommendations:
             CostData.service.in_(['Data Transfer', 'VPC Network', 'Virtual Network', 'CloudFront', 'CDN', 'Load Balancer'])
         )
         
-        if account_id:
-            query = query.filter(CostData.cloud_account_id == account_id)
+        query = filter_accounts(query, CostData.cloud_account_id, account_ids)
             
         # Group by resource, service, and provider
         network_resources = query.group_by(
@@ -0,0 +1,241 @@
+# app/services/forecasting.py
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import threading
+import numpy as np
+import pandas as pd
+from scipy import stats
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.db.models import CostData, CostDailyRollup
+from app.services.query_filters import filter_accounts
+from app.services.rollups import CostRollupService, next_month
+
+# Fitted models kept in memory, keyed by scope and data version
+FORECAST_CACHE_SIZE = 32
+
+_model_cache: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+_model_cache_lock = threading.Lock()
+
+def _design_matrix(day_index: np.ndarray, weekdays: np.ndarray, seasonal: bool) -> np.ndarray:
+    """Intercept, linear trend and (optionally) Tuesday-Sunday offsets from Monday."""
+    columns = [np.ones(len(day_index)), day_index.astype(np.float64)]
+    if seasonal:
+        columns.extend((weekdays == d).astype(np.float64) for d in range(1, 7))
+    return np.column_stack(columns)
+
+def fit_trend_weekly(values: np.ndarray, first_weekday: int) -> Dict[str, Any]:
+    """
+    Fit trend + day-of-week least squares models for every row of a
+    (series x days) matrix at once.
+
+    All series share the same design matrix, so a single lstsq call solves
+    every series and (X'X)^-1 is shared when computing prediction intervals.
+    """
+    n_days = values.shape[1]
+    day_index = np.arange(n_days)
+    weekdays = (first_weekday + day_index) % 7
+
+    # Weekly offsets need a couple of observations of each weekday
+    seasonal = n_days >= 21
+    X = _design_matrix(day_index, weekdays, seasonal)
+
+    coefficients, _, _, _ = np.linalg.lstsq(X, values.T, rcond=None)
+    residuals = values.T - X @ coefficients
+
+    dof = max(n_days - X.shape[1], 1)
+    sigma = np.sqrt(np.sum(residuals ** 2, axis=0) / dof)
+
+    return {
+        'coefficients': coefficients,
+        'sigma': sigma,
+        'xtx_inv': np.linalg.pinv(X.T @ X),
+        'n_days': n_days,
+        'first_weekday': first_weekday,
+        'seasonal': seasonal
+    }
+
+def project(model: Dict[str, Any], horizon: int, confidence: float = 0.95) -> Dict[str, np.ndarray]:
+    """
+    Project the next `horizon` days for every fitted series.
+
+    Returns the per-day forecast (series x horizon), the forecast sum over the
+    horizon and the half-width of its prediction interval. The interval uses
+    the OLS variance of a sum of future observations:
+    sigma^2 * (h + 1' Xf (X'X)^-1 Xf' 1).
+    """
+    n_series = model['coefficients'].shape[1]
+    if horizon <= 0:
+        zeros = np.zeros(n_series)
+        return {'daily': np.zeros((n_series, 0)), 'total': zeros, 'half_width': zeros}
+
+    day_index = np.arange(model['n_days'], model['n_days'] + horizon)
+    weekdays = (model['first_weekday'] + day_index) % 7
+    X_future = _design_matrix(day_index, weekdays, model['seasonal'])
+
+    # Spend cannot go negative on any single day
+    daily = np.maximum(X_future @ model['coefficients'], 0).T
+
+    summed_row = X_future.sum(axis=0)
+    parameter_variance = float(summed_row @ model['xtx_inv'] @ summed_row)
+    z = stats.norm.ppf(0.5 + confidence / 2)
+    half_width = z * model['sigma'] * np.sqrt(horizon + parameter_variance)
+
+    return {'daily': daily, 'total': daily.sum(axis=1), 'half_width': half_width}
+
+class SpendForecaster:
+    """Service for projecting month-end spend for many series at once."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def forecast(
+        self,
+        account_ids: Optional[List[int]] = None,
+        group_by: str = "service",
+        history_days: int = 90,
+        confidence: float = 0.95,
+        as_of: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Project month-end spend per service, account or resource, plus the total.
+
+        Models are fitted on the daily history before as_of (today by default)
+        and cached until the underlying data changes. Month-end projections are
+        month-to-date actuals plus the forecast for the remaining days.
+        Service and account history comes from the daily rollups while they
+        match the raw data (see CostRollupService.is_current), and from the
+        raw data otherwise, as resource history always does.
+        """
+        as_of = (as_of or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+        history_start = as_of - timedelta(days=history_days)
+        month_start = as_of.replace(day=1)
+        month_end = next_month(as_of)
+
+        # Rollups that lag the raw data would leave recent cost out of the projection
+        from_rollups = group_by != "resource" and CostRollupService(self.db).is_current(
+            history_start, as_of, account_ids
+        )
+
+        version = self._data_version(history_start, as_of, account_ids, from_rollups)
+        cache_key = (tuple(account_ids) if account_ids is not None else None,
+                     group_by, history_days, as_of, from_rollups, version)
+
+        with _model_cache_lock:
+            fitted = _model_cache.get(cache_key)
+            if fitted is not None:
+                _model_cache.move_to_end(cache_key)
+
+        if fitted is None:
+            fitted = self._fit(history_start, as_of, month_start, account_ids, group_by, from_rollups)
+            with _model_cache_lock:
+                _model_cache[cache_key] = fitted
+                while len(_model_cache) > FORECAST_CACHE_SIZE:
+                    _model_cache.popitem(last=False)
+
+        horizon = (month_end - as_of).days
+        projection = project(fitted['model'], horizon, confidence)
+
+        projected = fitted['month_to_date'] + projection['total']
+        lower = np.maximum(projected - projection['half_width'], fitted['month_to_date'])
+        upper = projected + projection['half_width']
+
+        # The last row of the matrix is the total across all series
+        series = [
+            {
+                'key': key,
+                'month_to_date': float(fitted['month_to_date'][i]),
+                'projected_month_end': float(projected[i]),
+                'lower_bound': float(lower[i]),
+                'upper_bound': float(upper[i])
+            }
+            for i, key in enumerate(fitted['keys'] + ['total'])
+        ]
+
+        return {
+            'as_of': as_of,
+            'month_end': month_end,
+            'confidence': confidence,
+            'group_by': group_by,
+            'total': series[-1],
+            'series': sorted(series[:-1], key=lambda s: s['projected_month_end'], reverse=True)
+        }
+
+    def _fit(self, history_start: datetime, as_of: datetime, month_start: datetime,
+             account_ids: Optional[List[int]], group_by: str, from_rollups: bool) -> Dict[str, Any]:
+        """Build the (series x day) matrix and fit every series in one pass."""
+        rows = self._load_daily_series(history_start, as_of, account_ids, group_by, from_rollups)
+        n_days = (as_of - history_start).days
+
+        frame = pd.DataFrame.from_records(rows, columns=['key', 'day', 'cost'])
+        codes, keys = pd.factorize(frame['key'].astype(str))
+
+        # One row per series plus a final row for the total
+        values = np.zeros((len(keys) + 1, n_days), dtype=np.float64)
+        if len(frame):
+            day_index = (
+                frame['day'].to_numpy(dtype='datetime64[D]') - np.datetime64(history_start, 'D')
+            ).astype(np.int64)
+            np.add.at(values, (codes, day_index), frame['cost'].to_numpy(dtype=np.float64))
+            values[-1] = values[:-1].sum(axis=0)
+
+        month_days = (as_of - max(month_start, history_start)).days
+        month_to_date = values[:, n_days - month_days:].sum(axis=1) if month_days else np.zeros(len(values))
+
+        return {
+            'keys': list(keys),
+            'model': fit_trend_weekly(values, history_start.weekday()),
+            'month_to_date': month_to_date
+        }
+
+    def _load_daily_series(self, start_date: datetime, end_date: datetime,
+                           account_ids: Optional[List[int]], group_by: str, from_rollups: bool):
+        """Daily totals per series, from the rollups when from_rollups is set and raw data otherwise."""
+        if not from_rollups:
+            key = {
+                "resource": CostData.resource_id,
+                "account": CostData.cloud_account_id
+            }.get(group_by, CostData.service)
+            day = func.date_trunc('day', CostData.date)
+            query = self.db.query(
+                key.label('key'),
+                day.label('day'),
+                func.sum(CostData.cost).label('cost')
+            ).filter(
+                CostData.date >= start_date,
+                CostData.date < end_date
+            )
+            query = filter_accounts(query, CostData.cloud_account_id, account_ids)
+            return query.group_by(key, day).all()
+
+        key = CostDailyRollup.cloud_account_id if group_by == "account" else CostDailyRollup.service
+        query = self.db.query(
+            key.label('key'),
+            CostDailyRollup.day.label('day'),
+            func.sum(CostDailyRollup.total_cost).label('cost')
+        ).filter(
+            CostDailyRollup.day >= start_date,
+            CostDailyRollup.day < end_date
+        )
+        query = filter_accounts(query, CostDailyRollup.cloud_account_id, account_ids)
+        return query.group_by(key, CostDailyRollup.day).all()
+
+    def _data_version(self, start_date: datetime, end_date: datetime,
+                      account_ids: Optional[List[int]], from_rollups: bool) -> Tuple:
+        """Cheap fingerprint of the history a model would be fitted on."""
+        if not from_rollups:
+            query = self.db.query(func.max(CostData.id), func.count(CostData.id)).filter(
+                CostData.date >= start_date,
+                CostData.date < end_date
+            )
+            query = filter_accounts(query, CostData.cloud_account_id, account_ids)
+        else:
+            query = self.db.query(func.max(CostDailyRollup.updated_at), func.count(CostDailyRollup.id)).filter(
+                CostDailyRollup.day >= start_date,
+                CostDailyRollup.day < end_date
+            )
+            query = filter_accounts(query, CostDailyRollup.cloud_account_id, account_ids)
+
+        return tuple(query.one())
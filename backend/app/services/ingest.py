@@ -0,0 +1,59 @@
+# app/services/ingest.py
+from datetime import timedelta
+from typing import Any, Dict, List
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from app.db.models import CostData
+from app.services.budgets import BudgetEvaluator
+from app.services.rollups import CostRollupService
+from app.services.streaming_anomalies import StreamingAnomalyScorer
+
+class CostIngestService:
+    """Service for loading cost records and keeping derived data in step."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def ingest(self, records: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Insert a batch of cost records, refresh the rollups for the days the
+        batch touched, add the batch to budget month-to-date spend and score
+        each resource's newest day against its running statistics.
+
+        Records are dicts with cloud_account_id, date, service, resource_id,
+        tags and cost. A batch with records that have no cloud_account_id is
+        rejected with ValueError before anything is written, since their
+        rollups, budgets and running statistics are kept per account. The
+        caller is responsible for committing.
+        """
+        if not records:
+            return {'records': 0, 'rollup_rows': 0, 'budget_alerts': 0, 'anomaly_flags': 0}
+
+        batch = pd.DataFrame.from_records(records, columns=['cloud_account_id', 'date', 'service', 'resource_id', 'tags', 'cost'])
+        batch['date'] = pd.to_datetime(batch['date'])
+
+        missing = batch['cloud_account_id'].isna()
+        if missing.any():
+            raise ValueError(f"{int(missing.sum())} of {len(batch)} cost records have no cloud_account_id")
+
+        self.db.bulk_insert_mappings(CostData, records)
+
+        # Rebuild only the touched day range of each account
+        rollups = CostRollupService(self.db)
+        rollup_rows = 0
+        days = batch.groupby('cloud_account_id')['date'].agg(['min', 'max'])
+        for account_id, span in days.iterrows():
+            first_day = span['min'].floor('D').to_pydatetime()
+            last_day = span['max'].floor('D').to_pydatetime()
+            rollup_rows += rollups.refresh(first_day, last_day + timedelta(days=1), int(account_id))
+
+        alerts = BudgetEvaluator(self.db).apply_batch(batch)
+        flagged = StreamingAnomalyScorer(self.db).apply_batch(batch)
+
+        return {
+            'records': len(records),
+            'rollup_rows': rollup_rows,
+            'budget_alerts': len(alerts),
+            'anomaly_flags': len(flagged)
+        }
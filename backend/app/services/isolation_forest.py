@@ -0,0 +1,142 @@
+# app/services/isolation_forest.py
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeout
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+import math
+import os
+import threading
+import time
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+# Fitted models kept in memory, keyed by series, contamination, data watermark and a fingerprint of the features
+MODEL_CACHE_SIZE = 4096
+
+# Worker processes used for training; fewer series than this are trained inline
+MAX_WORKERS = os.cpu_count() or 1
+PARALLEL_MIN_SERIES = 16
+
+# Chunks per worker, so slow chunks do not leave the other workers idle
+CHUNKS_PER_WORKER = 4
+
+_model_cache: "OrderedDict[Tuple, IsolationForest]" = OrderedDict()
+_model_cache_lock = threading.Lock()
+
+_executors: Dict[int, ProcessPoolExecutor] = {}
+_executor_lock = threading.Lock()
+
+def _fit_chunk(chunk: List[Tuple[Hashable, np.ndarray]], contamination: float,
+               deadline: Optional[float] = None) -> List[Tuple[Hashable, IsolationForest, np.ndarray, np.ndarray]]:
+    """
+    Fit and score one model per series.
+    Runs in worker processes, so each forest is built single-threaded. With a
+    deadline (a time.monotonic() value, which is system-wide and so valid in
+    the workers too), no new model is started once it has passed.
+    """
+    results = []
+    for key, X in chunk:
+        if deadline is not None and time.monotonic() > deadline:
+            break
+        model = IsolationForest(contamination=contamination, random_state=42, n_jobs=1)
+        model.fit(X)
+        results.append((key, model) + _score(model, X))
+    return results
+
+def _score(model: IsolationForest, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Predictions and decision scores from one pass over the trees (what predict does internally)."""
+    scores = model.decision_function(X)
+    return np.where(scores < 0, -1, 1), scores
+
+def _get_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    Shared process pool for a worker count, created on first use.
+    Pools are never shut down here, since another thread may be using one.
+    """
+    with _executor_lock:
+        executor = _executors.get(workers)
+        if executor is None:
+            executor = _executors[workers] = ProcessPoolExecutor(max_workers=workers)
+        return executor
+
+def _cache_key(key: Hashable, contamination: float, X: np.ndarray, watermark: Any) -> Tuple:
+    """
+    Cache key for a series' model. The row count and sum of the features
+    catch changes the watermark does not describe, such as edits to earlier
+    days or a different window.
+    """
+    return (key, contamination, watermark, X.shape[0], float(X.sum()))
+
+def score_series(
+    series: Dict[Hashable, Tuple[np.ndarray, Any]],
+    contamination: float,
+    n_jobs: Optional[int] = None,
+    deadline: Optional[float] = None
+) -> Dict[Hashable, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Get Isolation Forest predictions and decision scores for many series.
+
+    series maps a key to its feature matrix and a data watermark. A model is
+    reused from the cache while the key, contamination, watermark and a
+    fingerprint of the features (row count and sum) match, so unchanged
+    series are only scored; the rest are trained in chunks on a
+    process pool of n_jobs workers (MAX_WORKERS for None or -1, 1 for inline).
+    Returns {key: (predictions, scores)}, where -1 marks an anomaly and a lower
+    score is more anomalous.
+
+    With a deadline (a time.monotonic() value), training stops once it has
+    passed: chunks not yet started are cancelled, running chunks start no new
+    model, the models fitted so far are still cached, and TimeoutError is
+    raised.
+    """
+    results = {}
+    to_train = []
+
+    for key, (X, watermark) in series.items():
+        cache_key = _cache_key(key, contamination, X, watermark)
+        with _model_cache_lock:
+            model = _model_cache.get(cache_key)
+            if model is not None:
+                _model_cache.move_to_end(cache_key)
+
+        if model is None:
+            to_train.append((key, X))
+        else:
+            results[key] = _score(model, X)
+
+    workers = MAX_WORKERS if n_jobs is None or n_jobs < 0 else n_jobs
+    if workers <= 1 or len(to_train) < PARALLEL_MIN_SERIES:
+        fitted = _fit_chunk(to_train, contamination, deadline)
+    else:
+        chunk_size = math.ceil(len(to_train) / (workers * CHUNKS_PER_WORKER))
+        chunks = [to_train[i:i + chunk_size] for i in range(0, len(to_train), chunk_size)]
+        executor = _get_executor(workers)
+        futures = [executor.submit(_fit_chunk, chunk, contamination, deadline) for chunk in chunks]
+
+        fitted = []
+        for future in futures:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                fitted.extend(future.result(timeout=remaining))
+            except FuturesTimeout:
+                for pending in futures:
+                    pending.cancel()
+                break
+
+    _cache_models(series, contamination, fitted, results)
+
+    if len(results) < len(series):
+        raise TimeoutError(f"Isolation Forest training passed its deadline after {len(fitted)} of {len(to_train)} models")
+
+    return results
+
+def _cache_models(series: Dict[Hashable, Tuple[np.ndarray, Any]], contamination: float,
+                  fitted: List[Tuple[Hashable, IsolationForest, np.ndarray, np.ndarray]],
+                  results: Dict[Hashable, Tuple[np.ndarray, np.ndarray]]):
+    """Cache newly fitted models and add their predictions to results."""
+    with _model_cache_lock:
+        for key, model, predictions, scores in fitted:
+            X, watermark = series[key]
+            _model_cache[_cache_key(key, contamination, X, watermark)] = model
+            results[key] = (predictions, scores)
+        while len(_model_cache) > MODEL_CACHE_SIZE:
+            _model_cache.popitem(last=False)
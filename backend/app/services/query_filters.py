@@ -0,0 +1,193 @@
+# app/services/query_filters.py
+from typing import List, Optional, Sequence, Tuple
+from sqlalchemy import Integer, String, all_, and_, any_, literal, not_, or_
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app.db.models import CostData
+
+def filter_accounts(query, column, account_ids: Optional[Sequence[int]] = None):
+    """
+    Restrict a query to the given cloud accounts.
+
+    account_ids is the request's resolved account scope: None means no
+    restriction (admins), otherwise the query is limited with
+    column = ANY(:ids) so it can use the account index. An empty scope
+    matches nothing.
+    """
+    if account_ids is None:
+        return query
+
+    return query.filter(column == any_(literal(list(account_ids), ARRAY(Integer))))
+
+class ListPredicate:
+    """Column value in (or, negated, not in) a list of values."""
+
+    def __init__(self, values: List[str], negate: bool = False):
+        self.values = values
+        self.negate = negate
+
+    def clause(self, column):
+        values = literal(self.values, ARRAY(String))
+        if self.negate:
+            return or_(column.is_(None), column != all_(values))
+        return column == any_(values)
+
+class TagPredicate:
+    """Tag key equal to (or, negated, not equal to) one of several values."""
+
+    def __init__(self, key: str, values: List[str], negate: bool = False):
+        self.key = key
+        self.values = values
+        self.negate = negate
+
+    def clause(self, column):
+        # One containment test per value so the GIN index on tags can answer each
+        matches = or_(*[column.contains({self.key: value}) for value in self.values])
+        if self.negate:
+            return or_(column.is_(None), not_(matches))
+        return matches
+
+class CostFilter:
+    """
+    Filter expression for cost queries, parsed once per request.
+
+    Syntax (see parse_cost_filter):
+      service=EC2,S3        service in the list
+      service=!Lambda       service not in the list
+      resource=i-1,i-2      likewise for resource ids
+      tag=env:prod|staging  tag env is prod or staging (repeat tag= to AND)
+      tag=!team:ml          tag team is not ml (or is missing)
+      min_cost / max_cost   per line item cost bounds
+
+    Scope: only the cost exploration endpoints of app.api.cost_analysis_extended
+    (trend, comparison, breakdown, daily, items, pivot, top resources and
+    export) take a filter. CostAnalysisService in app.services.cost_analysis,
+    anomaly detection and recommendations read every cost row in the
+    account scope and accept no filter.
+    """
+
+    def __init__(
+        self,
+        services: Optional[ListPredicate] = None,
+        resources: Optional[ListPredicate] = None,
+        tags: Optional[List[TagPredicate]] = None,
+        min_cost: Optional[float] = None,
+        max_cost: Optional[float] = None
+    ):
+        self.services = services
+        self.resources = resources
+        self.tags = tags or []
+        self.min_cost = min_cost
+        self.max_cost = max_cost
+
+    @property
+    def is_empty(self) -> bool:
+        return (self.services is None and self.resources is None and not self.tags
+                and self.min_cost is None and self.max_cost is None)
+
+    @property
+    def row_level(self) -> bool:
+        """Whether the filter needs individual line items (tags or cost bounds)."""
+        return bool(self.tags) or self.min_cost is not None or self.max_cost is not None
+
+    def supported_by(self, has_resource: bool = False) -> bool:
+        """Whether an aggregate keyed by service (and optionally resource) can answer the filter."""
+        return not self.row_level and (self.resources is None or has_resource)
+
+    def clauses(self, service_column=CostData.service, resource_column=CostData.resource_id,
+                tags_column=CostData.tags, cost_column=CostData.cost) -> list:
+        """
+        Compile the filter to SQL predicates on the given columns.
+        Raises ValueError when a predicate needs a column that is not available.
+        """
+        predicates = [
+            (self.services, service_column, 'service'),
+            (self.resources, resource_column, 'resource')
+        ]
+
+        clauses = []
+        for predicate, column, name in predicates:
+            if predicate is None:
+                continue
+            if column is None:
+                raise ValueError(f"Filtering by {name} is not supported here")
+            clauses.append(predicate.clause(column))
+
+        if self.tags:
+            if tags_column is None:
+                raise ValueError("Filtering by tag is not supported here")
+            clauses.extend(tag.clause(tags_column) for tag in self.tags)
+
+        if self.min_cost is not None or self.max_cost is not None:
+            if cost_column is None:
+                raise ValueError("Filtering by cost is not supported here")
+            if self.min_cost is not None:
+                clauses.append(cost_column >= self.min_cost)
+            if self.max_cost is not None:
+                clauses.append(cost_column <= self.max_cost)
+
+        return clauses
+
+def filter_costs(query, filters: Optional[CostFilter] = None, **columns):
+    """
+    Apply a parsed cost filter to a query.
+    Columns default to CostData's; pass service_column etc. to filter rollups.
+    """
+    if filters is None or filters.is_empty:
+        return query
+
+    clauses = filters.clauses(**columns)
+    return query.filter(and_(*clauses)) if clauses else query
+
+def parse_cost_filter(
+    service: Optional[str] = None,
+    tags: Optional[Sequence[str]] = None,
+    resource: Optional[str] = None,
+    min_cost: Optional[float] = None,
+    max_cost: Optional[float] = None
+) -> CostFilter:
+    """
+    Parse request filter parameters into a CostFilter.
+    Raises ValueError for malformed expressions.
+    """
+    if min_cost is not None and max_cost is not None and min_cost > max_cost:
+        raise ValueError("min_cost must not be greater than max_cost")
+
+    return CostFilter(
+        services=_parse_list(service, 'service'),
+        resources=_parse_list(resource, 'resource'),
+        tags=[_parse_tag(t) for t in tags or [] if t],
+        min_cost=min_cost,
+        max_cost=max_cost
+    )
+
+def _split_negation(expression: str) -> Tuple[str, bool]:
+    expression = expression.strip()
+    if expression.startswith('!'):
+        return expression[1:].strip(), True
+    return expression, False
+
+def _parse_list(expression: Optional[str], name: str) -> Optional[ListPredicate]:
+    """Parse "a,b,c" or "!a,b" into a ListPredicate."""
+    if expression is None or not expression.strip():
+        return None
+
+    body, negate = _split_negation(expression)
+    values = [v.strip() for v in body.split(',')]
+
+    if not values or any(not v for v in values):
+        raise ValueError(f"Malformed {name} filter: {expression!r}")
+
+    return ListPredicate(values, negate)
+
+def _parse_tag(expression: str) -> TagPredicate:
+    """Parse "key:value", "key:v1|v2" or "!key:value" into a TagPredicate."""
+    body, negate = _split_negation(expression)
+    key, sep, value_list = body.partition(':')
+    key = key.strip()
+    values = [v.strip() for v in value_list.split('|')]
+
+    if not sep or not key or any(not v for v in values):
+        raise ValueError(f"Malformed tag filter: {expression!r} (expected key:value)")
+
+    return TagPredicate(key, values, negate)
@@ -0,0 +1,229 @@
+# app/services/rollups.py
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, literal
+import math
+import pandas as pd
+
+from app.db.models import CostData, CostDailyRollup, ResourceMonthlyCost
+from app.services import sketches
+from app.services.query_filters import filter_accounts
+
+def month_start(date: datetime) -> datetime:
+    """Get the first instant of the month containing date."""
+    return date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def next_month(date: datetime) -> datetime:
+    """Get the first instant of the month after the one containing date."""
+    start = month_start(date)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+class CostRollupService:
+    """Service for maintaining pre-aggregated daily cost rollups."""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def refresh(self, start_date: datetime, end_date: datetime, account_id: Optional[int] = None) -> int:
+        """
+        Rebuild the (account, service, day) rollups for the given period.
+
+        Each rollup row carries the day's total cost, its row count and a
+        HyperLogLog sketch of the distinct resource_ids seen (rows without one
+        are not counted), so distinct counts over any window can be answered
+        by merging sketches.
+        Existing rollup rows in the period are replaced, so refreshing the same
+        days twice is safe. The caller is responsible for committing.
+        Returns the number of rollup rows written.
+        """
+        start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        # Drop the rollups we are about to rebuild
+        stale = self.db.query(CostDailyRollup).filter(
+            CostDailyRollup.day >= start_date,
+            CostDailyRollup.day < end_date
+        )
+
+        if account_id:
+            stale = stale.filter(CostDailyRollup.cloud_account_id == account_id)
+
+        stale.delete(synchronize_session=False)
+
+        # One scan of the raw data, pre-aggregated per resource and day
+        day = func.date_trunc('day', CostData.date)
+        query = self.db.query(
+            CostData.cloud_account_id,
+            CostData.service,
+            day.label('day'),
+            CostData.resource_id,
+            func.sum(CostData.cost).label('total_cost'),
+            func.count(CostData.id).label('record_count')
+        ).filter(
+            CostData.date >= start_date,
+            CostData.date < end_date
+        )
+
+        if account_id:
+            query = query.filter(CostData.cloud_account_id == account_id)
+
+        rows = query.group_by(CostData.cloud_account_id, CostData.service, day, CostData.resource_id).all()
+        if not rows:
+            # The period may have been emptied; its monthly totals are stale too
+            self._refresh_resource_months(start_date, end_date, account_id)
+            return 0
+
+        frame = pd.DataFrame.from_records(
+            rows, columns=['cloud_account_id', 'service', 'day', 'resource_id', 'total_cost', 'record_count']
+        )
+
+        keys = ['cloud_account_id', 'service', 'day']
+        grouped = frame.groupby(keys, sort=False, dropna=False)
+        totals = grouped[['total_cost', 'record_count']].sum().reset_index()
+
+        # ngroup numbers groups in the same order as the aggregated frame. Rows
+        # without a resource_id count towards the totals but are not a resource
+        has_resource = frame['resource_id'].notna().to_numpy()
+        resource_sketches = sketches.build_sketches(
+            grouped.ngroup().to_numpy()[has_resource],
+            frame['resource_id'][has_resource].tolist(),
+            len(totals)
+        )
+
+        updated_at = datetime.utcnow()
+        self.db.bulk_insert_mappings(CostDailyRollup, [
+            {
+                'cloud_account_id': int(row.cloud_account_id) if pd.notna(row.cloud_account_id) else None,
+                'service': row.service,
+                'day': row.day.to_pydatetime(),
+                'total_cost': float(row.total_cost),
+                'record_count': int(row.record_count),
+                'resource_hll': resource_sketches[i].tobytes(),
+                'updated_at': updated_at
+            }
+            for i, row in enumerate(totals.itertuples(index=False))
+        ])
+
+        self._refresh_resource_months(start_date, end_date, account_id)
+
+        return len(totals)
+
+    def _refresh_resource_months(self, start_date: datetime, end_date: datetime, account_id: Optional[int] = None) -> None:
+        """
+        Rebuild the per-resource monthly totals for every month touched by the period.
+        Whole months are recomputed, since a partial refresh would otherwise
+        drop the untouched days of the month.
+        """
+        first_month = month_start(start_date)
+        end_month = next_month(end_date) if end_date > month_start(end_date) else end_date
+
+        stale = self.db.query(ResourceMonthlyCost).filter(
+            ResourceMonthlyCost.month >= first_month,
+            ResourceMonthlyCost.month < end_month
+        )
+
+        if account_id:
+            stale = stale.filter(ResourceMonthlyCost.cloud_account_id == account_id)
+
+        stale.delete(synchronize_session=False)
+
+        month = func.date_trunc('month', CostData.date)
+        source = self.db.query(
+            CostData.cloud_account_id,
+            CostData.service,
+            CostData.resource_id,
+            month.label('month'),
+            func.sum(CostData.cost).label('total_cost'),
+            func.count(CostData.id).label('record_count'),
+            literal(datetime.utcnow()).label('updated_at')
+        ).filter(
+            CostData.date >= first_month,
+            CostData.date < end_month
+        )
+
+        if account_id:
+            source = source.filter(CostData.cloud_account_id == account_id)
+
+        source = source.group_by(CostData.cloud_account_id, CostData.service, CostData.resource_id, month)
+
+        self.db.execute(
+            insert(ResourceMonthlyCost.__table__).from_select(
+                ['cloud_account_id', 'service', 'resource_id', 'month', 'total_cost', 'record_count', 'updated_at'],
+                source.statement
+            )
+        )
+
+    def is_current(self, start_date: datetime, end_date: datetime, account_ids: Optional[List[int]] = None) -> bool:
+        """
+        Whether the rollups of every day touched by the period match the raw data.
+
+        Rollups are only rebuilt by refresh (on ingest, by the seed script and
+        by scripts/refresh_rollups.py), so cost rows written any other way
+        leave them behind. Row counts and cost totals of the raw data and the
+        rollups are compared over whole days; this scans the raw rows of the
+        period, so readers call it once per request rather than per query.
+        """
+        first_day = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        end_day = end_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        if end_day < end_date:
+            end_day += timedelta(days=1)
+
+        raw = self.db.query(func.count(CostData.id), func.sum(CostData.cost)).filter(
+            CostData.date >= first_day,
+            CostData.date < end_day
+        )
+        raw = filter_accounts(raw, CostData.cloud_account_id, account_ids)
+
+        rolled = self.db.query(func.sum(CostDailyRollup.record_count), func.sum(CostDailyRollup.total_cost)).filter(
+            CostDailyRollup.day >= first_day,
+            CostDailyRollup.day < end_day
+        )
+        rolled = filter_accounts(rolled, CostDailyRollup.cloud_account_id, account_ids)
+
+        raw_count, raw_cost = raw.one()
+        rolled_count, rolled_cost = rolled.one()
+
+        return (raw_count or 0) == (rolled_count or 0) and math.isclose(
+            raw_cost or 0.0, rolled_cost or 0.0, rel_tol=1e-9, abs_tol=1e-6
+        )
+
+    def get_distinct_resource_counts(
+        self,
+        start_date: datetime,
+        end_date: datetime,
+        account_ids: Optional[List[int]] = None,
+        group_by_service: bool = True
+    ) -> Dict[Optional[str], int]:
+        """
+        Estimate distinct resource counts over a period by merging daily sketches.
+
+        Returns {service: count}, or {None: count} for all services together
+        when group_by_service is False. Estimates carry a relative standard
+        error of about 2.3% (see app.services.sketches).
+        """
+        query = self.db.query(
+            CostDailyRollup.service,
+            CostDailyRollup.resource_hll
+        ).filter(
+            CostDailyRollup.day >= start_date.replace(hour=0, minute=0, second=0, microsecond=0),
+            CostDailyRollup.day < end_date,
+            CostDailyRollup.resource_hll.isnot(None)
+        )
+
+        query = filter_accounts(query, CostDailyRollup.cloud_account_id, account_ids)
+
+        rows = query.all()
+        if not rows:
+            return {}
+
+        if group_by_service:
+            codes, groups = pd.factorize(pd.Series([r.service for r in rows]), use_na_sentinel=False)
+        else:
+            codes, groups = [0] * len(rows), [None]
+
+        merged = sketches.merge_sketches(codes, [bytes(r.resource_hll) for r in rows])
+        counts = sketches.estimate_counts(merged)
+
+        return {group: int(round(count)) for group, count in zip(groups, counts)}
@@ -0,0 +1,75 @@
+# app/services/seasonal.py
+from typing import Optional, Tuple
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+WEEKLY_PERIOD = 7
+
+def _linear_fit(x: np.ndarray, Y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Least-squares slope and intercept of every row of Y against the shared x."""
+    x_mean = x.mean()
+    y_mean = Y.mean(axis=1)
+    centered = x - x_mean
+    slope = (Y - y_mean[:, None]) @ centered / (centered @ centered)
+    return slope, y_mean - slope * x_mean
+
+def decompose(matrix: np.ndarray, period: int = WEEKLY_PERIOD) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Additive seasonal decomposition of many equally long series at once.
+
+    matrix holds one series per row, with no missing values and at least
+    2 * period columns. Matches statsmodels' seasonal_decompose(period=period,
+    extrapolate_trend='freq') row by row: a centered moving-average trend whose
+    ends are extrapolated from a linear fit over the nearest period points,
+    seasonal means per phase (from the first column) centered on zero, and the
+    remaining residuals. Returns (trend, seasonal, resid), each shaped like matrix.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    n_days = matrix.shape[1]
+
+    if period % 2 == 0:
+        weights = np.array([0.5] + [1.0] * (period - 1) + [0.5]) / period
+    else:
+        weights = np.repeat(1.0 / period, period)
+    half = len(weights) // 2
+
+    trend = np.full(matrix.shape, np.nan)
+    trend[:, half:n_days - half] = sliding_window_view(matrix, len(weights), axis=1) @ weights
+
+    # Extrapolate both ends from the period points next to them (statsmodels' window bounds)
+    front, back = half, n_days - half - 1
+    front_last = min(front + period, back)
+    back_first = max(front, back - period)
+
+    x = np.arange(front, front_last, dtype=np.float64)
+    slope, intercept = _linear_fit(x, trend[:, front:front_last])
+    trend[:, :front] = np.arange(front) * slope[:, None] + intercept[:, None]
+
+    x = np.arange(back_first, back, dtype=np.float64)
+    slope, intercept = _linear_fit(x, trend[:, back_first:back])
+    trend[:, back + 1:] = np.arange(back + 1, n_days) * slope[:, None] + intercept[:, None]
+
+    detrended = matrix - trend
+
+    period_averages = np.column_stack([detrended[:, phase::period].mean(axis=1) for phase in range(period)])
+    period_averages -= period_averages.mean(axis=1, keepdims=True)
+
+    seasonal = np.tile(period_averages, n_days // period + 1)[:, :n_days]
+    return trend, seasonal, detrended - seasonal
+
+def residual_outliers(resid: np.ndarray, sensitivity: float,
+                      observed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Flag residuals larger than sensitivity standard deviations of their row.
+    Rows without variation are never flagged. With an observed mask, the
+    standard deviation and the flags only cover observed cells, so filled-in
+    days neither shrink the threshold nor get flagged. Returns (mask, per-row std).
+    """
+    if observed is None:
+        std = resid.std(axis=1)
+        mask = (np.abs(resid) > sensitivity * std[:, None]) & (std > 0)[:, None]
+        return mask, std
+
+    std = np.sqrt(np.nanvar(np.where(observed, resid, np.nan), axis=1))
+    mask = observed & (np.abs(resid) > sensitivity * std[:, None]) & (std > 0)[:, None]
+    return mask, std
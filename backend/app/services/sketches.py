@@ -0,0 +1,81 @@
+# app/services/sketches.py
+from typing import Iterable, List, Sequence
+import hashlib
+import numpy as np
+
+# 2^11 one-byte registers per sketch (2 KB). The relative standard error of a
+# HyperLogLog estimate is 1.04 / sqrt(registers), i.e. about 2.3% here; roughly
+# 95% of estimates fall within twice that (4.6%) of the true distinct count.
+DEFAULT_PRECISION = 11
+
+def hash_values(values: Iterable[str]) -> np.ndarray:
+    """
+    Hash values to 64-bit integers.
+    Uses blake2b rather than hash() so sketches built by different processes
+    can be merged.
+    """
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(str(v).encode(), digest_size=8).digest(), 'big') for v in values),
+        dtype=np.uint64
+    )
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Vectorized int.bit_length for uint64 arrays."""
+    values = values.copy()
+    length = np.zeros(values.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        wide = values >= np.uint64(1 << shift)
+        length[wide] += shift
+        values[wide] >>= np.uint64(shift)
+    return length + (values > 0)
+
+def _register_updates(hashes: np.ndarray, precision: int):
+    """Split hashes into a register index and the rank (leading zeros + 1) to store."""
+    width = 64 - precision
+    index = (hashes >> np.uint64(width)).astype(np.int64)
+    remainder = hashes & np.uint64((1 << width) - 1)
+    rank = width - _bit_length(remainder) + 1
+    return index, rank.astype(np.uint8)
+
+def estimate_counts(registers: np.ndarray) -> np.ndarray:
+    """
+    Estimate distinct counts for a (sketches x registers) matrix.
+    Applies the linear counting correction for small cardinalities.
+    """
+    m = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+
+    raw = alpha * m * m / np.sum(np.power(2.0, -registers.astype(np.float64)), axis=1)
+    zeros = np.count_nonzero(registers == 0, axis=1)
+
+    small = (raw <= 2.5 * m) & (zeros > 0)
+    linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where(small, linear, raw)
+
+def build_sketches(group_codes: np.ndarray, values: Sequence[str], n_groups: int,
+                   precision: int = DEFAULT_PRECISION) -> np.ndarray:
+    """
+    Build one sketch per group in a single pass.
+    group_codes assigns each value to a group in [0, n_groups).
+    Returns a (n_groups x registers) uint8 matrix.
+    """
+    registers = np.zeros((n_groups, 1 << precision), dtype=np.uint8)
+    if len(values):
+        index, rank = _register_updates(hash_values(values), precision)
+        np.maximum.at(registers, (np.asarray(group_codes), index), rank)
+    return registers
+
+def merge_sketches(group_codes: np.ndarray, sketches: List[bytes]) -> np.ndarray:
+    """
+    Merge serialized sketches that share a group code.
+    Returns a (groups x registers) matrix ordered by group code, one row per
+    distinct code.
+    """
+    registers = np.stack([np.frombuffer(s, dtype=np.uint8) for s in sketches])
+    group_codes = np.asarray(group_codes)
+
+    order = np.argsort(group_codes, kind='stable')
+    sorted_codes = group_codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+
+    return np.maximum.reduceat(registers[order], starts, axis=0)
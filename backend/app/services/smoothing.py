@@ -0,0 +1,80 @@
+# app/services/smoothing.py
+from itertools import product
+from typing import Iterator, Tuple
+import numpy as np
+
+# Parameters used without a grid search, and for series the search cannot fit
+DEFAULT_ALPHA = 0.5
+DEFAULT_BETA = 0.1
+DEFAULT_PHI = 0.9
+
+# Coarse grid searched for every series at once (alpha x beta x phi)
+ALPHA_GRID = (0.1, 0.3, 0.5, 0.7, 0.9)
+BETA_GRID = (0.01, 0.1, 0.3)
+PHI_GRID = (0.8, 0.9, 0.98)
+
+def _forecasts(matrix: np.ndarray, alpha: np.ndarray, beta: np.ndarray, phi: np.ndarray) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Run damped additive Holt smoothing over every row of matrix.
+
+    alpha, beta and phi broadcast against (rows, settings), so one pass can
+    try many parameter settings per series. Yields (t, one-step-ahead
+    forecast) for each column. Missing (NaN) observations carry the state
+    forward without updating it. The level starts at the first value and
+    the trend at zero.
+    """
+    first = matrix[:, :1]
+    level = np.broadcast_to(np.where(np.isfinite(first), first, 0.0),
+                            np.broadcast_shapes(first.shape, np.shape(alpha))).copy()
+    trend = np.zeros_like(level)
+
+    for t in range(matrix.shape[1]):
+        forecast = level + phi * trend
+        yield t, forecast
+
+        y = matrix[:, t:t + 1]
+        observed = np.isfinite(y)
+        new_level = alpha * np.where(observed, y, 0.0) + (1 - alpha) * forecast
+        new_trend = beta * (new_level - level) + (1 - beta) * phi * trend
+
+        level = np.where(observed, new_level, forecast)
+        trend = np.where(observed, new_trend, phi * trend)
+
+def fit(matrix: np.ndarray, grid_search: bool = True) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Fit damped additive Holt smoothing to many series at once.
+
+    matrix holds one series per row, NaN-padded to a common length. With
+    grid_search, every (alpha, beta, phi) combination of the module grids is
+    run in one vectorized pass and each series keeps the combination with the
+    lowest one-step squared error; otherwise the DEFAULT_* parameters are
+    used. Returns (fitted one-step forecasts, per-row [alpha, beta, phi], and
+    a mask of rows that fell back to the defaults because no setting gave a
+    finite error).
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    n_series = matrix.shape[0]
+
+    params = np.tile([DEFAULT_ALPHA, DEFAULT_BETA, DEFAULT_PHI], (n_series, 1))
+    defaulted = np.zeros(n_series, dtype=bool)
+
+    if grid_search and n_series:
+        grid = np.array(list(product(ALPHA_GRID, BETA_GRID, PHI_GRID)))
+        sse = np.zeros((n_series, len(grid)))
+
+        for t, forecast in _forecasts(matrix, grid[:, 0], grid[:, 1], grid[:, 2]):
+            errors = matrix[:, t:t + 1] - forecast
+            sse += np.where(np.isfinite(errors), errors * errors, 0.0)
+
+        # Rows with no observations have zero error for every setting
+        fitted_rows = np.isfinite(matrix).sum(axis=1) > 1
+        defaulted = ~fitted_rows | ~np.isfinite(sse).all(axis=1)
+
+        best = np.argmin(np.where(np.isfinite(sse), sse, np.inf), axis=1)
+        params[~defaulted] = grid[best[~defaulted]]
+
+    fitted = np.empty_like(matrix)
+    for t, forecast in _forecasts(matrix, params[:, :1], params[:, 1:2], params[:, 2:]):
+        fitted[:, t] = forecast[:, 0]
+
+    return fitted, params, defaulted
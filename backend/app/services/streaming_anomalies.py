@@ -0,0 +1,196 @@
+# app/services/streaming_anomalies.py
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import math
+import pandas as pd
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.db.models import ResourceCostState
+from app.services.query_filters import filter_accounts
+from app.services.smoothing import DEFAULT_ALPHA, DEFAULT_BETA, DEFAULT_PHI
+
+# Completed days a resource needs before its new days are scored
+STREAM_MIN_DAYS = 7
+
+# Standard deviations a day must be from every baseline to be flagged
+STREAM_SENSITIVITY = 3.0
+
+class StreamingAnomalyScorer:
+    """
+    Service for scoring each resource's newest day as it is ingested.
+
+    Every resource keeps running statistics of its completed daily costs
+    (Welford mean and variance, a damped Holt level and trend, and the latest
+    cost per weekday), so a new day is scored and folded in with O(1) work
+    instead of re-reading the resource's history.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def apply_batch(self, batch: pd.DataFrame) -> List[ResourceCostState]:
+        """
+        Fold a batch of newly ingested cost rows into the per-resource state.
+
+        batch has cloud_account_id, service, resource_id, date and cost columns.
+        Rows are summed per resource and day. A day later than a resource's
+        current day closes the current day into the statistics and becomes the
+        new current day; rows for the current day add to it. Either way the
+        current day is rescored. Rows for earlier days are left to the batch
+        detectors. Rows without a resource_id (support, data transfer) are
+        tracked as one resource per account and service. The batch's state
+        rows are locked until the caller commits, so concurrent batches fold
+        their days in one after the other. Returns the states flagged as
+        anomalous by this batch. The caller is responsible for committing.
+        """
+        if batch.empty:
+            return []
+
+        daily = batch.assign(day=pd.to_datetime(batch['date']).dt.floor('D')).groupby(
+            ['cloud_account_id', 'service', 'resource_id', 'day'], dropna=False
+        )['cost'].sum().reset_index().sort_values('day', kind='stable')
+
+        # Grouping turns NULL keys into NaN; the state rows hold them as NULL
+        for column in ('service', 'resource_id'):
+            daily[column] = daily[column].astype(object).where(daily[column].notna(), None)
+
+        states = self._load_states(daily)
+        touched = set()
+        updated_at = datetime.utcnow()
+
+        for account_id, service, resource_id, day, cost in zip(
+            daily['cloud_account_id'].tolist(),
+            daily['service'].tolist(),
+            daily['resource_id'].tolist(),
+            daily['day'].dt.to_pydatetime().tolist(),
+            daily['cost'].tolist()
+        ):
+            key = (int(account_id), service, resource_id)
+            state = states[key]
+
+            if state.current_day is None or day > state.current_day:
+                if state.current_day is not None:
+                    self._close_day(state)
+                state.current_day = day
+                state.current_cost = cost
+            elif day == state.current_day:
+                state.current_cost += cost
+            else:
+                continue
+
+            self._score(state)
+            state.updated_at = updated_at
+            touched.add(key)
+
+        return [states[key] for key in touched if states[key].is_anomalous]
+
+    def get_flagged(self, account_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        """Resources whose current day is flagged, most anomalous first."""
+        query = self.db.query(ResourceCostState).filter(ResourceCostState.is_anomalous.is_(True))
+        query = filter_accounts(query, ResourceCostState.cloud_account_id, account_ids)
+
+        states = sorted(query.all(), key=lambda state: abs(state.anomaly_score), reverse=True)
+        return [
+            {
+                'cloud_account_id': state.cloud_account_id,
+                'service': state.service,
+                'resource_id': state.resource_id,
+                'date': state.current_day,
+                'cost': state.current_cost,
+                'expected_cost': state.expected_cost,
+                'avg_cost': state.mean,
+                'anomaly_score': state.anomaly_score,
+                'days_observed': state.day_count,
+                'updated_at': state.updated_at
+            }
+            for state in states
+        ]
+
+    def _load_states(self, daily: pd.DataFrame) -> Dict[tuple, ResourceCostState]:
+        """
+        State rows for the resources in a batch, keyed by (account, service, resource),
+        locked with SELECT ... FOR UPDATE in id order.
+        Rows for new resources are inserted first with ON CONFLICT DO NOTHING, so
+        a resource first seen by two concurrent batches still gets one row, which
+        both then lock. NULL resource_ids never match IN, so they are matched
+        with IS NULL.
+        """
+        resources = daily[['cloud_account_id', 'service', 'resource_id']].drop_duplicates()
+        self.db.execute(insert(ResourceCostState).values([
+            {
+                'cloud_account_id': int(account_id), 'service': service, 'resource_id': resource_id,
+                'day_count': 0, 'mean': 0.0, 'm2': 0.0, 'level': None, 'trend': 0.0,
+                'weekday_costs': [None] * 7, 'current_day': None, 'current_cost': 0.0, 'is_anomalous': False
+            }
+            for account_id, service, resource_id in resources.itertuples(index=False)
+        ]).on_conflict_do_nothing())
+
+        resource_ids = [r for r in daily['resource_id'].unique().tolist() if r is not None]
+        resource_filter = ResourceCostState.resource_id.in_(resource_ids)
+        if daily['resource_id'].isna().any():
+            resource_filter = or_(resource_filter, ResourceCostState.resource_id.is_(None))
+
+        query = self.db.query(ResourceCostState).filter(resource_filter)
+        query = filter_accounts(query, ResourceCostState.cloud_account_id,
+                                [int(a) for a in daily['cloud_account_id'].unique()])
+        query = query.order_by(ResourceCostState.id).with_for_update()
+
+        return {(state.cloud_account_id, state.service, state.resource_id): state for state in query}
+
+    def _close_day(self, state: ResourceCostState):
+        """Fold the finished current day into the running statistics."""
+        cost = state.current_cost
+
+        # Welford update
+        state.day_count += 1
+        delta = cost - state.mean
+        state.mean += delta / state.day_count
+        state.m2 += delta * (cost - state.mean)
+
+        # Damped Holt update
+        if state.level is None:
+            state.level = cost
+            state.trend = 0.0
+        else:
+            forecast = state.level + DEFAULT_PHI * state.trend
+            level = DEFAULT_ALPHA * cost + (1 - DEFAULT_ALPHA) * forecast
+            state.trend = DEFAULT_BETA * (level - state.level) + (1 - DEFAULT_BETA) * DEFAULT_PHI * state.trend
+            state.level = level
+
+        # Reassign so the JSON column is marked as changed
+        weekday_costs = list(state.weekday_costs or [None] * 7)
+        weekday_costs[state.current_day.weekday()] = cost
+        state.weekday_costs = weekday_costs
+
+    def _score(self, state: ResourceCostState):
+        """
+        Score the current day against the long-run mean, the Holt forecast and
+        the same weekday's last cost. A day is flagged only when it is more than
+        STREAM_SENSITIVITY standard deviations from all of them.
+        """
+        if state.day_count < STREAM_MIN_DAYS:
+            state.expected_cost = None
+            state.anomaly_score = None
+            state.is_anomalous = False
+            return
+
+        cost = state.current_cost
+        forecast = state.level + DEFAULT_PHI * state.trend
+        std = math.sqrt(state.m2 / state.day_count)
+
+        state.expected_cost = forecast
+        if std == 0:
+            state.anomaly_score = None
+            state.is_anomalous = False
+            return
+
+        baselines = [state.mean, forecast]
+        same_weekday = (state.weekday_costs or [None] * 7)[state.current_day.weekday()]
+        if same_weekday is not None:
+            baselines.append(same_weekday)
+
+        deviation = min(abs(cost - baseline) for baseline in baselines)
+        state.anomaly_score = math.copysign(deviation / std, cost - forecast)
+        state.is_anomalous = deviation > STREAM_SENSITIVITY * std
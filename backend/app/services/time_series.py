@@ -0,0 +1,99 @@
+# app/services/time_series.py
+from datetime import datetime
+from typing import List, Sequence
+import numpy as np
+
+# Bucket sizes in the order they are tried when picking a resolution
+BUCKETS = ['day', 'week', 'month']
+
+def bucket_starts(start_date: datetime, end_date: datetime, bucket: str) -> np.ndarray:
+    """
+    Get the start of every bucket overlapping [start_date, end_date) as datetime64[D].
+    Weeks start on Monday to match PostgreSQL date_trunc('week').
+    """
+    start = np.datetime64(start_date, 'D')
+    end = np.datetime64(end_date, 'D')
+
+    if bucket == 'day':
+        return np.arange(start, end, dtype='datetime64[D]')
+
+    if bucket == 'week':
+        # 1970-01-01 was a Thursday, so Monday is three days further on
+        first_monday = start - (start.astype(np.int64) + 3) % 7
+        return np.arange(first_monday, end, 7, dtype='datetime64[D]')
+
+    months = np.arange(
+        start.astype('datetime64[M]'),
+        (end - 1).astype('datetime64[M]') + 1,
+        dtype='datetime64[M]'
+    )
+    return months.astype('datetime64[D]')
+
+def choose_bucket(start_date: datetime, end_date: datetime, max_points: int) -> str:
+    """Pick the finest bucket size that keeps the series within max_points."""
+    for bucket in BUCKETS[:-1]:
+        if len(bucket_starts(start_date, end_date, bucket)) <= max_points:
+            return bucket
+    return BUCKETS[-1]
+
+def align_to_buckets(buckets: np.ndarray, dates: Sequence[datetime], values: Sequence[float]) -> np.ndarray:
+    """
+    Place per-bucket values onto a bucket axis, filling missing buckets with 0.
+    Dates outside the axis are dropped.
+    """
+    aligned = np.zeros(len(buckets), dtype=np.float64)
+    if not len(dates):
+        return aligned
+
+    positions = np.searchsorted(buckets, np.array(dates, dtype='datetime64[D]'))
+    values = np.asarray(values, dtype=np.float64)
+
+    in_range = positions < len(buckets)
+    np.add.at(aligned, positions[in_range], values[in_range])
+    return aligned
+
+def lttb(values: Sequence[float], threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the indices of the points to keep. The first and last points are
+    always kept; every bucket in between contributes the point that forms the
+    largest triangle with the previously kept point and the next bucket's
+    average, which preserves peaks and troughs much better than averaging.
+    """
+    y = np.asarray(values, dtype=np.float64)
+    n = len(y)
+
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.arange(n, dtype=np.float64)
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype(int)
+
+    indices = np.empty(threshold, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # Average of the following bucket (the last point for the final bucket)
+        next_start = end
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) -
+            (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+
+    return indices
+
+def format_labels(buckets: np.ndarray) -> List[str]:
+    """Format a datetime64 bucket axis as YYYY-MM-DD labels."""
+    return np.datetime_as_string(buckets, unit='D').tolist()
@@ -0,0 +1,189 @@
+# backend/scripts/benchmark_anomaly_accuracy.py
+import sys
+import os
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import isolation_forest
+from app.services.cost_analysis import CostAnalysisService
+from app.services.enhanced_anomaly_detection import EnhancedAnomalyDetection
+from seed_cost_data import SPIKE_RATE, add_spikes
+
+# Base daily cost and relative variance per service, as in seed_cost_data
+SERVICES = {
+    'EC2': (50.0, 0.2),
+    'S3': (20.0, 0.25),
+    'RDS': (30.0, 0.27),
+    'Lambda': (5.0, 0.4),
+    'EBS': (10.0, 0.3)
+}
+
+ENHANCED_METHODS = ['z_score', 'isolation_forest', 'isolation_forest_cohort', 'time_series',
+                    'rolling_mad', 'trailing_z_score']
+
+# Runs shorter than this in the baseline are too noisy to flag as slowdowns
+MIN_COMPARED_SECONDS = 0.1
+
+# Results of a previous run, compared against unless --baseline says otherwise
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'anomaly_accuracy_baseline.csv')
+
+# Columns of the results table, which is also the format of a stored baseline
+COLUMNS = ['resources', 'rows', 'method', 'detected', 'precision', 'recall', 'f1', 'seconds', 'peak_mb']
+
+def generate_labeled_costs(resources: int, days: int, spike_rate: float = SPIKE_RATE, accounts: int = 3, seed: int = 42):
+    """
+    Synthetic daily costs shaped like seed_cost_data: a base cost per service
+    with a weekday pattern, 3% monthly growth, +-10% noise and spikes from
+    seed_cost_data.add_spikes on spike_rate of the days. Returns the cost
+    frame, ordered by service and date like the detectors' query, and the set
+    of injected (service, resource_id, day) spikes.
+    """
+    rng = np.random.default_rng(seed)
+    names = list(SERVICES)
+
+    resource_services = np.array(names)[rng.integers(0, len(names), resources)]
+    base_costs = np.array([SERVICES[service][0] for service in resource_services])
+    resource_scales = 1 + rng.uniform(-1, 1, resources) * np.array([SERVICES[service][1] for service in resource_services])
+
+    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    dates = np.datetime64(start, 'D') + np.arange(days)
+    weekday_factor = np.where(pd.DatetimeIndex(dates).weekday < 5, 1.0, 0.7)
+    growth = np.arange(days) / 30.0 * 0.03 + 1
+
+    costs = (base_costs * resource_scales)[:, None] * weekday_factor * growth * rng.uniform(0.9, 1.1, (resources, days))
+    spikes = add_spikes(costs, rng, spike_rate)
+
+    resource_ids = np.char.add(np.char.add(resource_services, '-'), np.arange(resources).astype(str))
+    frame = pd.DataFrame({
+        'date': np.tile(dates, resources).astype('datetime64[ns]'),
+        'service': np.repeat(resource_services, days),
+        'resource_id': np.repeat(resource_ids, days),
+        'cost': costs.ravel(),
+        'cloud_account_id': np.repeat(rng.integers(1, accounts + 1, resources), days)
+    })
+    frame = frame.sort_values(['service', 'date'], kind='stable').reset_index(drop=True)
+
+    rows, columns = np.nonzero(spikes)
+    labels = {
+        (resource_services[row], resource_ids[row], pd.Timestamp(dates[column]).date())
+        for row, column in zip(rows, columns)
+    }
+    return frame, labels
+
+def detectors(days: int, sensitivity: float, time_budget: float):
+    """Name and callable of every detector, each taking a cost frame and returning anomalies."""
+    result = {
+        'cost_analysis.z_score': lambda frame: CostAnalysisService(None)._detect_anomalies_in_frame(frame, sensitivity)
+    }
+    for method in ENHANCED_METHODS:
+        result[f'enhanced.{method}'] = lambda frame, method=method: _detect_enhanced(frame, days, sensitivity, method, time_budget)
+    return result
+
+def _detect_enhanced(frame, days: int, sensitivity: float, method: str, time_budget: float):
+    """
+    Run one enhanced method with a fresh detector, so metrics do not carry over,
+    and an empty Isolation Forest model cache, so every run trains its models.
+    """
+    isolation_forest._model_cache.clear()
+    return EnhancedAnomalyDetection(None)._detect_in_frame(frame, days, sensitivity, [method], time_budget=time_budget)['anomalies']
+
+def score(anomalies, labels):
+    """Precision, recall and F1 of detected (service, resource_id, day) keys against the injected spikes."""
+    detected = {(a['service'], a['resource_id'], a['date'].date()) for a in anomalies}
+    true_positives = len(detected & labels)
+    precision = true_positives / len(detected) if detected else 0.0
+    recall = true_positives / len(labels) if labels else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return len(detected), precision, recall, f1
+
+def run(detector, frame, measure_memory: bool):
+    """Run a detector once untraced for wall time, then once under tracemalloc for peak memory."""
+    start = time.perf_counter()
+    anomalies = detector(frame)
+    elapsed = time.perf_counter() - start
+
+    peak_mb = None
+    if measure_memory:
+        tracemalloc.start()
+        detector(frame)
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+
+    return anomalies, elapsed, peak_mb
+
+def compare(results: pd.DataFrame, baseline: pd.DataFrame, max_f1_drop: float, max_slowdown: float) -> bool:
+    """Print each result next to its baseline row; returns False when any F1 or wall time regressed."""
+    merged = results.merge(baseline, on=['resources', 'method'], how='left', suffixes=('', '_baseline'))
+    merged['f1_change'] = merged['f1'] - merged['f1_baseline']
+    merged['slowdown'] = merged['seconds'] / merged['seconds_baseline']
+
+    slower = (merged['slowdown'] > max_slowdown) & (merged['seconds_baseline'] >= MIN_COMPARED_SECONDS)
+    regressed = (merged['f1_change'] < -max_f1_drop) | slower
+    merged['regressed'] = regressed
+
+    print("\nCompared to baseline")
+    print(merged[['resources', 'method', 'f1', 'f1_baseline', 'f1_change', 'seconds', 'seconds_baseline',
+                  'slowdown', 'regressed']].to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+
+    missing = merged['f1_baseline'].isna().sum()
+    if missing:
+        print(f"  {missing} results have no baseline row")
+    return not regressed.any()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark anomaly detector accuracy, speed and memory on labeled data")
+    parser.add_argument("--scales", default="100,1000", help="Comma-separated resource counts")
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--spike-rate", type=float, default=SPIKE_RATE)
+    parser.add_argument("--sensitivity", type=float, default=2.0)
+    parser.add_argument("--methods", help="Comma-separated detector names; default all")
+    parser.add_argument("--time-budget", type=float, default=3600.0, help="Seconds each enhanced method may run")
+    parser.add_argument("--skip-memory", action="store_true", help="Skip the second, traced run per detector")
+    parser.add_argument("--output", help="Write the results table to this CSV file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="CSV from a previous --output run to compare against; empty to skip the comparison")
+    parser.add_argument("--max-f1-drop", type=float, default=0.02)
+    parser.add_argument("--max-slowdown", type=float, default=1.5)
+    args = parser.parse_args()
+
+    selected = detectors(args.days, args.sensitivity, args.time_budget)
+    if args.methods:
+        names = [name.strip() for name in args.methods.split(",")]
+        unknown = set(names) - set(selected)
+        if unknown:
+            parser.error(f"Unknown detectors: {', '.join(sorted(unknown))}. Choose from {', '.join(selected)}")
+        selected = {name: selected[name] for name in names}
+
+    rows = []
+    for resources in [int(scale) for scale in args.scales.split(",")]:
+        frame, labels = generate_labeled_costs(resources, args.days, args.spike_rate)
+        print(f"{resources:,} resources, {len(frame):,} rows, {len(labels):,} injected spikes")
+
+        for name, detector in selected.items():
+            anomalies, elapsed, peak_mb = run(detector, frame, not args.skip_memory)
+            detected, precision, recall, f1 = score(anomalies, labels)
+            rows.append(dict(zip(COLUMNS, [resources, len(frame), name, detected, precision, recall, f1, elapsed, peak_mb])))
+
+            memory = f"{peak_mb:8.1f} MB" if peak_mb is not None else ""
+            print(f"  {name:<34} {elapsed:8.2f}s {memory}  precision {precision:.2f}  recall {recall:.2f}  F1 {f1:.2f}")
+
+    results = pd.DataFrame(rows, columns=COLUMNS)
+
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"\nWrote {len(results)} results to {args.output}")
+
+    if args.baseline:
+        if not compare(results, pd.read_csv(args.baseline), args.max_f1_drop, args.max_slowdown):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
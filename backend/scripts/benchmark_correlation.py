@@ -0,0 +1,75 @@
+# backend/scripts/benchmark_correlation.py
+import sys
+import os
+import argparse
+import time
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.services import correlation
+
+def generate_matrix(resources: int, days: int, group_size: int, break_rate: float, seed: int = 42):
+    """
+    Synthetic resources x days costs where each group of resources follows a
+    shared daily factor. A fraction of resources get a one-day break away from
+    their group in the recent window. Returns (matrix, break rows).
+    """
+    rng = np.random.default_rng(seed)
+    groups = rng.integers(0, max(resources // group_size, 1), resources)
+
+    factors = np.cumsum(rng.normal(0, 1, (groups.max() + 1, days)), axis=1)
+    scale = rng.uniform(5, 50, resources)[:, None]
+    matrix = scale * (10 + factors[groups] + rng.normal(0, 0.2, (resources, days)))
+
+    breaks = np.flatnonzero(rng.random(resources) < break_rate)
+    break_days = rng.integers(days - correlation.RECENT_DAYS, days, len(breaks))
+    matrix[breaks, break_days] += scale[breaks, 0] * rng.choice([-1, 1], len(breaks)) * rng.uniform(4, 8, len(breaks))
+
+    return matrix, breaks
+
+def dense_top_k(standardized: np.ndarray, k: int):
+    """All-pairs correlation followed by the same top-k selection (quadratic memory)."""
+    corr = standardized @ standardized.T / standardized.shape[1]
+    np.fill_diagonal(corr, -np.inf)
+    return np.argsort(-corr, axis=1)[:, :k]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the correlated-resource anomaly detector")
+    parser.add_argument("--resources", type=int, default=10_000)
+    parser.add_argument("--days", type=int, default=37)
+    parser.add_argument("--group-size", type=int, default=20)
+    parser.add_argument("--break-rate", type=float, default=0.01)
+    parser.add_argument("--dense", action="store_true", help="Also compare neighbors with an all-pairs correlation matrix")
+    args = parser.parse_args()
+
+    print(f"Generating {args.resources:,} resources over {args.days} days...")
+    matrix, breaks = generate_matrix(args.resources, args.days, args.group_size, args.break_rate)
+
+    start = time.perf_counter()
+    result = correlation.correlation_breaks(matrix)
+    elapsed = time.perf_counter() - start
+
+    flagged = set(np.flatnonzero(result['flagged']).tolist())
+    expected = set(breaks.tolist())
+    true_positives = len(flagged & expected)
+
+    print(f"  blocked top-{correlation.PEER_COUNT} detector  {elapsed:8.2f}s  ({len(flagged)} flagged)")
+    print(f"  injected breaks: {len(expected)}, recall {true_positives / max(len(expected), 1):.2f}, "
+          f"precision {true_positives / max(len(flagged), 1):.2f}")
+
+    if args.dense:
+        baseline_days = args.days - correlation.RECENT_DAYS
+        standardized, _ = correlation.standardize(matrix, baseline_days)
+
+        start = time.perf_counter()
+        dense = dense_top_k(standardized[:, :baseline_days], correlation.PEER_COUNT)
+        dense_elapsed = time.perf_counter() - start
+
+        same = np.mean([set(a) == set(b) for a, b in zip(dense, result['peers'])])
+        print(f"  all-pairs neighbors         {dense_elapsed:8.2f}s  (same neighbor sets for {same:.1%} of resources)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+# backend/scripts/refresh_rollups.py
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.db.database import SessionLocal
+from app.services.rollups import CostRollupService
+
+def refresh_rollups(days=365):
+    """Rebuild the daily cost rollups for the past number of days"""
+    db = SessionLocal()
+    try:
+        end_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        start_date = end_date - timedelta(days=days)
+        
+        print(f"Refreshing rollups from {start_date.date()} to {end_date.date()}")
+        rollup_rows = CostRollupService(db).refresh(start_date, end_date)
+        db.commit()
+        
+        print(f"Done! Wrote {rollup_rows} daily rollup rows.")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 365
+    refresh_rollups(days)
@@ -4,12 +4,25 @@ import os
 import random
 from datetime import datetime, timedelta
 
+import numpy as np
+
 # Add parent directory to path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from sqlalchemy.orm import Session
 from app.db.database import SessionLocal
-from app.db.models import User, CloudAccount, CostData
+from app.db.models import User, CloudAccount
+from app.services.ingest import CostIngestService
+
+# Share of resource-days with a cost spike, and the range of the spike's multiplier
+SPIKE_RATE = 0.02
+SPIKE_MULTIPLIER = (1.5, 3.0)
+
+def add_spikes(costs: np.ndarray, rng: np.random.Generator, rate: float = SPIKE_RATE) -> np.ndarray:
+    """Multiply a random rate of the costs by SPIKE_MULTIPLIER in place; returns the mask of spiked costs"""
+    spikes = rng.random(costs.shape) < rate
+    costs[spikes] *= rng.uniform(*SPIKE_MULTIPLIER, spikes.sum())
+    return spikes
 
 def create_sample_resources(account_id, service, num_resources=5):
     """Create sample resources for a specific service"""
@@ -78,6 +91,8 @@ def generate_cost_data(db: Session, days=90):
     print(f"Generating cost data from {start_date.date()} to {end_date.date()}")
     
     total_records = 0
+    ingest = CostIngestService(db)
+    rng = np.random.default_rng()
     
     for account in accounts:
         print(f"Processing account: {account.name} (ID: {account.id})")
@@ -87,6 +102,7 @@ def generate_cost_data(db: Session, days=90):
             continue
         
         services = provider_services[account.provider]
+        records = []
         
         # Create cost entries for each day, service, and resource
         current_date = start_date
@@ -108,10 +124,6 @@ def generate_cost_data(db: Session, days=90):
                     
                     daily_cost = base_cost * weekday_factor * days_factor * random_factor
                     
-                    # Add occasional spikes
-                    if random.random() < 0.02:  # 2% chance of a cost spike
-                        daily_cost *= random.uniform(1.5, 3.0)
-                    
                     # Create tags
                     tags = {
                         "environment": random.choice(["production", "development", "staging", "test"]),
@@ -120,27 +132,29 @@ def generate_cost_data(db: Session, days=90):
                     }
                     
                     # Create cost data entry
-                    cost_entry = CostData(
-                        cloud_account_id=account.id,
-                        date=current_date,
-                        service=service_name,
-                        resource_id=resource_id,
-                        tags=tags,
-                        cost=daily_cost
-                    )
-                    
-                    db.add(cost_entry)
-                    total_records += 1
-                    
-                    # Commit in batches to avoid memory issues
-                    if total_records % 1000 == 0:
-                        db.commit()
-                        print(f"  Committed {total_records} records...")
+                    records.append({
+                        'cloud_account_id': account.id,
+                        'date': current_date,
+                        'service': service_name,
+                        'resource_id': resource_id,
+                        'tags': tags,
+                        'cost': daily_cost
+                    })
             
             current_date += timedelta(days=1)
+        
+        # Add occasional spikes
+        costs = np.array([record['cost'] for record in records])
+        add_spikes(costs, rng)
+        for record, cost in zip(records, costs.tolist()):
+            record['cost'] = cost
+        
+        # Ingest the account's records in one batch so rollups and budgets stay current
+        result = ingest.ingest(records)
+        db.commit()
+        total_records += result['records']
+        print(f"  Ingested {result['records']} records ({result['rollup_rows']} rollup rows, {result['budget_alerts']} budget alerts, {result['anomaly_flags']} anomaly flags)")
     
-    # Commit any remaining records
-    db.commit()
     print(f"Done! Generated {total_records} cost data records.")
 
 if __name__ == "__main__":
@@ -0,0 +1,46 @@
+# tests/test_anomaly_stats.py
+import numpy as np
+
+from app.services import anomaly_stats
+
+WINDOW = 14
+MIN_PERIODS = 7
+
+def test_trailing_zscores_skip_flat_series():
+    # Flat series at very different levels, each with a single 0.1% blip
+    rng = np.random.default_rng(0)
+    levels = 10.0 ** rng.uniform(-2, 6, 2000)
+    matrix = np.repeat(levels[:, None], 60, axis=1)
+    blip_days = rng.integers(WINDOW, 60, len(levels))
+    matrix[np.arange(len(levels)), blip_days] *= 1.001
+
+    scores, means = anomaly_stats.trailing_zscores(matrix, WINDOW, MIN_PERIODS)
+
+    # A window without variation is never scored, so the blip day is skipped
+    assert np.isnan(scores[np.arange(len(levels)), blip_days]).all()
+    with np.errstate(invalid='ignore'):
+        assert not (np.abs(scores) > 2.0).any()
+    np.testing.assert_allclose(means[:, WINDOW], levels)
+
+def test_trailing_zscores_match_two_pass_statistics():
+    rng = np.random.default_rng(1)
+    matrix = rng.uniform(1e6, 1e6 + 10, (50, 40))
+    matrix[rng.random(matrix.shape) < 0.1] = np.nan
+
+    scores, means = anomaly_stats.trailing_zscores(matrix, WINDOW, MIN_PERIODS)
+
+    for row, column in [(0, 20), (7, 39), (49, 14)]:
+        window = matrix[row, column - WINDOW:column]
+        window = window[np.isfinite(window)]
+        if len(window) < MIN_PERIODS or not np.isfinite(matrix[row, column]):
+            continue
+        np.testing.assert_allclose(means[row, column], window.mean())
+        np.testing.assert_allclose(scores[row, column], (matrix[row, column] - window.mean()) / window.std(), rtol=1e-6)
+
+def test_trailing_zscores_need_min_periods():
+    matrix = np.arange(30, dtype=np.float64)[None, :]
+
+    scores, _ = anomaly_stats.trailing_zscores(matrix, WINDOW, MIN_PERIODS)
+
+    assert np.isnan(scores[0, :MIN_PERIODS]).all()
+    assert np.isfinite(scores[0, MIN_PERIODS:]).all()
@@ -0,0 +1,175 @@
+# tests/test_query_filters.py
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app.db.models import Base, CloudAccount, CostData, CostDailyRollup, User
+from app.services.query_filters import filter_accounts, filter_costs, parse_cost_filter
+
+# PostgreSQL database the plan tests may create a scratch schema in
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+def compile_filter(**expressions):
+    """SQL text and parameters of a CostData query filtered by the given expressions."""
+    query = filter_costs(select(CostData.id), parse_cost_filter(**expressions))
+    compiled = query.compile(dialect=postgresql.dialect())
+    return str(compiled), compiled.params
+
+def test_service_list_compiles_to_any():
+    sql, params = compile_filter(service="EC2, S3")
+    assert "cost_data.service = ANY (%(param_1)s::VARCHAR[])" in sql
+    assert params["param_1"] == ["EC2", "S3"]
+
+def test_negated_service_list_keeps_null_services():
+    sql, params = compile_filter(service="!Lambda")
+    assert "cost_data.service IS NULL OR cost_data.service != ALL (%(param_1)s::VARCHAR[])" in sql
+    assert params["param_1"] == ["Lambda"]
+
+def test_resource_list_compiles_to_any():
+    sql, params = compile_filter(resource="i-1,i-2")
+    assert "cost_data.resource_id = ANY (%(param_1)s::VARCHAR[])" in sql
+    assert params["param_1"] == ["i-1", "i-2"]
+
+def test_tag_values_compile_to_one_containment_each():
+    sql, params = compile_filter(tags=["env:prod|staging"])
+    assert sql.count("cost_data.tags @>") == 2
+    assert {"env": "prod"} in params.values() and {"env": "staging"} in params.values()
+
+def test_repeated_tags_are_combined_with_and():
+    sql, _ = compile_filter(tags=["env:prod", "team:ml"])
+    assert "cost_data.tags @> %(tags_1)s AND cost_data.tags @> %(tags_2)s" in sql
+
+def test_negated_tag_keeps_untagged_rows():
+    sql, _ = compile_filter(tags=["!team:ml"])
+    assert "cost_data.tags IS NULL OR NOT cost_data.tags @> %(tags_1)s" in sql
+
+def test_cost_bounds_compile_to_range():
+    sql, params = compile_filter(min_cost=1.5, max_cost=10.0)
+    assert "cost_data.cost >= %(cost_1)s AND cost_data.cost <= %(cost_2)s" in sql
+    assert (params["cost_1"], params["cost_2"]) == (1.5, 10.0)
+
+def test_empty_filter_leaves_query_alone():
+    query = select(CostData.id)
+    assert filter_costs(query, parse_cost_filter()) is query
+
+def test_account_scope_compiles_to_any():
+    query = filter_accounts(select(CostData.id), CostData.cloud_account_id, [3, 1])
+    compiled = query.compile(dialect=postgresql.dialect())
+    assert "cost_data.cloud_account_id = ANY (%(param_1)s::INTEGER[])" in str(compiled)
+    assert compiled.params["param_1"] == [3, 1]
+
+def test_unsupported_columns_are_rejected():
+    filters = parse_cost_filter(service="EC2", tags=["env:prod"])
+    with pytest.raises(ValueError, match="tag"):
+        filter_costs(select(CostDailyRollup.id), filters, service_column=CostDailyRollup.service,
+                     resource_column=None, tags_column=None, cost_column=None)
+
+@pytest.mark.parametrize("expressions", [
+    {"service": "EC2,,S3"},
+    {"service": "!"},
+    {"tags": ["env"]},
+    {"tags": [":prod"]},
+    {"tags": ["env:prod|"]},
+    {"min_cost": 10.0, "max_cost": 1.0},
+])
+def test_malformed_expressions_are_rejected(expressions):
+    with pytest.raises(ValueError):
+        parse_cost_filter(**expressions)
+
+@pytest.fixture(scope="module")
+def plan_db():
+    """
+    Session on a scratch schema of TEST_DATABASE_URL with a few thousand
+    analyzed cost rows; everything is rolled back afterwards.
+    """
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    engine = create_engine(TEST_DATABASE_URL)
+    try:
+        connection = engine.connect()
+    except OperationalError:
+        pytest.skip("TEST_DATABASE_URL is not reachable")
+
+    transaction = connection.begin()
+    connection.execute(text("CREATE SCHEMA filter_plan_tests"))
+    connection.execute(text("SET LOCAL search_path TO filter_plan_tests"))
+    Base.metadata.create_all(connection)
+
+    db = Session(bind=connection)
+    user = User(email="plans@example.com", hashed_password="x", full_name="Plans", is_active=True, is_admin=False)
+    db.add(user)
+    db.flush()
+    accounts = [CloudAccount(name=f"Account {i}", provider="AWS", owner_id=user.id) for i in range(4)]
+    db.add_all(accounts)
+    db.flush()
+
+    start = datetime(2026, 1, 1)
+    db.bulk_insert_mappings(CostData, [
+        {
+            "cloud_account_id": accounts[i % 4].id,
+            "date": start + timedelta(days=i % 90),
+            "service": ["EC2", "S3", "RDS", "Lambda"][i % 4],
+            "resource_id": f"r-{i % 500}",
+            "tags": {"env": ["prod", "staging", "dev"][i % 3], "team": f"t{i % 40}"},
+            "cost": float(i % 97)
+        }
+        for i in range(20000)
+    ])
+    db.bulk_insert_mappings(CostDailyRollup, [
+        {"cloud_account_id": account.id, "service": service, "day": start + timedelta(days=day),
+         "total_cost": 1.0, "record_count": 1}
+        for account in accounts for service in ["EC2", "S3", "RDS", "Lambda"] for day in range(90)
+    ])
+    db.flush()
+    connection.execute(text("ANALYZE"))
+
+    # Plans are checked for whether an index can answer the filter, not for cost
+    connection.execute(text("SET LOCAL enable_seqscan = off"))
+
+    yield db
+
+    db.close()
+    transaction.rollback()
+    connection.close()
+    engine.dispose()
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN of a statement, compiled with its bound parameters."""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN " + compiler.process(element.statement, **kw)
+
+def explain(db: Session, query) -> str:
+    return "\n".join(row[0] for row in db.execute(Explain(query.statement)))
+
+def test_plan_tag_filter_uses_gin_index(plan_db):
+    query = filter_costs(plan_db.query(CostData.id), parse_cost_filter(tags=["team:t7"]))
+    assert "ix_cost_data_tags" in explain(plan_db, query)
+
+def test_plan_tag_alternatives_use_gin_index(plan_db):
+    query = filter_costs(plan_db.query(CostData.id), parse_cost_filter(tags=["env:prod|staging"]))
+    plan = explain(plan_db, query)
+    assert "BitmapOr" in plan and "ix_cost_data_tags" in plan
+
+def test_plan_date_range_with_filters_uses_date_index(plan_db):
+    query = plan_db.query(CostData.id).filter(CostData.date >= datetime(2026, 3, 1))
+    query = filter_costs(query, parse_cost_filter(service="EC2", min_cost=50.0))
+    assert "ix_cost_data_date_id" in explain(plan_db, query)
+
+def test_plan_account_scope_uses_rollup_index(plan_db):
+    query = filter_accounts(plan_db.query(CostDailyRollup.id), CostDailyRollup.cloud_account_id,
+                            [row.id for row in plan_db.query(CloudAccount.id).limit(2)])
+    assert "uq_cost_daily_rollups_account_service_day" in explain(plan_db, query)